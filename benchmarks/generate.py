@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+Generate a synthetic k8t project of configurable size.
+
+every cluster has the same environments, each with its own value layer on top
+of the global one. templates read values from every level of the tree, request
+secrets from the random provider and include a chain of partials.
+
+usage: python -m benchmarks.generate DIRECTORY [--clusters N] [--environments N] [--templates N] [--keys N] [--depth N]
+                                               [--secrets N] [--includes N] [--seed N]
+"""
+
+import argparse
+import json
+import os
+import random
+from typing import Any, Dict, List
+
+Path = List[str]
+
+
+def generate_values(rng: random.Random, keys: int, depth: int, prefix: str = "key") -> dict:
+    if depth == 0:
+        return {"{}{}".format(prefix, index): rng.choice(["value-{}".format(rng.randrange(10 ** 6)), rng.randrange(10 ** 6), True])
+                for index in range(keys)}
+
+    return {"{}{}".format(prefix, index): generate_values(rng, keys, depth - 1, "group" if depth > 1 else "key") for index in range(keys)}
+
+
+def leaves(tree: dict, path: Path = None) -> List[Path]:
+    result = []
+
+    for key, value in tree.items():
+        if isinstance(value, dict):
+            result.extend(leaves(value, (path or []) + [key]))
+        else:
+            result.append((path or []) + [key])
+
+    return result
+
+
+def generate_override(rng: random.Random, paths: List[Path], changes: int, label: str) -> dict:
+    override: dict = {}
+
+    for path in rng.sample(paths, min(changes, len(paths))):
+        target = override
+
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+
+        target[path[-1]] = "{}-{}".format(label, rng.randrange(10 ** 6))
+
+    return override
+
+
+def generate_template(rng: random.Random, index: int, paths: List[Path], reads: int, secrets: int, includes: int) -> str:
+    lines = ['{% include "chain-0.inc" %}'] if includes else []
+
+    lines.extend([
+        "apiVersion: v1",
+        "kind: ConfigMap",
+        "metadata:",
+        "  name: app-{}".format(index),
+        '  namespace: "{{ environment | default(\'default\') }}"',
+        "data:",
+    ])
+
+    for number, path in enumerate(rng.sample(paths, min(reads, len(paths)))):
+        lines.append('  value{}: "{{{{ {} }}}}"'.format(number, ".".join(path)))
+
+    for number in range(secrets):
+        lines.append("  secret{0}: \"{{{{ get_secret('/app-{1}/secret-{0}', 24) | b64encode }}}}\"".format(number, index))
+
+    return "\n".join(lines) + "\n"
+
+
+def to_yaml(data: dict) -> str:
+    # json is valid yaml and a lot faster to write
+    return json.dumps(data, indent=2) + "\n"
+
+
+def write(path: str, content: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, "w") as stream:
+        stream.write(content)
+
+
+# pylint: disable=too-many-arguments,too-many-locals
+def generate(directory: str, clusters: int = 4, environments: int = 3, templates: int = 30, keys: int = 6, depth: int = 3,
+             secrets: int = 4, includes: int = 4, seed: int = 0) -> Dict[str, Any]:
+    """
+    write a project to directory, returns a summary of its size.
+    """
+
+    rng = random.Random(seed)
+    base = generate_values(rng, keys, depth)
+    paths = leaves(base)
+    changes = max(1, len(paths) // 20)
+
+    write(os.path.join(directory, ".k8t"), "")
+    write(os.path.join(directory, "values.yaml"), to_yaml(base))
+    write(os.path.join(directory, "config.yaml"), to_yaml({"secrets": {"provider": "random"}}))
+
+    for index in range(templates):
+        write(os.path.join(directory, "templates", "app-{}.yaml.j2".format(index)),
+              generate_template(rng, index, paths, keys * 2, secrets, includes))
+
+    for index in range(includes):
+        include = '{{% include "chain-{}.inc" %}}\n'.format(index + 1) if index + 1 < includes else ""
+
+        write(os.path.join(directory, "templates", "chain-{}.inc".format(index)), "# chain {}\n{}".format(index, include))
+
+    environment_names = ["env{}".format(index) for index in range(environments)]
+
+    for name in environment_names:
+        write(os.path.join(directory, "environments", name, "values.yaml"), to_yaml(generate_override(rng, paths, changes, name)))
+        write(os.path.join(directory, "environments", name, "config.yaml"), to_yaml({}))
+
+    for index in range(clusters):
+        cluster_dir = os.path.join(directory, "clusters", "cluster{}".format(index))
+
+        write(os.path.join(cluster_dir, "values.yaml"), to_yaml(generate_override(rng, paths, changes, "cluster{}".format(index))))
+
+        for name in environment_names:
+            write(os.path.join(cluster_dir, "environments", name, "values.yaml"),
+                  to_yaml(generate_override(rng, paths, changes, "cluster{}-{}".format(index, name))))
+            write(os.path.join(cluster_dir, "environments", name, "config.yaml"), to_yaml({}))
+
+    return dict(targets=clusters * max(environments, 1), templates=templates, leaves=len(paths), secrets=templates * secrets)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory")
+    parser.add_argument("--clusters", type=int, default=4)
+    parser.add_argument("--environments", type=int, default=3, help="environments per cluster")
+    parser.add_argument("--templates", type=int, default=30)
+    parser.add_argument("--keys", type=int, default=6, help="keys per level of the values tree")
+    parser.add_argument("--depth", type=int, default=3, help="nesting depth of the values tree")
+    parser.add_argument("--secrets", type=int, default=4, help="get_secret calls per template")
+    parser.add_argument("--includes", type=int, default=4, help="length of the include chain")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    summary = generate(args.directory, args.clusters, args.environments, args.templates, args.keys, args.depth, args.secrets,
+                       args.includes, args.seed)
+
+    print(", ".join("{} {}".format(value, name) for name, value in summary.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Compare deep_merge against the previous pairwise, deep copying merge.
+
+usage: python -m benchmarks.merge [--keys N] [--depth N] [--layers N] [--repeat N]
+"""
+
+import argparse
+import copy
+import random
+import string
+import timeit
+from functools import reduce
+
+from k8t.util import deep_merge
+
+
+def pairwise_merge(d_1: dict, d_2: dict, path=None, method="ltr"):
+    # util.merge before it was replaced by the single pass merge
+    d_1 = copy.deepcopy(d_1)
+
+    if path is None:
+        path = []
+
+    for key in d_2:
+        if key in d_1:
+            if isinstance(d_1[key], dict) and isinstance(d_2[key], dict):
+                d_1[key] = pairwise_merge(d_1[key], d_2[key], path + [str(key)], method=method)
+            elif d_1[key] == d_2[key]:
+                pass
+            elif method == "ltr":
+                d_1[key] = d_2[key]
+            elif method == "crash":
+                raise RuntimeError("Conflict at {}".format(".".join(path + [str(key)])))
+        else:
+            d_1[key] = d_2[key]
+
+    return d_1
+
+
+def pairwise_deep_merge(*dicts, method="ltr"):
+    return reduce(lambda a, b: pairwise_merge(a, b, method=method) if b is not None else a, dicts)
+
+
+def generate_tree(rng: random.Random, keys: int, depth: int) -> dict:
+    if depth == 0:
+        return {"".join(rng.choices(string.ascii_lowercase, k=8)): rng.choice([rng.random(), "value" * 4, [1, 2, 3], True]) for _ in range(keys)}
+
+    return {"".join(rng.choices(string.ascii_lowercase, k=8)): generate_tree(rng, keys, depth - 1) for _ in range(keys)}
+
+
+def generate_override(rng: random.Random, tree: dict, changes: int) -> dict:
+    # override a few leaves of the base tree, like environment or cluster layers do
+    override: dict = {}
+
+    for _ in range(changes):
+        node, target = tree, override
+
+        while isinstance(node, dict):
+            key = rng.choice(list(node))
+
+            if not isinstance(node[key], dict):
+                target[key] = "override"
+
+                break
+
+            node, target = node[key], target.setdefault(key, {})
+
+    return override
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--keys", type=int, default=12, help="keys per level")
+    parser.add_argument("--depth", type=int, default=3, help="nesting depth")
+    parser.add_argument("--layers", type=int, default=6, help="number of value layers")
+    parser.add_argument("--changes", type=int, default=20, help="overridden leaves per layer")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    base = generate_tree(rng, args.keys, args.depth)
+    layers = [base] + [generate_override(rng, base, args.changes) for _ in range(args.layers - 1)]
+
+    assert deep_merge(*layers) == pairwise_deep_merge(*layers)
+
+    print("{} leaves, {} layers".format(args.keys ** (args.depth + 1), args.layers))
+
+    for name, func in (("pairwise", pairwise_deep_merge), ("single pass", deep_merge)):
+        seconds = min(timeit.repeat(lambda: func(*layers), number=1, repeat=args.repeat))  # pylint: disable=cell-var-from-loop
+
+        print("{:>12}: {:8.2f} ms".format(name, seconds * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+Time the main code paths on a generated project and compare against baselines.
+
+every benchmark reports the best of --repeat runs. a benchmark more than
+--threshold times slower than its baseline fails the run. baselines depend on
+the machine, record them with --update before comparing on a new one.
+
+usage: python -m benchmarks.suite [--baselines PATH] [--threshold RATIO] [--repeat N] [--update] [NAME ...]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import timeit
+from typing import Any, Callable, Dict
+
+from click.testing import CliRunner
+
+from benchmarks.generate import generate
+from k8t import config, secret_providers, util, values
+from k8t.cli import root
+from k8t.engine import build
+from k8t.templates import analyze, compile_template, render
+from k8t.util import deep_merge
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+DEFAULT_THRESHOLD = 1.5
+SIZE = dict(clusters=4, environments=3, templates=30, keys=6, depth=3, secrets=4, includes=4)
+TARGET = ("cluster1", "env2")
+
+
+def _cold(func: Callable[[], Any]) -> Callable[[], Any]:
+    def wrapper():
+        # parsed files are kept for the lifetime of the process
+        util._YAML_CACHE.clear()  # pylint: disable=protected-access
+
+        return func()
+
+    return wrapper
+
+
+def _invoke(*args: str) -> None:
+    result = CliRunner().invoke(root, list(args))
+
+    if result.exit_code != 0:
+        raise RuntimeError("k8t {} failed: {}".format(" ".join(args), result.output or result.exception))
+
+
+def benchmarks(directory: str) -> Dict[str, Callable[[], Any]]:
+    cluster, environment = TARGET
+
+    layers = [layer for _, layer in values.load_layers(directory, cluster, environment)]
+    vals = values.load_all(directory, cluster, environment, "ltr")
+    conf = config.load_all(directory, cluster, environment, "ltr")
+    engine = build(directory, cluster, environment)
+    names = [name for name in engine.list_templates() if name.endswith(".j2")]
+    templates = [compile_template(name, engine) for name in names]
+
+    def analyze_all():
+        for name in names:
+            analyze(compile_template(name, engine), vals, engine)
+
+    def render_all():
+        with config.use(conf), secret_providers.use_store(secret_providers.SecretStore()):
+            for template in templates:
+                render(template, vals, engine)
+
+    return {
+        "values.load_all": _cold(lambda: values.load_all(directory, cluster, environment, "ltr")),
+        "deep_merge": lambda: deep_merge(*layers),
+        "analyze": analyze_all,
+        "render": render_all,
+        "gen": _cold(lambda: _invoke("gen", "-c", cluster, "-e", environment, directory)),
+        "validate": _cold(lambda: _invoke("validate", "-c", cluster, "-e", environment, directory)),
+    }
+
+
+def load_baselines(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, "r") as stream:
+            return json.load(stream)
+    except FileNotFoundError:
+        return {}
+
+
+def main():  # pylint: disable=too-many-locals
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("names", nargs="*", metavar="NAME", help="benchmarks to run, all by default")
+    parser.add_argument("--baselines", default=BASELINES, help="baseline file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="slowdown ratio that fails the run")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--update", action="store_true", help="store the results as new baselines")
+    args = parser.parse_args()
+
+    baselines = load_baselines(args.baselines)
+
+    if baselines and baselines.get("size") != SIZE:
+        print("baselines were recorded for a different project size, ignoring them", file=sys.stderr)
+        baselines = {}
+
+    results: Dict[str, float] = {}
+    regressions = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        generate(directory, **SIZE)
+
+        cases = benchmarks(directory)
+        unknown = set(args.names) - set(cases)
+
+        if unknown:
+            parser.error("unknown benchmarks: {}".format(", ".join(sorted(unknown))))
+
+        for name, func in cases.items():
+            if args.names and name not in args.names:
+                continue
+
+            func()  # warm up imports and compiled templates
+
+            results[name] = min(timeit.repeat(func, number=1, repeat=args.repeat)) * 1000
+            baseline = baselines.get("results", {}).get(name)
+
+            if baseline is None:
+                print("{:>16}: {:9.2f} ms".format(name, results[name]))
+
+                continue
+
+            ratio = results[name] / baseline
+
+            print("{:>16}: {:9.2f} ms ({:.2f}x baseline {:.2f} ms)".format(name, results[name], ratio, baseline))
+
+            if ratio > args.threshold:
+                regressions.append(name)
+
+    if args.update:
+        stored = dict(baselines.get("results", {}), **results)
+
+        with open(args.baselines, "w") as stream:
+            json.dump(dict(size=SIZE, python=platform.python_version(), results=stored), stream, indent=2, sort_keys=True)
+            stream.write("\n")
+
+        print("baselines written to {}".format(args.baselines))
+    elif regressions:
+        print("slower than {}x baseline: {}".format(args.threshold, ", ".join(regressions)), file=sys.stderr)
+
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
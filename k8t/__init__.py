@@ -9,20 +9,28 @@
 
 import logging
 
-from pkg_resources import DistributionNotFound, get_distribution
-
 LOGGER = logging.getLogger(__name__)
 
-__version__ = None
-
-try:
-    __version__ = get_distribution(__name__).version
-except DistributionNotFound:
-    # package is not installed
-    pass
-
 __license__ = """Copyright 2019 FL Fintech E GmbH
 
 Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
 
 THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE."""
+
+
+def __getattr__(name):
+    # importlib.metadata takes a while to import, most commands never need the version
+    if name == "__version__":
+        from importlib.metadata import PackageNotFoundError, version  # pylint: disable=import-outside-toplevel
+
+        try:
+            value = version(__name__)
+        except PackageNotFoundError:
+            # package is not installed
+            value = None
+
+        globals()["__version__"] = value
+
+        return value
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import base64
+import datetime
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+from types import CodeType
+from typing import IO, Any, Callable, Dict, List, Optional, Tuple
+
+import jinja2
+from jinja2 import Environment
+from jinja2.bccache import Bucket, BytecodeCache
+
+from k8t.profiling import count
+from k8t.project import PROJECT_INDEX
+
+LOGGER = logging.getLogger(__name__)
+DEFAULT_CACHE_DIR = ".k8t-cache"
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+TEMPLATE_DIR = "templates"
+PARSED_DIR = "parsed"
+DEPENDENCY_INDEX = "dependencies.json"
+CACHE_SUFFIX = ".cache"
+
+
+class TemplateCache(BytecodeCache):
+    """
+    On-disk cache of compiled template code.
+
+    Entries are keyed by template name, file name and a hash of the source, so
+    the same name resolving to different files in overlay paths never shares an
+    entry. The least recently used entries are evicted once the cache grows
+    beyond max_size bytes.
+
+    Code objects are also kept in memory, so engines sharing one cache instance
+    compile every template only once. Without a directory the cache is
+    memory-only.
+
+    Entries are code that is executed when a template is rendered, files not
+    owned by the current user are ignored.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_size: int = DEFAULT_MAX_SIZE):
+        self.directory = os.path.join(directory, TEMPLATE_DIR) if directory is not None else None
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+        self._size: Optional[int] = None
+        self._memory: Dict[str, CodeType] = {}
+
+    def __getstate__(self):
+        # code objects cannot be pickled, worker processes start out empty
+        state = self.__dict__.copy()
+        state["_memory"] = {}
+
+        return state
+
+    def get_bucket(self, environment: Environment, name: str, filename: Optional[str], source: str) -> Bucket:
+        checksum = self.get_source_checksum(source)
+        key = self.get_cache_key(
+            f"{name}|{checksum}|{jinja2.__version__}|{sys.implementation.cache_tag}", filename)
+
+        bucket = Bucket(environment, key, checksum)
+        self.load_bytecode(bucket)
+
+        return bucket
+
+    def load_bytecode(self, bucket: Bucket) -> None:
+        bucket.code = self._memory.get(bucket.key)
+
+        if bucket.code is None and self.directory is not None:
+            path = self._entry_path(bucket.key)
+
+            try:
+                with open(path, "rb") as stream:
+                    if _owned(stream):
+                        bucket.load_bytecode(stream)
+                    else:
+                        LOGGER.warning("ignoring template cache entry %s, it is not owned by the current user", path)
+
+                # the modification time doubles as last access time for eviction
+                os.utime(path)
+            except OSError:
+                pass
+
+            if bucket.code is not None:
+                self._memory[bucket.key] = bucket.code
+
+        if bucket.code is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        count("cache", cache="templates", result="miss" if bucket.code is None else "hit")
+
+    def dump_bytecode(self, bucket: Bucket) -> None:
+        self._memory[bucket.key] = bucket.code
+
+        if self.directory is None:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        path = self._entry_path(bucket.key)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+
+        try:
+            with os.fdopen(file_descriptor, "wb") as stream:
+                bucket.write_bytecode(stream)
+
+            os.replace(temp_path, path)
+        except OSError as exc:
+            LOGGER.warning("failed to write template cache entry %s: %s", path, exc)
+
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+            return
+
+        if self._size is None:
+            self._size = sum(size for _, size, _ in _list_entries(self.directory))
+        else:
+            self._size += os.path.getsize(path)
+
+        if self._size > self.max_size:
+            self._size = _evict(self.directory, self.max_size)
+
+    def clear(self) -> None:
+        self._memory.clear()
+
+        if self.directory is not None:
+            clear(os.path.dirname(self.directory))
+
+        self._size = None
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+
+def _owned(stream: IO) -> bool:
+    return not hasattr(os, "getuid") or os.fstat(stream.fileno()).st_uid == os.getuid()
+
+
+def _list_entries(directory: str) -> List[Tuple[str, int, float]]:
+    entries = []
+
+    try:
+        with os.scandir(directory) as iterator:
+            for entry in iterator:
+                if not entry.name.endswith(CACHE_SUFFIX):
+                    continue
+
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+    except FileNotFoundError:
+        pass
+
+    return entries
+
+
+def _evict(directory: str, max_size: int) -> int:
+    entries = sorted(_list_entries(directory), key=lambda entry: entry[2])
+    size = sum(entry[1] for entry in entries)
+
+    for path, entry_size, _ in entries:
+        if size <= max_size:
+            break
+
+        LOGGER.debug("evicting template cache entry %s", path)
+
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+        size -= entry_size
+
+    return size
+
+
+def _parsed_path(directory: str, path: str) -> str:
+    # one entry per file, a changed file replaces its previous entry
+    return os.path.join(directory, PARSED_DIR, hashlib.sha256(os.path.abspath(path).encode()).hexdigest() + CACHE_SUFFIX)
+
+
+# parse results are stored as json, yaml types json lacks are tagged
+_DECODERS: Dict[str, Callable[[Any], Any]] = {
+    "!map": lambda pairs: {key: value for key, value in pairs},
+    "!tuple": tuple,
+    "!set": set,
+    "!datetime": datetime.datetime.fromisoformat,
+    "!date": datetime.date.fromisoformat,
+    "!bytes": base64.b64decode,
+}
+
+
+def _encode(data: Any) -> Any:
+    if data is None or isinstance(data, (bool, int, float, str)):
+        return data
+
+    if isinstance(data, dict):
+        if all(isinstance(key, str) for key in data) and not (len(data) == 1 and next(iter(data)) in _DECODERS):
+            return {key: _encode(value) for key, value in data.items()}
+
+        return {"!map": [[_encode(key), _encode(value)] for key, value in data.items()]}
+
+    if isinstance(data, list):
+        return [_encode(value) for value in data]
+
+    if isinstance(data, tuple):
+        return {"!tuple": [_encode(value) for value in data]}
+
+    if isinstance(data, (set, frozenset)):
+        return {"!set": [_encode(value) for value in data]}
+
+    if isinstance(data, datetime.datetime):
+        return {"!datetime": data.isoformat()}
+
+    if isinstance(data, datetime.date):
+        return {"!date": data.isoformat()}
+
+    if isinstance(data, bytes):
+        return {"!bytes": base64.b64encode(data).decode()}
+
+    raise TypeError("can not cache values of type {}".format(type(data).__name__))
+
+
+def _decode(data: Dict[str, Any]) -> Any:
+    if len(data) == 1:
+        tag, value = next(iter(data.items()))
+
+        if tag in _DECODERS:
+            return _DECODERS[tag](value)
+
+    return data
+
+
+def load_parsed(directory: str, path: str, signature: Tuple) -> Tuple[bool, Any]:
+    """
+    get the cached parse result of a file, returns (found, data). entries are
+    only used if they were stored with the same signature.
+    """
+
+    try:
+        with open(_parsed_path(directory, path), "r") as stream:
+            entry = json.load(stream, object_hook=_decode)
+
+        entry_signature, data = tuple(entry["signature"]), entry["data"]
+    except FileNotFoundError:
+        return False, None
+    except (OSError, ValueError, TypeError, KeyError) as exc:
+        LOGGER.debug("ignoring invalid parse cache entry for %s: %s", path, exc)
+
+        return False, None
+
+    if entry_signature != signature:
+        return False, None
+
+    return True, data
+
+
+def store_parsed(directory: str, path: str, signature: Tuple, data: Any) -> None:
+    entry_path = _parsed_path(directory, path)
+
+    os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+
+    file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(entry_path), suffix=".tmp")
+
+    try:
+        with os.fdopen(file_descriptor, "w") as stream:
+            json.dump(dict(signature=list(signature), data=_encode(data)), stream)
+
+        os.replace(temp_path, entry_path)
+    except (OSError, TypeError, ValueError, RecursionError) as exc:
+        LOGGER.warning("failed to write parse cache entry for %s: %s", path, exc)
+
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def stats(directory: str) -> Dict[str, int]:
+    entries = _list_entries(os.path.join(directory, TEMPLATE_DIR))
+    parsed = _list_entries(os.path.join(directory, PARSED_DIR))
+
+    return dict(
+        templates=len(entries),
+        files=len(parsed),
+        size=sum(size for _, size, _ in entries + parsed),
+    )
+
+
+def clear(directory: str) -> int:
+    removed = 0
+
+    for name in (DEPENDENCY_INDEX, PROJECT_INDEX):
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+    for path, _, _ in _list_entries(os.path.join(directory, TEMPLATE_DIR)) + _list_entries(os.path.join(directory, PARSED_DIR)):
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+
+    return removed
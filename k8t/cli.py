@@ -10,18 +10,42 @@
 import logging
 import os
 import sys
-from functools import update_wrapper
+import time
+from functools import partial, update_wrapper
 
 import click
-from jinja2.exceptions import UndefinedError
 
-import coloredlogs
 import k8t
-from k8t import cluster, config, environment, project, scaffolding, values
-from k8t.engine import build
-from k8t.templates import YamlValidationError, analyze, render, validate
+# commands import the rest themselves, e.g. secret providers pull in boto3
+from k8t import cluster, config, profiling, project, scaffolding, values
 from k8t.util import (MERGE_METHODS, deep_merge, envvalues, load_cli_value,
-                      load_yaml, to_json, to_yaml)
+                      load_yaml_files, set_parse_cache, to_json, to_json_documents, to_yaml)
+
+LOGGER = logging.getLogger(__name__)
+# defaults of k8t.cache, which imports jinja2 and is left to the commands using it
+CACHE_DIR = ".k8t-cache"
+CACHE_SIZE = 64 * 1024 * 1024
+
+
+class LazyChoice(click.Choice):
+    """
+    Choice whose values are only collected once they are needed.
+    """
+
+    def __init__(self, get_choices, case_sensitive: bool = True):
+        self._get_choices = get_choices
+        super().__init__((), case_sensitive)
+
+    @property
+    def choices(self):
+        if self._get_choices is not None:
+            self._choices, self._get_choices = tuple(self._get_choices()), None
+
+        return self._choices
+
+    @choices.setter
+    def choices(self, value):
+        self._choices = value
 
 
 def requires_project_directory(func):
@@ -36,10 +60,16 @@ def requires_project_directory(func):
 
 
 @click.group()
-@click.version_option(version=k8t.__version__)
+@click.version_option(package_name=k8t.__name__)
 @click.option("-d", "--debug", is_flag=True, default=False, show_default=True, help="Enable debug logging.")
 @click.option("-t", "--trace", is_flag=True, default=False, show_default=True, help="Enable spammy logging.")
-def root(debug, trace):
+@click.option("--profile", "profile_path", type=click.Path(dir_okay=False), metavar="FILE",
+              help="Write a chrome trace of the command to FILE and print the slowest phases.")
+@click.pass_context
+def root(ctx, debug, trace, profile_path):
+    # pylint: disable=import-outside-toplevel
+    import coloredlogs
+
     coloredlogs.install(level=logging.DEBUG if debug else logging.INFO)
 
     if not trace:
@@ -48,6 +78,47 @@ def root(debug, trace):
         logging.getLogger("urllib3").setLevel(
             logging.WARN if not debug else logging.INFO)
 
+    # every command starts with a fresh project index
+    project.invalidate()
+    project.set_index_cache(None)
+
+    if profile_path is not None:
+        profiling.start()
+        ctx.call_on_close(partial(_write_profile, profile_path, ctx.invoked_subcommand, time.perf_counter_ns()))
+
+
+def _write_profile(path, command, start):
+    recorder = profiling.stop()
+
+    if recorder is None:
+        return
+
+    recorder.record(command or "k8t", start, time.perf_counter_ns())
+    recorder.write(path)
+
+    click.echo(profiling.format_summary(recorder.summary()), err=True)
+    click.echo("trace written to {}".format(path), err=True)
+
+
+def _collect_metrics(path, command):
+    # spans of the profiler are the source of most metrics
+    recorder = profiling.current()
+    owned = recorder is None
+
+    if owned:
+        recorder = profiling.start()
+
+    click.get_current_context().call_on_close(partial(_write_metrics, path, command, recorder, owned, time.perf_counter_ns()))
+
+
+def _write_metrics(path, command, recorder, owned, start):
+    from k8t import metrics  # pylint: disable=import-outside-toplevel
+
+    if owned:
+        profiling.stop()
+
+    metrics.write(path, metrics.render(recorder, command, (time.perf_counter_ns() - start) / 10 ** 9))
+
 
 @root.command(name="license", help="Print software license.")
 def print_license():
@@ -62,12 +133,20 @@ def print_license():
 @click.option("--environment", "-e", "ename", metavar="NAME", help="Deployment environment to use.")
 @click.option("--suffix", "-s", "suffixes", default=[".yaml", ".j2", ".jinja2"], help="Filter template files by suffix. Can be used multiple times.", show_default=True)
 @click.option("--template-file", "-t", "template_overrides", metavar="KEY PATH", type=click.Tuple([str, str]), multiple=True, help="Restrict validation to single template file (the key is needed for references in templates).")
+@click.option("--metrics-file", type=click.Path(dir_okay=False), envvar="K8T_METRICS_FILE", help="Write metrics of the run to this file (prometheus text format).")
 @click.argument("directory", type=click.Path(dir_okay=True, file_okay=False, exists=True), default=os.getcwd())
 @requires_project_directory
-def cli_validate(method, value_files, cli_values, cname, ename, suffixes, template_overrides, directory):
+def cli_validate(method, value_files, cli_values, cname, ename, suffixes, template_overrides, metrics_file, directory):  # pylint: disable=too-many-arguments
+    # pylint: disable=import-outside-toplevel
+    from k8t.engine import build
+    from k8t.templates import analyze
+
+    if metrics_file:
+        _collect_metrics(metrics_file, "validate")
+
     vals = deep_merge(  # pylint: disable=redefined-outer-name
         values.load_all(directory, cname, ename, method),
-        *(load_yaml(p) for p in value_files),
+        *load_yaml_files(value_files),
         dict(load_cli_value(k, v) for k, v in cli_values),
         envvalues(),
         method=method,
@@ -121,54 +200,252 @@ def cli_validate(method, value_files, cli_values, cname, ename, suffixes, templa
 @click.option("--suffix", "-s", "suffixes", default=[".yaml", ".j2", ".jinja2"], help="Filter template files by suffix. Can be used multiple times.", show_default=True)
 @click.option("--secret-provider", help="Secret provider override.", type=click.Choice(['ssm', 'random', 'hash']))
 @click.option("--template-file", "-t", "template_overrides", metavar="KEY PATH", type=click.Tuple([str, str]), multiple=True, help="Restrict validation to single template file (the key is needed for references in templates).")
+@click.option("--jobs", "-j", type=click.IntRange(min=1), default=1, show_default=True, help="Number of worker processes used for rendering.")
+@click.option("--cache-dir", type=click.Path(file_okay=False), envvar="K8T_CACHE_DIR", help="Cache compiled templates and parsed value files in this directory.")
+@click.option("--cache-size", type=click.IntRange(min=1), default=CACHE_SIZE // 1024 // 1024, envvar="K8T_CACHE_SIZE", show_default=True, help="Cache size limit in MiB.")
+@click.option("--output-dir", "-O", type=click.Path(file_okay=False), help="Write manifests to a file per target in this directory.")
+@click.option("--all", "all_targets", is_flag=True, default=False, help="Render every cluster and environment combination (requires --output-dir).")
+@click.option("--force", is_flag=True, default=False, help="Render into --output-dir even if the inputs did not change.")
+@click.option("--watch", "-w", is_flag=True, default=False, help="Keep running and render again whenever project files change.")
+@click.option("--defer-secrets", is_flag=True, default=False, help="Render with placeholders and retrieve all secrets concurrently afterwards.")
+@click.option("--output-format", "-o", type=click.Choice(["yaml", "json", "jsonl"]), default="yaml", show_default=True,
+              help="Output format, json prints a single List object, jsonl one object per line.")
+@click.option("--socket", "socket_path", type=click.Path(dir_okay=False), envvar="K8T_SOCKET", help="Render with a k8t serve daemon listening on this socket if possible.")
+@click.option("--metrics-file", type=click.Path(dir_okay=False), envvar="K8T_METRICS_FILE", help="Write metrics of the run to this file (prometheus text format).")
 @click.argument("directory", type=click.Path(dir_okay=True, file_okay=False, exists=True), default=os.getcwd())
 @requires_project_directory
-def cli_gen(method, value_files, cli_values, cname, ename, suffixes, secret_provider, template_overrides, directory):  # pylint: disable=redefined-outer-name,too-many-arguments
-    vals = deep_merge(  # pylint: disable=redefined-outer-name
-        values.load_all(directory, cname, ename, method),
-        *(load_yaml(p) for p in value_files),
-        dict(load_cli_value(k, v) for k, v in cli_values),
-        envvalues(),
-        method=method,
-    )
+def cli_gen(method, value_files, cli_values, cname, ename, suffixes, secret_provider, template_overrides, jobs, cache_dir, cache_size,  # pylint: disable=redefined-outer-name,too-many-arguments,too-many-locals,too-many-branches,too-many-statements
+            output_dir, all_targets, force, watch, defer_secrets, output_format, socket_path, metrics_file, directory):
+    # pylint: disable=import-outside-toplevel
+    from jinja2.exceptions import UndefinedError
+
+    from k8t import cache, manifest, secret_providers
+    from k8t.engine import build
+    from k8t.matrix import list_targets, load_values, output_path, render_matrix, target_name, write_output
+    from k8t.parallel import render_all
+    from k8t.templates import YamlValidationError, compile_template, validate
+    from k8t.watch import WatchSession, run as run_watch
+
+    if output_format != "yaml" and (output_dir is not None or all_targets or watch):
+        raise click.UsageError("--output-format {} can not be combined with --output-dir, --all or --watch".format(output_format))
+
+    if metrics_file:
+        if watch:
+            raise click.UsageError("--metrics-file can not be combined with --watch")
+
+        _collect_metrics(metrics_file, "gen")
+
+    if socket_path and not (output_dir is not None or all_targets or watch or template_overrides):
+        request = dict(
+            command="render", directory=os.path.abspath(directory), cluster=cname, environment=ename, method=method,
+            value_files=[os.path.abspath(path) for path in value_files], cli_values=list(cli_values), suffixes=suffixes,
+            secret_provider=secret_provider, defer_secrets=defer_secrets, output_format=output_format,
+            # the daemon reads env() and K8T_VALUE_* variables from this
+            environ=dict(os.environ),
+        )
+
+        if _gen_remote(socket_path, request):
+            return
+
+    bytecode_cache = cache.TemplateCache(cache_dir, cache_size * 1024 * 1024) if cache_dir else None
+    set_parse_cache(cache_dir or None)
+    project.set_index_cache(cache_dir or None)
+    recorded = manifest.load(output_dir) if output_dir is not None else {}
+
+    if watch:
+        if all_targets:
+            raise click.UsageError("--watch can not be combined with --all")
+
+        session = WatchSession(directory, cname, ename, method, value_files, cli_values, suffixes, secret_provider, template_overrides, bytecode_cache)
+
+        run_watch(session, partial(_emit_watch, output_dir))
+
+        return
+
+    if all_targets:
+        if cname is not None or ename is not None:
+            raise click.UsageError("--all can not be combined with --cluster or --environment")
+
+        if output_dir is None:
+            raise click.UsageError("--all requires --output-dir")
+
+        targets = list_targets(directory)
+        previous = {} if force else {target: manifest.previous(recorded, output_path(output_dir, *target)) for target in targets}
+
+        failed = False
+
+        for target, output, inputs, error in render_matrix(
+                directory, targets, jobs, bytecode_cache, previous,
+                method=method, value_files=value_files, cli_values=cli_values, suffixes=suffixes,
+                secret_provider=secret_provider, template_overrides=template_overrides, defer_secrets=defer_secrets):
+            if error is not None:
+                click.secho("{}: ✗ -> {}".format(target_name(*target), error), fg="red", err=True)
+
+                failed = True
+            elif output is None:
+                click.echo("{}: unchanged".format(output_path(output_dir, *target)))
+            else:
+                path = write_output(output_dir, *target, output)
+                manifest.record(recorded, path, inputs)
+                profiling.count("output_bytes", len(output.encode()), target=target_name(*target))
+
+                click.echo("{}: ✔".format(path))
+
+        manifest.save(output_dir, recorded)
+
+        sys.exit(failed)
+
+    vals = load_values(directory, cname, ename, method, value_files, cli_values)
 
     config.CONFIG = config.load_all(directory, cname, ename, method)
 
     if secret_provider is not None:
-        if 'secrets' not in config.CONFIG:
-            config.CONFIG['secrets'] = dict()
+        config.CONFIG = deep_merge(config.CONFIG, {"secrets": {"provider": secret_provider}})
 
-        config.CONFIG['secrets']['provider'] = secret_provider
+    engine_args = (directory, cname, ename, template_overrides, bytecode_cache)
 
-    eng = build(directory, cname, ename, template_overrides)
+    eng = build(*engine_args)
+
+    if output_dir is not None:
+        inputs = manifest.fingerprint(vals, config.CONFIG, eng, suffixes)
+
+        if not force and manifest.unchanged(manifest.previous(recorded, output_path(output_dir, cname, ename)), inputs):
+            click.echo("{}: unchanged".format(output_path(output_dir, cname, ename)))
+
+            return
 
     templates = eng.list_templates()  # pylint: disable=redefined-outer-name
 
     if suffixes:
         templates = [name for name in templates if os.path.splitext(name)[1] in suffixes]
 
+    # parsed once, shared by validation and rendering
+    templates = [compile_template(template_path, eng) for template_path in templates]
+
     validated = True
 
-    for template_path in templates:
-        if not validate(template_path, vals, eng):
-            click.echo("Failed to validate template {}".format(template_path))
+    for template in templates:
+        if not validate(template, vals, eng):
+            click.echo("Failed to validate template {}".format(template.name))
 
             validated = False
 
     if not validated:
         sys.exit(1)
 
+    if jobs > 1 and secret_providers.per_process(config.CONFIG) and any(template.has_secrets for template in templates):
+        raise click.UsageError("--jobs requires a secrets store with the random secret provider")
+
+    secret_providers.prefetch(set().union(*(template.secret_keys for template in templates)))
+
+    output = []
+    items = []
+
     try:
-        for template_path in templates:
-            click.echo("---")
-            click.echo("# Source: {}".format(template_path))
+        if output_format != "yaml":
+            # parsed once by validation, no text round trip
+            for _, documents in render_all(templates, vals, eng, engine_args, jobs, defer_secrets, documents=True):
+                for document in documents:
+                    if document is None:
+                        continue
+
+                    if output_format == "jsonl":
+                        output.append(to_json_documents(document) + "\n")
+                        click.echo(output[-1], nl=False)
+                    else:
+                        items.append(document)
+        else:
+            outputs = render_all(templates, vals, eng, engine_args, jobs, defer_secrets)
 
-            template_output = render(template_path, vals, eng)
-            click.echo(template_output)
+            for template, template_output in zip(templates, outputs):
+                output.append("---\n# Source: {}\n{}\n".format(template.name, template_output))
+
+                if output_dir is None:
+                    click.echo(output[-1], nl=False)
     except (UndefinedError, YamlValidationError) as err:
         click.secho("✗ -> {}".format(err), fg="red", err=True)
         sys.exit(1)
 
+    if output_format == "json":
+        output.append(to_json_documents(dict(apiVersion="v1", kind="List", items=items)) + "\n")
+        click.echo(output[-1], nl=False)
+
+    profiling.count("output_bytes", sum(len(part.encode()) for part in output), target=target_name(cname, ename))
+
+    if output_dir is not None:
+        path = write_output(output_dir, cname, ename, "".join(output))
+
+        manifest.record(recorded, path, inputs)
+        manifest.save(output_dir, recorded)
+
+        click.echo("{}: ✔".format(path))
+
+
+def _gen_remote(socket_path, request):
+    # pylint: disable=import-outside-toplevel
+    from k8t import server
+
+    try:
+        response = server.request(socket_path, request)
+    except OSError as exc:
+        LOGGER.debug("rendering locally, no server on %s: %s", socket_path, exc)
+
+        return False
+
+    if response.get("fallback"):
+        LOGGER.debug("rendering locally: %s", response["error"])
+
+        return False
+
+    if "error" in response:
+        click.secho("✗ -> {}".format(response["error"]), fg="red", err=True)
+        sys.exit(1)
+
+    if request["output_format"] == "json":
+        click.echo(to_json_documents(dict(apiVersion="v1", kind="List", items=response["documents"])))
+    elif request["output_format"] == "jsonl":
+        for document in response["documents"]:
+            click.echo(to_json_documents(document))
+    else:
+        click.echo(response["output"], nl=False)
+
+    return True
+
+
+@root.command(name="serve", help="Keep a project loaded and render it on requests sent to a unix socket.")
+@click.option("--socket", "socket_path", type=click.Path(dir_okay=False), envvar="K8T_SOCKET", required=True, help="Socket to listen on.")
+@click.option("--polling", is_flag=True, default=False, help="Detect file changes by polling, even if inotify is available.")
+@click.option("--secrets-ttl", type=click.FloatRange(min=0), default=300, show_default=True, help="Request secrets again once they are older than this (seconds).")
+@click.argument("directory", type=click.Path(dir_okay=True, file_okay=False, exists=True), default=os.getcwd())
+@requires_project_directory
+def cli_serve(socket_path, polling, secrets_ttl, directory):
+    # pylint: disable=import-outside-toplevel
+    from k8t import server
+
+    try:
+        daemon = server.bind(socket_path, directory, polling, secrets_ttl=secrets_ttl)
+    except RuntimeError as err:
+        raise click.ClickException(str(err))
+
+    click.echo("serving {} on {}".format(os.path.abspath(directory), socket_path), err=True)
+
+    daemon.serve()
+
+
+def _emit_watch(output_dir, session, rendered):
+    # pylint: disable=import-outside-toplevel
+    from k8t.matrix import write_output
+
+    for template_path, error in sorted(session.errors.items()):
+        click.secho("{}: ✗ -> {}".format(template_path, error), fg="red", err=True)
+
+    if output_dir is None:
+        click.echo(session.output(), nl=False)
+    else:
+        path = write_output(output_dir, session.cluster, session.environment, session.output())
+
+        click.echo("{}: ✔ ({} templates rendered)".format(path, len(rendered)))
+
 
 @root.group(help="Code scaffolding commands.")
 def new():
@@ -205,7 +482,7 @@ def new_environment(cname, name, directory):
 @click.option("--environment", "-e", "ename", metavar="NAME", help="Deployment environment to use.")
 @click.option("--name", "-n", help="Template filename.")
 @click.option("--prefix", "-p", help="Prefix for filename.")
-@click.argument("kind", type=click.Choice(sorted(list(scaffolding.list_available_templates()))))
+@click.argument("kind", type=LazyChoice(lambda: sorted(scaffolding.list_available_templates())))
 @click.argument("directory", type=click.Path(exists=True, file_okay=False), default=os.getcwd())
 @requires_project_directory
 def new_template(cname, ename, name, prefix, kind, directory):
@@ -239,9 +516,11 @@ def get_clusters(directory):
 @click.argument("directory", type=click.Path(exists=True, file_okay=False), default=os.getcwd())
 @requires_project_directory
 def get_environments(cname, directory):  # pylint: disable=redefined-outer-name
-    path = project.get_base_dir(directory, cname, environment=None)
+    project.get_base_dir(directory, cname, environment=None)
+
+    parts = ("clusters", cname) if cname is not None else ()
 
-    for environment_path in environment.list_all(path):
+    for environment_path in project.get_index(directory).environments(*parts):
         click.echo(environment_path)
 
 
@@ -251,10 +530,33 @@ def get_environments(cname, directory):  # pylint: disable=redefined-outer-name
 @click.argument("directory", type=click.Path(exists=True, file_okay=False), default=os.getcwd())
 @requires_project_directory
 def get_templates(directory, cname, ename):  # pylint: disable=redefined-outer-name
+    # pylint: disable=import-outside-toplevel
+    from k8t.engine import build
+
     for template_path in build(directory, cname, ename).list_templates():
         click.echo(template_path)
 
 
+@get.command(name="dependents", help="Get templates including, importing or extending a template.")
+@click.option("--cluster", "-c", "cname", metavar="NAME", help="Cluster context to use.")
+@click.option("--environment", "-e", "ename", metavar="NAME", help="Deployment environment to use.")
+@click.option("--cache-dir", type=click.Path(file_okay=False), envvar="K8T_CACHE_DIR", help="Keep the dependency index in this directory.")
+@click.argument("template")
+@click.argument("directory", type=click.Path(exists=True, file_okay=False), default=os.getcwd())
+@requires_project_directory
+def get_dependents(directory, cname, ename, cache_dir, template):  # pylint: disable=redefined-outer-name
+    # pylint: disable=import-outside-toplevel
+    from k8t.dependencies import build_index
+    from k8t.engine import build
+
+    index = build_index(build(directory, cname, ename), cache_dir)
+
+    for template_path in sorted(index.dependents([template])):
+        click.echo(template_path)
+
+    index.save()
+
+
 @get.command(name="values", help="Get final value set.")
 @click.option("-m", "--method", type=click.Choice(MERGE_METHODS), default="ltr", show_default=True, help="Value file merge method.")
 @click.option("--value-file", "value_files", multiple=True, type=click.Path(dir_okay=False, exists=True), help="Additional value file to include.")
@@ -262,12 +564,30 @@ def get_templates(directory, cname, ename):  # pylint: disable=redefined-outer-n
 @click.option("--cluster", "-c", "cname", metavar="NAME", help="Cluster context to use.")
 @click.option("--environment", "-e", "ename", metavar="NAME", help="Deployment environment to use.")
 @click.option("--output-format", "-o", type=click.Choice(["json", "yaml"]), default="json", help="Specify output format for values.")
+@click.option("--explain", is_flag=True, default=False, help="Show which file every value comes from.")
+@click.option("--cache-dir", type=click.Path(file_okay=False), envvar="K8T_CACHE_DIR", help="Cache parsed value files in this directory.")
 @click.argument("directory", type=click.Path(exists=True, file_okay=False), default=os.getcwd())
 @requires_project_directory
-def get_values(directory, method, value_files, cli_values, cname, ename, output_format):  # pylint: disable=redefined-outer-name
+def get_values(directory, method, value_files, cli_values, cname, ename, output_format, explain, cache_dir):  # pylint: disable=redefined-outer-name,too-many-arguments
+    # pylint: disable=import-outside-toplevel
+    from k8t.matrix import load_values
+    from k8t.usage import format_path
+
+    set_parse_cache(cache_dir or None)
+    project.set_index_cache(cache_dir or None)
+
+    if explain:
+        for path, value, source in values.explain(load_values(directory, cname, ename, method, value_files, cli_values)):
+            if source is not None and os.path.isfile(source):
+                source = os.path.relpath(source, directory)
+
+            click.echo("{} = {} ({})".format(format_path(path), to_json(value), source))
+
+        return
+
     vals = deep_merge(  # pylint: disable=redefined-outer-name
         values.load_all(directory, cname, ename, method),
-        *(load_yaml(p) for p in value_files),
+        *load_yaml_files(value_files),
         dict(load_cli_value(k, v) for k, v in cli_values),
         envvalues(),
         method=method,
@@ -279,6 +599,76 @@ def get_values(directory, method, value_files, cli_values, cname, ename, output_
         print(to_yaml(vals))
 
 
+@get.command(name="readers", help="Get templates reading a value path (e.g. app.image.tag).")
+@click.option("--cluster", "-c", "cname", metavar="NAME", help="Cluster context to use.")
+@click.option("--environment", "-e", "ename", metavar="NAME", help="Deployment environment to use.")
+@click.option("--suffix", "-s", "suffixes", default=[".yaml", ".j2", ".jinja2"], help="Filter template files by suffix. Can be used multiple times.", show_default=True)
+@click.argument("path")
+@click.argument("directory", type=click.Path(exists=True, file_okay=False), default=os.getcwd())
+@requires_project_directory
+def get_readers(directory, cname, ename, suffixes, path):  # pylint: disable=redefined-outer-name
+    # pylint: disable=import-outside-toplevel
+    from k8t.engine import build
+    from k8t.usage import UsageIndex, parse_path
+
+    eng = build(directory, cname, ename)
+    names = [name for name in eng.list_templates() if not suffixes or os.path.splitext(name)[1] in suffixes]
+
+    for template_path in sorted(UsageIndex(eng, names).readers(parse_path(path))):
+        click.echo(template_path)
+
+
+@get.command(name="unused-values", help="Get values not read by any template.")
+@click.option("-m", "--method", type=click.Choice(MERGE_METHODS), default="ltr", show_default=True, help="Value file merge method.")
+@click.option("--value-file", "value_files", multiple=True, type=click.Path(dir_okay=False, exists=True), help="Additional value file to include.")
+@click.option("--value", "cli_values", type=(str, str), multiple=True, metavar="KEY VALUE", help="Additional value(s) to include.")
+@click.option("--cluster", "-c", "cname", metavar="NAME", help="Cluster context to use.")
+@click.option("--environment", "-e", "ename", metavar="NAME", help="Deployment environment to use.")
+@click.option("--suffix", "-s", "suffixes", default=[".yaml", ".j2", ".jinja2"], help="Filter template files by suffix. Can be used multiple times.", show_default=True)
+@click.argument("directory", type=click.Path(exists=True, file_okay=False), default=os.getcwd())
+@requires_project_directory
+def get_unused_values(directory, method, value_files, cli_values, cname, ename, suffixes):  # pylint: disable=redefined-outer-name,too-many-arguments
+    # pylint: disable=import-outside-toplevel
+    from k8t.engine import build
+    from k8t.usage import UsageIndex, format_path
+
+    vals = deep_merge(  # pylint: disable=redefined-outer-name
+        values.load_all(directory, cname, ename, method),
+        *load_yaml_files(value_files),
+        dict(load_cli_value(k, v) for k, v in cli_values),
+        envvalues(),
+        method=method,
+    )
+
+    eng = build(directory, cname, ename)
+    names = [name for name in eng.list_templates() if not suffixes or os.path.splitext(name)[1] in suffixes]
+
+    for path in sorted(UsageIndex(eng, names).unused(vals)):
+        click.echo(format_path(path))
+
+
+@root.group(name="cache", help="Compiled template cache commands.")
+def cache_group():
+    pass
+
+
+@cache_group.command(name="stats", help="Show cache statistics.")
+@click.option("--cache-dir", type=click.Path(file_okay=False), envvar="K8T_CACHE_DIR", default=CACHE_DIR, show_default=True, help="Cache directory.")
+def cache_stats(cache_dir):
+    from k8t import cache  # pylint: disable=import-outside-toplevel
+
+    for key, value in cache.stats(cache_dir).items():
+        click.echo("{}: {}".format(key, value))
+
+
+@cache_group.command(name="clear", help="Remove all cache entries.")
+@click.option("--cache-dir", type=click.Path(file_okay=False), envvar="K8T_CACHE_DIR", default=CACHE_DIR, show_default=True, help="Cache directory.")
+def cache_clear(cache_dir):
+    from k8t import cache  # pylint: disable=import-outside-toplevel
+
+    click.echo("removed {} entries".format(cache.clear(cache_dir)))
+
+
 @root.group(help="Edit local project files.")
 def edit():
     pass
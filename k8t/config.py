@@ -8,19 +8,50 @@
 # THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
 import logging
-from typing import Any, Dict, List
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
 
+from k8t.profiling import traced
 from k8t.project import find_files
-from k8t.util import deep_merge, load_yaml
+from k8t.util import deep_merge, load_yaml_files
 
 LOGGER = logging.getLogger(__name__)
+# used unless a config is set for the current context, see use
 CONFIG = {}
 
+_CURRENT: ContextVar[Optional[Dict[str, Any]]] = ContextVar("k8t_config", default=None)
 
+
+def current() -> Dict[str, Any]:
+    """
+    get the config of the current context, CONFIG if none is set.
+    """
+
+    conf = _CURRENT.get()
+
+    return CONFIG if conf is None else conf
+
+
+@contextmanager
+def use(conf: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    set the config for the current context, e.g. a thread or task.
+    """
+
+    token = _CURRENT.set(conf)
+
+    try:
+        yield conf
+    finally:
+        _CURRENT.reset(token)
+
+
+@traced("config.load_all")
 def load_all(root: str, cluster: str, environment: str, method: str) -> Dict[str, Any]:
     configs: List[str] = find_files(
         root, cluster, environment, "config.yaml", dir_ok=False)
 
     LOGGER.debug("using config files: %s", configs)
 
-    return deep_merge(*[load_yaml(f) for f in configs], method=method)
+    return deep_merge(*load_yaml_files(configs), method=method)
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import logging
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from jinja2 import Environment, nodes
+from jinja2.exceptions import TemplateNotFound
+
+from k8t.dependencies import DependencyIndex
+from k8t.profiling import redact, span
+from k8t.templates import CompiledTemplate, compile_template, parse_output, render_documents
+
+LOGGER = logging.getLogger(__name__)
+MAX_WORKERS = 16
+
+_COLLECTOR: ContextVar[Optional["SecretCollector"]] = ContextVar("k8t_secret_collector", default=None)
+
+
+class SecretCollector:
+    """
+    Records get_secret calls and hands out placeholder tokens for them.
+
+    Tokens are mixed case, so filters like upper or b64encode do not leave a
+    token behind that could be substituted.
+    """
+
+    def __init__(self):
+        self._prefix = "K8tSecret{}N".format(uuid.uuid4().hex)
+        self._pattern = re.compile(re.escape(self._prefix) + r"(\d+)E")
+        self._requests: List[Tuple[Callable, str, Optional[int], Optional[dict]]] = []
+        self._tokens: Dict[Any, str] = {}
+        self._issued: List[str] = []
+        self._values: Optional[List[str]] = None
+
+    def defer(self, provider: Callable, key: str, length: Optional[int] = None, config_override: Optional[dict] = None) -> str:
+        request_key = (provider, key, length, repr(config_override))
+
+        if request_key not in self._tokens:
+            self._tokens[request_key] = "{}{}E".format(self._prefix, len(self._requests))
+            self._requests.append((provider, key, length, config_override))
+
+        self._issued.append(self._tokens[request_key])
+
+        return self._tokens[request_key]
+
+    def issued(self) -> List[str]:
+        """
+        tokens handed out since the last call.
+        """
+
+        issued, self._issued = self._issued, []
+
+        return issued
+
+    def resolve(self) -> None:
+        """
+        retrieve all recorded secrets concurrently.
+        """
+
+        if not self._requests:
+            self._values = []
+
+            return
+
+        LOGGER.debug("resolving %d deferred secrets", len(self._requests))
+
+        with span("secrets.resolve", count=len(self._requests)):
+            with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(self._requests))) as executor:
+                # providers read config and secret store of the rendering context
+                futures = [executor.submit(copy_context().run, _fetch, *request) for request in self._requests]
+
+                self._values = [future.result() for future in futures]
+
+    def substitute(self, output: str) -> str:
+        return self._pattern.sub(lambda match: self._values[int(match.group(1))], output)
+
+
+def _fetch(provider: Callable, key: str, *args: Any) -> str:
+    with span("secret", provider=provider.__name__, key=redact(key)):
+        return provider(key, *args)
+
+
+def current() -> Optional[SecretCollector]:
+    return _COLLECTOR.get()
+
+
+def _is_secret_call(node: nodes.Node) -> bool:
+    return isinstance(node, nodes.Call) and getattr(node.node, "name", None) == "get_secret"
+
+
+def _output_calls(node: nodes.Node, output: bool, result: set) -> None:
+    # collect get_secret calls whose result ends up in the output unchanged,
+    # filters (indent, tojson, ...) may keep a placeholder but change a secret
+    if _is_secret_call(node):
+        if output:
+            result.add(id(node))
+
+        output = False
+
+    if isinstance(node, nodes.Output):
+        for child in node.nodes:
+            _output_calls(child, True, result)
+    elif isinstance(node, nodes.CondExpr):
+        _output_calls(node.test, False, result)
+        _output_calls(node.expr1, output, result)
+
+        if node.expr2 is not None:
+            _output_calls(node.expr2, output, result)
+    else:
+        output = output and isinstance(node, nodes.Concat)
+
+        for child in node.iter_child_nodes():
+            _output_calls(child, output, result)
+
+
+def deferrable(template: CompiledTemplate) -> bool:
+    """
+    check if a template only writes secrets to its output, secrets used
+    otherwise (conditions, assignments, filters, ...) have to be known while
+    rendering.
+    """
+
+    calls = {id(call) for call in template.ast.find_all(nodes.Call) if _is_secret_call(call)}
+
+    if not calls:
+        return True
+
+    output_calls: set = set()
+    _output_calls(template.ast, False, output_calls)
+
+    return calls <= output_calls
+
+
+def _deferrable(template: CompiledTemplate, engine: Environment, index: DependencyIndex) -> bool:
+    # included and imported templates are rendered along with the template
+    dependencies = index.dependencies(template.name)
+
+    if dependencies is None:
+        return False
+
+    try:
+        return all(deferrable(compile_template(name, engine)) for name in {template.name} | dependencies)
+    except TemplateNotFound:
+        return False
+
+
+def render_deferred(templates: List[Union[str, CompiledTemplate]], values: dict, engine: Environment,
+                    documents: bool = False) -> List[Any]:
+    """
+    render templates with placeholders for secrets, resolve all secrets at
+    once and substitute them afterwards.
+
+    templates using secrets in any other way than writing them to the output
+    are rendered as usual once the secrets are resolved, as are templates
+    whose output lost a placeholder to a filter.
+
+    with documents the result holds (output, parsed documents) tuples, see
+    render_documents.
+    """
+
+    templates = [compile_template(template, engine) for template in templates]
+    index = DependencyIndex(engine)
+    collector = SecretCollector()
+    outputs: List[Optional[Tuple[str, List[str]]]] = []
+
+    token = _COLLECTOR.set(collector)
+
+    try:
+        for template in templates:
+            if _deferrable(template, engine, index):
+                outputs.append((template.template.render(values), collector.issued()))
+            else:
+                outputs.append(None)
+    finally:
+        _COLLECTOR.reset(token)
+
+    collector.resolve()
+
+    result = []
+
+    for template, deferred_output in zip(templates, outputs):
+        if deferred_output is None or not all(issued in deferred_output[0] for issued in deferred_output[1]):
+            # secrets are resolved by now, rendering again hits the provider caches
+            result.append(render_documents(template, values, engine))
+        else:
+            output = collector.substitute(deferred_output[0])
+            result.append((output, parse_output(output)))
+
+    if documents:
+        return result
+
+    return [output for output, _ in result]
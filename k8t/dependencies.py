@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import json
+import logging
+import os
+import posixpath
+import tempfile
+from typing import Any, Dict, Iterable, Optional, Set
+
+from jinja2 import Environment, FileSystemLoader, meta
+from jinja2.exceptions import TemplateNotFound, TemplateSyntaxError
+from jinja2.loaders import split_template_path
+
+from k8t.cache import DEPENDENCY_INDEX
+
+LOGGER = logging.getLogger(__name__)
+INDEX_VERSION = 1
+
+
+def _references(engine: Environment, source: str) -> Dict[str, Any]:
+    references = set(meta.find_referenced_templates(engine.parse(source)))
+
+    return dict(
+        references=sorted(reference for reference in references if reference is not None),
+        dynamic=None in references,
+    )
+
+
+class DependencyIndex:
+    """
+    Maps templates to the templates they include, import or extend.
+
+    Entries are stored per resolved file, so one index can be shared by every
+    cluster and environment of a project: the same template name resolves to
+    different files in overlay paths. If a path is given the index is
+    persisted there, files are only parsed again if their modification time
+    or size changed.
+    """
+
+    def __init__(self, engine: Environment, path: Optional[str] = None):
+        self.engine = engine
+        self.path = path
+
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._names: Dict[str, Dict[str, Any]] = {}
+        self._modified = False
+
+        if path is not None:
+            self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r") as stream:
+                data = json.load(stream)
+        except FileNotFoundError:
+            return
+        except ValueError as exc:
+            LOGGER.warning("ignoring invalid dependency index %s: %s", self.path, exc)
+
+            return
+
+        if data.get("version") == INDEX_VERSION:
+            self._files = data.get("files", {})
+
+    def save(self) -> None:
+        if self.path is None or not self._modified:
+            return
+
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+
+        file_descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+
+        with os.fdopen(file_descriptor, "w") as stream:
+            json.dump(dict(version=INDEX_VERSION, files=self._files), stream)
+
+        os.replace(temp_path, self.path)
+
+        self._modified = False
+
+    def _resolve(self, name: str) -> Optional[str]:
+        loader = self.engine.loader
+
+        if not isinstance(loader, FileSystemLoader):
+            return None
+
+        pieces = split_template_path(name)
+
+        for searchpath in loader.searchpath:
+            filename = posixpath.join(searchpath, *pieces)
+
+            if os.path.isfile(filename):
+                return os.path.abspath(filename)
+
+        raise TemplateNotFound(name)
+
+    def _entry(self, name: str) -> Dict[str, Any]:
+        filename = self._resolve(name)
+
+        if filename is None:
+            # not file based (template overrides), nothing to persist
+            if name not in self._names:
+                self._names[name] = _references(self.engine, self.engine.loader.get_source(self.engine, name)[0])
+
+            return self._names[name]
+
+        stat = os.stat(filename)
+        entry = self._files.get(filename)
+
+        if entry is None or entry["mtime"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+            LOGGER.debug("indexing template %s (%s)", name, filename)
+
+            with open(filename, "r") as stream:
+                entry = _references(self.engine, stream.read())
+
+            entry.update(mtime=stat.st_mtime_ns, size=stat.st_size)
+
+            self._files[filename] = entry
+            self._modified = True
+
+        return entry
+
+    def references(self, name: str) -> Optional[Set[str]]:
+        """
+        templates directly referenced by a template, None if it references a
+        template only known at runtime. broken templates reference nothing,
+        rendering them reports the error.
+        """
+
+        try:
+            entry = self._entry(name)
+        except (TemplateNotFound, TemplateSyntaxError):
+            return set()
+
+        if entry["dynamic"]:
+            return None
+
+        return set(entry["references"])
+
+    def dependencies(self, name: str) -> Optional[Set[str]]:
+        """
+        all templates a template depends on, None if that can not be determined.
+        """
+
+        result: Set[str] = set()
+        pending = [name]
+
+        while pending:
+            references = self.references(pending.pop())
+
+            if references is None:
+                return None
+
+            pending.extend(references - result)
+            result |= references
+
+        return result
+
+    def dependents(self, names: Iterable[str], candidates: Optional[Iterable[str]] = None) -> Set[str]:
+        """
+        all templates depending on any of the given templates. templates with
+        runtime references are considered to depend on everything.
+        """
+
+        names = set(names)
+
+        if not names:
+            return set()
+
+        reverse: Dict[str, Set[str]] = {}
+        dynamic = set()
+
+        for candidate in (candidates if candidates is not None else self.engine.list_templates()):
+            references = self.references(candidate)
+
+            if references is None:
+                dynamic.add(candidate)
+            else:
+                for reference in references:
+                    reverse.setdefault(reference, set()).add(candidate)
+
+        result = set(dynamic)
+        pending = list(names | dynamic)
+
+        while pending:
+            for dependent in reverse.get(pending.pop(), ()):
+                if dependent not in result:
+                    result.add(dependent)
+                    pending.append(dependent)
+
+        return result
+
+
+def build_index(engine: Environment, cache_dir: Optional[str] = None) -> DependencyIndex:
+    return DependencyIndex(engine, os.path.join(cache_dir, DEPENDENCY_INDEX) if cache_dir is not None else None)
@@ -10,18 +10,20 @@
 import os
 import logging
 
-from typing import List
-from jinja2 import Environment, DictLoader, FileSystemLoader, StrictUndefined
+from typing import List, Optional
+from jinja2 import BytecodeCache, Environment, DictLoader, FileSystemLoader, StrictUndefined
 
 from k8t.filters import (b64decode, b64encode, envvar, get_secret, hashf,
                          random_password, sanitize_label, sanitize_cpu, sanitize_memory, standardize_cpu, standardize_memory, to_bool)
+from k8t.profiling import traced
 from k8t.project import find_files
-from k8t.util import read_file
+from k8t.util import json_default, read_file
 
 LOGGER = logging.getLogger(__name__)
 
 
-def build(path: str, cluster: str, environment: str, template_overrides: List[str] = None) -> Environment:
+@traced("engine.build")
+def build(path: str, cluster: str, environment: str, template_overrides: List[str] = None, bytecode_cache: Optional[BytecodeCache] = None) -> Environment:
     env = None
     template_paths = []
 
@@ -31,11 +33,11 @@ def build(path: str, cluster: str, environment: str, template_overrides: List[st
     if template_overrides is not None and len(template_overrides) > 0:
         template_paths = {key: read_file(os.path.abspath(path)) for key, path in template_overrides}
 
-        env = Environment(undefined=StrictUndefined, loader=DictLoader(template_paths))
+        env = Environment(undefined=StrictUndefined, loader=DictLoader(template_paths), bytecode_cache=bytecode_cache)
     else:
         template_paths = find_template_paths(path, cluster, environment)
 
-        env = Environment(undefined=StrictUndefined, loader=FileSystemLoader(template_paths))
+        env = Environment(undefined=StrictUndefined, loader=FileSystemLoader(template_paths), bytecode_cache=bytecode_cache)
 
     # Filter functions
     env.filters["b64decode"] = b64decode
@@ -48,6 +50,9 @@ def build(path: str, cluster: str, environment: str, template_overrides: List[st
     env.filters["standardize_cpu"] = standardize_cpu
     env.filters["standardize_memory"] = standardize_memory
 
+    # lazily merged values are no dicts
+    env.policies["json.dumps_kwargs"] = dict(env.policies["json.dumps_kwargs"], default=json_default)
+
     # Global functions
     env.globals["random_password"] = random_password
     env.globals["get_secret"] = get_secret
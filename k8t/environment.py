@@ -7,27 +7,13 @@
 #
 # THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
-import os
 from typing import Set
 
-from k8t.util import list_files
+from k8t.project import get_index
 
 
 def list_all(path: str) -> Set[str]:
-    env_dir = os.path.join(path, 'environments')
-
-    result = set()
-
-    if os.path.isdir(env_dir):
-        result.update(list_files(env_dir, include_directories=True))
-
-    cluster_dir = os.path.join(path, 'clusters')
-
-    if os.path.isdir(cluster_dir):
-        for cluster in list_files(cluster_dir, include_directories=True):
-            result.update(list_all(os.path.join(cluster_dir, cluster)))
-
-    return result
+    return get_index(path).environments()
 
 
 # vim: fenc=utf-8:ts=4:sw=4:expandtab
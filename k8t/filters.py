@@ -13,27 +13,20 @@
 
 import base64
 import hashlib
-import os
 import re
-import string
 from typing import Any, Optional
 
-from k8t import config, secret_providers, util
+from k8t import config, deferred, quantity, randomness, secret_providers
+from k8t.profiling import redact, span
+from k8t.util import environ
 
-try:
-    from secrets import choice
-except ImportError:
-    from random import SystemRandom
 
-    choice = SystemRandom().choice
-
-
-def random_password(length: int) -> str:
-    return "".join(choice(string.ascii_lowercase + string.digits) for _ in range(length))
+def random_password(length: int, alphabet: str = randomness.DEFAULT_ALPHABET) -> str:
+    return randomness.random_string(length, alphabet)
 
 
 def envvar(key: str, default: Any = None) -> str:
-    return os.environ.get(key, default)
+    return environ().get(key, default)
 
 
 def b64encode(value: Any) -> str:
@@ -81,7 +74,7 @@ def hashf(value, method="sha256"):
 
 
 def get_secret(key: str, length: Optional[int] = None, config_override: Optional[dict] = None) -> str:
-    provider_name = config.CONFIG.get("secrets", {}).get("provider")
+    provider_name = config.current().get("secrets", {}).get("provider")
 
     if not provider_name:
         raise RuntimeError("Secrets provider not configured.")
@@ -92,7 +85,13 @@ def get_secret(key: str, length: Optional[int] = None, config_override: Optional
     except AttributeError as no_secret_provider:
         raise NotImplementedError(f"secret provider {provider_name} does not exist.") from no_secret_provider
 
-    return provider(key, length, config_override)
+    collector = deferred.current()
+
+    if collector is not None:
+        return collector.defer(provider, key, length, config_override)
+
+    with span("secret", provider=provider_name, key=redact(key)):
+        return provider(key, length, config_override)
 
 
 def to_bool(value: Any) -> Optional[bool]:
@@ -137,16 +136,10 @@ def standardize_cpu(value: Any) -> int:
     standardize cpu values to millicores.
     """
 
-    value_millis: int
-
-    str_value = str(value)
-
-    if re.fullmatch(r"^[0-9]+(\.[0-9]+)?$", str_value):
-        value_millis = int(float(value) * 1000)
-    elif re.fullmatch(r"^[0-9]+m$", str_value):
-        value_millis = int(str_value[:-1])
-    else:
-        raise ValueError(f"invalid cpu value: {value}")
+    try:
+        value_millis = quantity.to_millis(value)
+    except ValueError:
+        raise ValueError(f"invalid cpu value: {value}") from None
 
     if value_millis < 1:
         raise ValueError(f"invalud cpu value: {value_millis} is less than 1")
@@ -161,18 +154,10 @@ def standardize_memory(value: Any) -> int:
     https://kubernetes.io/docs/concepts/configuration/manage-resources-containers/#meaning-of-memory
     """
 
-    value_mb: int
-
-    str_value = str(value)
-
-    if re.fullmatch(r"^[0-9]+([EPTGMk]i?)?$", str_value):
-        value_mb = util.memory_to_mb(f"{value}B")
-    elif re.fullmatch(r"^[0-9]+m$", str_value):
-        value_mb = util.memory_to_mb(f"{int(str_value[:-1]) / 1000}B")
-    elif re.fullmatch(r"^[0-9]+e[0-9]+$", str_value):
-        value_mb = util.memory_to_mb(f"{float(value)}B")
-    else:
-        raise ValueError(f"invalid memory value: {value}")
+    try:
+        value_mb = quantity.to_megabytes(value)
+    except ValueError:
+        raise ValueError(f"invalid memory value: {value}") from None
 
     if value_mb < 1:
         raise ValueError(f"invalid memory value: {value_mb} is less than one MB")
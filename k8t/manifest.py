@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, Mapping, Optional, Tuple
+
+from jinja2 import Environment
+
+import k8t
+from k8t.util import environ
+
+LOGGER = logging.getLogger(__name__)
+MANIFEST_FILE = ".k8t-manifest.json"
+
+# env() calls, only variables with literal names can be recorded
+ENV_CALL = re.compile(r"\benv\s*\(")
+ENV_LITERAL_CALL = re.compile(r"""\benv\s*\(\s*(["'])([^"'\\]*)\1\s*[,)]""")
+
+
+def _normalize(data: Any) -> Any:
+    if isinstance(data, Mapping):
+        return {str(key): _normalize(value) for key, value in data.items()}
+
+    if isinstance(data, (list, tuple)):
+        return [_normalize(value) for value in data]
+
+    return data
+
+
+def digest(data: Any) -> str:
+    return hashlib.sha256(json.dumps(_normalize(data), sort_keys=True, default=str).encode()).hexdigest()
+
+
+def file_digest(path: str) -> str:
+    with open(path, "rb") as stream:
+        return hashlib.sha256(stream.read()).hexdigest()
+
+
+def _sources(engine: Environment) -> Iterator[Tuple[str, str]]:
+    # every template visible to the engine, includes and imports resolve to one of them
+    for name in engine.list_templates():
+        source, filename, _ = engine.loader.get_source(engine, name)
+
+        yield filename or name, source
+
+
+def template_digests(engine: Environment) -> Dict[str, str]:
+    """
+    hash every template visible to the engine.
+    """
+
+    return {filename: hashlib.sha256(source.encode()).hexdigest() for filename, source in _sources(engine)}
+
+
+def environment_digests(engine: Environment) -> Optional[Dict[str, str]]:
+    """
+    hash the environment variables templates read through env(), None if a
+    template computes the name of a variable.
+    """
+
+    names = set()
+
+    for _, source in _sources(engine):
+        literal = ENV_LITERAL_CALL.findall(source)
+
+        if len(literal) < len(ENV_CALL.findall(source)):
+            return None
+
+        names.update(name for _, name in literal)
+
+    env = environ()
+
+    return {name: digest(env.get(name)) for name in sorted(names)}
+
+
+def fingerprint(values: Dict[str, Any], conf: Dict[str, Any], engine: Environment, suffixes: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    return dict(
+        version=k8t.__version__,
+        templates=template_digests(engine),
+        environment=environment_digests(engine),
+        values=digest(values),
+        config=digest(conf),
+        suffixes=sorted(suffixes or []),
+    )
+
+
+def unchanged(previous: Optional[Dict[str, Any]], inputs: Dict[str, Any]) -> bool:
+    """
+    check if the inputs of an output match its previous fingerprint. outputs
+    of templates reading environment variables with computed names are never
+    unchanged.
+    """
+
+    return previous is not None and inputs.get("environment") is not None and previous == inputs
+
+
+def load(output_dir: str) -> Dict[str, Any]:
+    path = os.path.join(output_dir, MANIFEST_FILE)
+
+    try:
+        with open(path, "r") as stream:
+            manifest = json.load(stream)
+    except FileNotFoundError:
+        return {}
+    except ValueError as exc:
+        LOGGER.warning("ignoring invalid manifest %s: %s", path, exc)
+
+        return {}
+
+    if manifest.get("version") != k8t.__version__:
+        LOGGER.debug("manifest was written by k8t %s, ignoring it", manifest.get("version"))
+
+        return {}
+
+    return manifest.get("outputs", {})
+
+
+def save(output_dir: str, outputs: Dict[str, Any]) -> None:
+    os.makedirs(output_dir, exist_ok=True)
+
+    file_descriptor, temp_path = tempfile.mkstemp(dir=output_dir, suffix=".tmp")
+
+    with os.fdopen(file_descriptor, "w") as stream:
+        json.dump(dict(version=k8t.__version__, outputs=outputs), stream, indent=2, sort_keys=True)
+
+    os.replace(temp_path, os.path.join(output_dir, MANIFEST_FILE))
+
+
+def previous(outputs: Dict[str, Any], output_path: str) -> Optional[Dict[str, Any]]:
+    """
+    get the recorded fingerprint for an output, as long as the output file is
+    still the one that was written.
+    """
+
+    entry = outputs.get(os.path.basename(output_path))
+
+    if entry is None or not os.path.isfile(output_path):
+        return None
+
+    if file_digest(output_path) != entry.get("output"):
+        LOGGER.debug("output %s was modified, rendering again", output_path)
+
+        return None
+
+    return entry.get("inputs")
+
+
+def record(outputs: Dict[str, Any], output_path: str, inputs: Dict[str, Any]) -> None:
+    outputs[os.path.basename(output_path)] = dict(inputs=inputs, output=file_digest(output_path))
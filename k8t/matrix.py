@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from k8t import config, manifest, secret_providers, values
+from k8t.cache import TemplateCache
+from k8t.deferred import render_deferred
+from k8t.engine import build
+from k8t.profiling import traced
+from k8t.project import find_files, get_index
+from k8t.templates import compile_template, render, validate
+from k8t.util import deep_merge, envvalues, load_cli_value, load_yaml, load_yaml_files
+
+LOGGER = logging.getLogger(__name__)
+
+Target = Tuple[Optional[str], Optional[str]]
+
+# compiled templates shared by all targets rendered in one process
+_TEMPLATE_CACHE: Optional[TemplateCache] = None
+
+
+def list_targets(root: str) -> List[Target]:
+    """
+    list every cluster and environment combination of a project.
+    """
+
+    index = get_index(root)
+
+    global_environments = set(index.directories("environments"))
+
+    clusters = sorted(index.directories("clusters"))
+
+    if not clusters:
+        return [(None, ename) for ename in sorted(global_environments)] or [(None, None)]
+
+    targets: List[Target] = []
+
+    for cname in clusters:
+        environments = global_environments | index.environments("clusters", cname)
+
+        if environments:
+            targets.extend((cname, ename) for ename in sorted(environments))
+        else:
+            targets.append((cname, None))
+
+    return targets
+
+
+def target_name(cluster_name: Optional[str], environment_name: Optional[str]) -> str:
+    return "-".join(name for name in (cluster_name, environment_name) if name is not None) or "default"
+
+
+def output_path(output_dir: str, cluster_name: Optional[str], environment_name: Optional[str]) -> str:
+    return os.path.join(output_dir, "{}.yaml".format(target_name(cluster_name, environment_name)))
+
+
+def write_output(output_dir: str, cluster_name: Optional[str], environment_name: Optional[str], output: str) -> str:
+    path = output_path(output_dir, cluster_name, environment_name)
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    with open(path, "w") as stream:
+        stream.write(output)
+
+    return path
+
+
+# pylint: disable=too-many-arguments
+@traced("values.load")
+def load_values(root: str, cluster_name: Optional[str], environment_name: Optional[str], method: str = "ltr", value_files=(),
+                cli_values=()) -> values.LayeredValues:
+    """
+    load all value layers of a target, keys are merged when they are read.
+    """
+
+    return values.LayeredValues(
+        values.load_layers(root, cluster_name, environment_name)
+        + list(zip(value_files, load_yaml_files(list(value_files))))
+        + [("--value", dict(load_cli_value(k, v) for k, v in cli_values)), ("K8T_VALUE_*", envvalues())],
+        method,
+    )
+
+
+def load_config(root: str, cluster_name: Optional[str], environment_name: Optional[str], method: str = "ltr",
+                secret_provider: Optional[str] = None) -> Dict[str, Any]:
+    conf = config.load_all(root, cluster_name, environment_name, method)
+
+    if secret_provider is not None:
+        conf = deep_merge(conf, {"secrets": {"provider": secret_provider}})
+
+    return conf
+
+
+# pylint: disable=too-many-arguments,too-many-locals
+def render_target(root: str, cluster_name: Optional[str], environment_name: Optional[str], method: str = "ltr", value_files=(), cli_values=(),
+                  suffixes=None, secret_provider: Optional[str] = None, template_overrides=None, bytecode_cache: Optional[TemplateCache] = None,
+                  previous: Optional[Dict[str, Any]] = None, defer_secrets: bool = False) -> Tuple[Optional[str], Dict[str, Any]]:
+    """
+    render all templates of a single target into one multi document string.
+
+    returns the output together with the fingerprint of its inputs. if the
+    inputs match the previous fingerprint nothing is rendered and the output
+    is None.
+    """
+
+    vals = load_values(root, cluster_name, environment_name, method, value_files, cli_values)
+    conf = load_config(root, cluster_name, environment_name, method, secret_provider)
+
+    eng = build(root, cluster_name, environment_name, template_overrides, bytecode_cache)
+
+    inputs = manifest.fingerprint(vals, conf, eng, suffixes)
+
+    if manifest.unchanged(previous, inputs):
+        LOGGER.debug("inputs of %s did not change", target_name(cluster_name, environment_name))
+
+        return None, inputs
+
+    templates = eng.list_templates()
+
+    if suffixes:
+        templates = [name for name in templates if os.path.splitext(name)[1] in suffixes]
+
+    templates = [compile_template(template_path, eng) for template_path in templates]
+
+    # every target generates its own random secrets, also without workers
+    with config.use(conf), secret_providers.use_store(secret_providers.SecretStore()):
+        invalid = [template.name for template in templates if not validate(template, vals, eng)]
+
+        if invalid:
+            raise RuntimeError("Failed to validate templates: {}".format(", ".join(invalid)))
+
+        secret_providers.prefetch(set().union(*(template.secret_keys for template in templates)))
+
+        if defer_secrets:
+            outputs = render_deferred(templates, vals, eng)
+        else:
+            outputs = [render(template, vals, eng) for template in templates]
+
+    return "".join("---\n# Source: {}\n{}\n".format(template.name, output) for template, output in zip(templates, outputs)), inputs
+
+
+def _init_worker(bytecode_cache: Optional[TemplateCache]) -> None:
+    global _TEMPLATE_CACHE  # pylint: disable=global-statement
+
+    _TEMPLATE_CACHE = bytecode_cache
+
+
+def _render_target(task: Tuple[Target, Optional[Dict[str, Any]]], root: str, **kwargs) -> Tuple[Optional[str], Optional[Dict[str, Any]], Optional[str]]:
+    target, previous = task
+
+    try:
+        return (*render_target(root, *target, bytecode_cache=_TEMPLATE_CACHE, previous=previous, **kwargs), None)
+    except Exception as err:  # pylint: disable=broad-except
+        return None, None, str(err)
+
+
+def _preload(root: str, targets: List[Target]) -> None:
+    # parse every value and config layer once before the workers are forked
+    for cluster_name, environment_name in targets:
+        for name in ("values.yaml", "config.yaml"):
+            try:
+                paths = find_files(root, cluster_name, environment_name, name, dir_ok=False)
+            except RuntimeError:
+                continue  # reported by the worker
+
+            for path in paths:
+                load_yaml(path)
+
+
+def render_matrix(root: str, targets: List[Target], jobs: Optional[int] = None, bytecode_cache: Optional[TemplateCache] = None,
+                  previous: Optional[Dict[Target, Dict[str, Any]]] = None,
+                  **kwargs: Any) -> Iterator[Tuple[Target, Optional[str], Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    render several targets, yielding (target, output, inputs, error) in the order of targets.
+
+    targets whose inputs match their previous fingerprint are not rendered
+    and yield no output. parsed value layers and compiled templates are shared
+    between targets rendered by the same process.
+    """
+
+    if bytecode_cache is None:
+        bytecode_cache = TemplateCache()
+
+    func = partial(_render_target, root=root, **kwargs)
+    tasks = [(target, (previous or {}).get(target)) for target in targets]
+
+    if jobs is None or jobs <= 1:
+        _init_worker(bytecode_cache)
+
+        for task in tasks:
+            yield (task[0], *func(task))
+
+        return
+
+    _preload(root, targets)
+
+    LOGGER.debug("rendering %d targets on %d workers", len(targets), jobs)
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(bytecode_cache,)) as executor:
+        for target, result in zip(targets, executor.map(func, tasks)):
+            yield (target, *result)
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import os
+import tempfile
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from k8t.profiling import Recorder
+
+# seconds, from a quick template to a slow ssm lookup
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Dict[str, str]
+Sample = Tuple[str, Labels, float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+
+    if float(value).is_integer():
+        return str(int(value))
+
+    # sums of many spans collect float noise
+    return repr(round(float(value), 9))
+
+
+def _sample(name: str, labels: Labels, value: float) -> str:
+    if not labels:
+        return "{} {}".format(name, _format_value(value))
+
+    return "{}{{{}}} {}".format(name, ",".join('{}="{}"'.format(key, _escape(label)) for key, label in labels.items()), _format_value(value))
+
+
+def _family(name: str, kind: str, description: str, samples: Iterable[Sample]) -> List[str]:
+    lines = ["# HELP {} {}".format(name, description), "# TYPE {} {}".format(name, kind)]
+    lines.extend(_sample(*sample) for sample in samples)
+
+    return lines
+
+
+def _histogram(name: str, labels: Labels, durations: List[float]) -> List[Sample]:
+    samples = [(name + "_bucket", dict(labels, le=_format_value(bound)), sum(1 for duration in durations if duration <= bound))
+               for bound in BUCKETS + (float("inf"),)]
+    samples.append((name + "_sum", labels, sum(durations)))
+    samples.append((name + "_count", labels, len(durations)))
+
+    return samples
+
+
+def _durations(recorder: Recorder, span: str, *labels: str) -> Dict[Tuple[str, ...], List[Tuple[float, bool]]]:
+    # (seconds, failed) of every span with that name, grouped by some of its arguments
+    result: Dict[Tuple[str, ...], List[Tuple[float, bool]]] = {}
+
+    for event in recorder.events:
+        if event["name"] == span:
+            key = tuple(str(event["args"].get(label)) for label in labels)
+            result.setdefault(key, []).append((event["dur"] / 10 ** 6, bool(event["args"].get("error"))))
+
+    return result
+
+
+def _counters(recorder: Recorder, name: str) -> Dict[Tuple[Tuple[str, str], ...], float]:
+    return {labels: value for (counter, labels), value in recorder.counters.items() if counter == name}
+
+
+def render(recorder: Recorder, command: str, duration: float, timestamp: Optional[float] = None) -> str:
+    """
+    format the metrics of a run in the prometheus text format.
+    """
+
+    common = dict(command=command)
+    lines: List[str] = []
+
+    renders = _durations(recorder, "render", "template")
+    lines += _family("k8t_template_render_seconds", "histogram", "Time spent rendering a template.", [
+        sample for (template,), spans in sorted(renders.items())
+        for sample in _histogram("k8t_template_render_seconds", dict(common, template=template), [seconds for seconds, _ in spans])
+    ])
+
+    # requests sent to the backend of a provider, secrets found in memory are only counted as cache hits
+    lookups = sorted(_durations(recorder, "secret.lookup", "provider", "call").items())
+    lines += _family("k8t_secret_lookups_total", "counter", "Requests sent to a secret provider.", [
+        ("k8t_secret_lookups_total", dict(common, provider=provider, call=call), len(spans)) for (provider, call), spans in lookups
+    ])
+    lines += _family("k8t_secret_lookup_errors_total", "counter", "Requests to a secret provider that failed.", [
+        ("k8t_secret_lookup_errors_total", dict(common, provider=provider, call=call), sum(1 for _, failed in spans if failed))
+        for (provider, call), spans in lookups
+    ])
+    lines += _family("k8t_secret_lookup_seconds", "histogram", "Time spent on a request to a secret provider.", [
+        sample for (provider, call), spans in lookups
+        for sample in _histogram("k8t_secret_lookup_seconds", dict(common, provider=provider, call=call), [seconds for seconds, _ in spans])
+    ])
+
+    caches: Dict[str, Dict[str, float]] = {}
+
+    for labels, value in _counters(recorder, "cache").items():
+        labels = dict(labels)
+        caches.setdefault(labels["cache"], {"hit": 0, "miss": 0})[labels["result"]] += value
+
+    lines += _family("k8t_cache_hits_total", "counter", "Lookups answered by a cache.", [
+        ("k8t_cache_hits_total", dict(common, cache=name), results["hit"]) for name, results in sorted(caches.items())
+    ])
+    lines += _family("k8t_cache_misses_total", "counter", "Lookups missing a cache.", [
+        ("k8t_cache_misses_total", dict(common, cache=name), results["miss"]) for name, results in sorted(caches.items())
+    ])
+    lines += _family("k8t_cache_hit_ratio", "gauge", "Share of lookups answered by a cache.", [
+        ("k8t_cache_hit_ratio", dict(common, cache=name), results["hit"] / (results["hit"] + results["miss"]))
+        for name, results in sorted(caches.items()) if results["hit"] + results["miss"]
+    ])
+
+    lines += _family("k8t_output_bytes", "gauge", "Size of the rendered output of a target.", [
+        ("k8t_output_bytes", dict(common, **dict(labels)), value) for labels, value in sorted(_counters(recorder, "output_bytes").items())
+    ])
+
+    lines += _family("k8t_run_duration_seconds", "gauge", "Wall time of the run.", [("k8t_run_duration_seconds", common, duration)])
+    lines += _family("k8t_run_timestamp_seconds", "gauge", "Time the run finished.", [
+        ("k8t_run_timestamp_seconds", common, time.time() if timestamp is None else timestamp),
+    ])
+
+    return "\n".join(lines) + "\n"
+
+
+def write(path: str, text: str) -> None:
+    """
+    replace a metrics file at once, collectors never read a partial file.
+    """
+
+    directory = os.path.dirname(os.path.abspath(path))
+    file_descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+
+    try:
+        with os.fdopen(file_descriptor, "w") as stream:
+            stream.write(text)
+
+        # readable by collectors running as another user
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+        raise
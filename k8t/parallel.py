@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from jinja2 import Environment
+
+from k8t import config, secret_providers
+from k8t.deferred import render_deferred
+from k8t.engine import build
+from k8t.templates import CompiledTemplate, YamlValidationError, render, render_documents
+
+LOGGER = logging.getLogger(__name__)
+
+# per worker process state, set up once by _init_worker
+_ENGINE = None
+_VALUES: Dict[str, Any] = {}
+_DEFER_SECRETS = False
+
+
+def _init_worker(values: Dict[str, Any], conf: Dict[str, Any], random_store: Dict[str, str], ssm_store: Dict[Tuple[str, str, str], str],
+                 engine_args: Tuple, defer_secrets: bool = False) -> None:
+    global _ENGINE, _VALUES, _DEFER_SECRETS  # pylint: disable=global-statement
+
+    config.CONFIG = conf
+    secret_providers.RANDOM_STORE.update(random_store)
+    secret_providers.SSM_STORE.update(ssm_store)
+
+    _VALUES = values
+    _ENGINE = build(*engine_args)
+    _DEFER_SECRETS = defer_secrets
+
+
+def _render(template_path: str, documents: bool = False) -> Any:
+    try:
+        if _DEFER_SECRETS:
+            return render_deferred([template_path], _VALUES, _ENGINE, documents)[0]
+
+        if documents:
+            return render_documents(template_path, _VALUES, _ENGINE)
+
+        return render(template_path, _VALUES, _ENGINE)
+    except YamlValidationError as err:
+        # ruamel errors do not survive pickling, only pass on the message
+        raise YamlValidationError(str(err)) from None
+
+
+def render_all(templates: List[Union[str, CompiledTemplate]], values: Dict[str, Any], engine: Environment, engine_args: Tuple,
+               jobs: Optional[int] = None, defer_secrets: bool = False, documents: bool = False) -> Iterator[Any]:
+    """
+    render templates on a pool of worker processes.
+
+    values and config are handed to every worker once on startup, the
+    workers build their own engine from engine_args. the rendered output is
+    yielded in the order of templates.
+
+    with defer_secrets the secrets of a template are resolved concurrently
+    after rendering it, see k8t.deferred. without workers the secrets of all
+    templates are resolved at once. with documents
+    (output, parsed documents) tuples are yielded instead of the output.
+
+    secrets generated by every process on its own, see
+    secret_providers.per_process, can not be rendered on several workers as
+    they would differ between templates.
+    """
+
+    if jobs is None or jobs <= 1:
+        if defer_secrets:
+            yield from render_deferred(templates, values, engine, documents)
+
+            return
+
+        for template in templates:
+            yield render_documents(template, values, engine) if documents else render(template, values, engine)
+
+        return
+
+    if secret_providers.per_process(config.current()) and any(not isinstance(template, CompiledTemplate) or template.has_secrets for template in templates):
+        raise RuntimeError("Random secrets can not be rendered on several workers without a secrets store")
+
+    # compiled templates are bound to the engine of this process
+    template_paths = [template.name if isinstance(template, CompiledTemplate) else template for template in templates]
+
+    chunksize = max(1, len(template_paths) // (jobs * 4))
+
+    LOGGER.debug("rendering %d templates on %d workers", len(template_paths), jobs)
+
+    store = secret_providers.current_store()
+
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(values, config.current(), store.random, store.ssm, engine_args, defer_secrets),
+    ) as executor:
+        yield from executor.map(partial(_render, documents=documents), template_paths, chunksize=chunksize)
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Tuple
+
+# set while profiling, spans are not recorded otherwise
+_RECORDER: Optional["Recorder"] = None
+_DISABLED = nullcontext()
+
+DEFAULT_TOP = 10
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Recorder:
+    """
+    Collects timed spans as chrome trace events.
+
+    Spans of all threads of the process end up in one trace, nesting is
+    derived from their timestamps by the trace viewer. Spans of worker
+    processes are not recorded.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter_ns()
+        self.events: List[Dict[str, Any]] = []
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self._threads: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, args: Dict[str, Any]) -> Iterator[None]:
+        start = time.perf_counter_ns()
+        failed = False
+
+        try:
+            yield
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.record(name, start, time.perf_counter_ns(), dict(args, error=True) if failed else args)
+
+    def count(self, name: str, value: float, labels: Dict[str, str]) -> None:
+        key = (name, tuple(sorted(labels.items())))
+
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def record(self, name: str, start: int, end: int, args: Optional[Dict[str, Any]] = None) -> None:
+        thread_id = threading.get_ident()
+
+        if thread_id not in self._threads:
+            self._threads[thread_id] = threading.current_thread().name
+
+        # list.append is atomic, threads do not need a lock
+        self.events.append(dict(
+            name=name,
+            cat=name.split(".")[0],
+            ph="X",
+            ts=(start - self.origin) / 1000,
+            dur=(end - start) / 1000,
+            pid=os.getpid(),
+            tid=thread_id,
+            args=args or {},
+        ))
+
+    def trace(self) -> Dict[str, Any]:
+        metadata = [dict(name="thread_name", ph="M", pid=os.getpid(), tid=thread_id, args=dict(name=name))
+                    for thread_id, name in self._threads.items()]
+
+        return dict(traceEvents=metadata + sorted(self.events, key=lambda event: event["ts"]), displayTimeUnit="ms")
+
+    def write(self, path: str) -> None:
+        with open(path, "w") as stream:
+            json.dump(self.trace(), stream)
+
+    def summary(self, top: int = DEFAULT_TOP) -> List[Tuple[str, int, float, float]]:
+        """
+        the spans taking the most time in total as (name, count, total ms,
+        max ms) tuples.
+        """
+
+        totals: Dict[str, List[float]] = {}
+
+        for event in self.events:
+            entry = totals.setdefault(event["name"], [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += event["dur"] / 1000
+            entry[2] = max(entry[2], event["dur"] / 1000)
+
+        ranked = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)
+
+        return [(name, int(count), total, longest) for name, (count, total, longest) in ranked[:top]]
+
+
+def start() -> Recorder:
+    global _RECORDER  # pylint: disable=global-statement
+
+    _RECORDER = Recorder()
+
+    return _RECORDER
+
+
+def stop() -> Optional[Recorder]:
+    global _RECORDER  # pylint: disable=global-statement
+
+    recorder, _RECORDER = _RECORDER, None
+
+    return recorder
+
+
+def current() -> Optional[Recorder]:
+    return _RECORDER
+
+
+def count(name: str, value: float = 1, **labels: str) -> None:
+    """
+    add to a counter, does nothing unless profiling was started.
+    """
+
+    if _RECORDER is not None:
+        _RECORDER.count(name, value, labels)
+
+
+def span(name: str, **args: Any) -> ContextManager:
+    """
+    time a block, does nothing unless profiling was started.
+    """
+
+    if _RECORDER is None:
+        return _DISABLED
+
+    return _RECORDER.span(name, args)
+
+
+def traced(name: str) -> Callable[[Callable], Callable]:
+    """
+    time every call of a function, see span.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _RECORDER is None:
+                return func(*args, **kwargs)
+
+            with _RECORDER.span(name, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def redact(key: str) -> str:
+    # equal keys stay recognizable without ending up in the trace
+    return "redacted:" + hashlib.sha256(str(key).encode()).hexdigest()[:8]
+
+
+def format_summary(rows: List[Tuple[str, int, float, float]]) -> str:
+    lines = ["{:<24} {:>7} {:>11} {:>11}".format("span", "count", "total ms", "max ms")]
+    lines.extend("{:<24} {:>7} {:>11.2f} {:>11.2f}".format(*row) for row in rows)
+
+    return "\n".join(lines)
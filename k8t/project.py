@@ -7,8 +7,281 @@
 #
 # THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
+
+import json
+import logging
 import os
-from typing import List, Optional
+import tempfile
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+LOGGER = logging.getLogger(__name__)
+PROJECT_INDEX = "project.json"
+INDEX_VERSION = 1
+# directory timestamps are coarse, changes this close to a scan may go unnoticed
+RACY_WINDOW_NS = 2 * 10 ** 9
+
+# one index per project root, see get_index
+_INDEXES: Dict[str, "ProjectIndex"] = {}
+# indexes are also kept on disk if set, see set_index_cache
+_INDEX_CACHE_DIR: Optional[str] = None
+
+Key = Tuple[str, ...]
+
+
+class ProjectIndex:
+    """
+    Directory listings of a project, collected in a single walk.
+
+    Only the directories clusters, environments and their layers live in are
+    listed: the project root, every cluster and every environment, cluster
+    specific ones included. If a path is given the listings are persisted
+    there and reused as long as the modification time of every listed
+    directory is unchanged, adding or removing a file changes it.
+    """
+
+    def __init__(self, root: str, path: Optional[str] = None):
+        self.root = os.path.abspath(root)
+        self.path = path
+
+        # relative directory -> {entry name: is directory}
+        self._listings: Dict[Key, Dict[str, bool]] = {}
+        self._mtimes: Dict[Key, int] = {}
+        self._scanned = 0
+
+        if path is None or not self._load():
+            self._scan()
+            self.save()
+
+    def _load(self) -> bool:
+        try:
+            with open(self.path, "r") as stream:
+                data = json.load(stream)
+        except FileNotFoundError:
+            return False
+        except ValueError as exc:
+            LOGGER.warning("ignoring invalid project index %s: %s", self.path, exc)
+
+            return False
+
+        if data.get("version") != INDEX_VERSION or data.get("root") != self.root:
+            return False
+
+        self._listings = {_key(path): listing for path, listing in data.get("listings", {}).items()}
+        self._mtimes = {_key(path): mtime for path, mtime in data.get("mtimes", {}).items()}
+        self._scanned = data.get("scanned", 0)
+
+        return self.fresh()
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+
+        file_descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+
+        with os.fdopen(file_descriptor, "w") as stream:
+            json.dump(dict(
+                version=INDEX_VERSION,
+                root=self.root,
+                scanned=self._scanned,
+                listings={"/".join(key): listing for key, listing in self._listings.items()},
+                mtimes={"/".join(key): mtime for key, mtime in self._mtimes.items()},
+            ), stream)
+
+        os.replace(temp_path, self.path)
+
+    def fresh(self) -> bool:
+        """
+        check whether every listed directory is unchanged, one stat each.
+        """
+
+        for key, mtime in self._mtimes.items():
+            if mtime >= self._scanned - RACY_WINDOW_NS:
+                return False
+
+            try:
+                if os.stat(os.path.join(self.root, *key)).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+
+        return True
+
+    def _list(self, key: Key) -> Dict[str, bool]:
+        path = os.path.join(self.root, *key)
+        listing: Dict[str, bool] = {}
+
+        try:
+            mtime = os.stat(path).st_mtime_ns
+
+            with os.scandir(path) as iterator:
+                for entry in iterator:
+                    if entry.is_dir():
+                        listing[entry.name] = True
+                    elif entry.is_file():
+                        listing[entry.name] = False
+        except (FileNotFoundError, NotADirectoryError):
+            return listing
+
+        self._listings[key] = listing
+        self._mtimes[key] = mtime
+
+        return listing
+
+    def _walk(self, key: Key) -> None:
+        listing = self._list(key)
+
+        if listing.get("environments"):
+            environments = (*key, "environments")
+
+            for name, is_dir in self._list(environments).items():
+                if is_dir:
+                    self._list((*environments, name))
+
+        if listing.get("clusters"):
+            clusters = (*key, "clusters")
+
+            for name, is_dir in self._list(clusters).items():
+                if is_dir:
+                    self._walk((*clusters, name))
+
+    def _scan(self) -> None:
+        LOGGER.debug("indexing project %s", self.root)
+
+        self._listings = {}
+        self._mtimes = {}
+        self._scanned = time.time_ns()
+
+        self._walk(())
+
+    def _kind(self, parts: Key) -> Optional[bool]:
+        # True for directories, False for files and None if neither exists
+        listing = self._listings.get(parts[:-1])
+
+        if listing is not None and _plain(parts[-1]):
+            return listing.get(parts[-1])
+
+        parts = _split(parts)
+
+        if not all(map(_plain, parts)):
+            return _stat_kind(os.path.join(self.root, *parts))
+
+        if parts[:-1] in self._listings:
+            return self._listings[parts[:-1]].get(parts[-1])
+
+        if parts[:-1] and self._kind(parts[:-1]) is not True:
+            return None
+
+        # not part of the layout, e.g. nested environment names
+        return _stat_kind(os.path.join(self.root, *parts))
+
+    def isfile(self, *parts: str) -> bool:
+        return self._kind(parts) is False
+
+    def isdir(self, *parts: str) -> bool:
+        return self._kind(parts) is True
+
+    def directories(self, *parts: str) -> List[str]:
+        """
+        names of the directories in a listed directory, in listing order.
+        """
+
+        listing = self._listings.get(parts)
+
+        if listing is None:
+            if not parts or self._kind(parts) is not True:
+                return []
+
+            path = os.path.join(self.root, *parts)
+
+            return [name for name in _scan_names(path) if os.path.isdir(os.path.join(path, name))]
+
+        return [name for name, is_dir in listing.items() if is_dir]
+
+    def environments(self, *parts: str) -> Set[str]:
+        """
+        environments of the project or a cluster, including those of nested
+        clusters.
+        """
+
+        result = set(self.directories(*parts, "environments"))
+
+        for name in self.directories(*parts, "clusters"):
+            result.update(self.environments(*parts, "clusters", name))
+
+        return result
+
+
+def _key(path: str) -> Key:
+    return tuple(path.split("/")) if path else ()
+
+
+def _plain(name: str) -> bool:
+    # names which are a single entry of their directory
+    return name not in ("", ".", "..") and "/" not in name and os.sep not in name
+
+
+def _split(parts: Key) -> Key:
+    return tuple(piece for part in parts for piece in part.replace(os.sep, "/").split("/"))
+
+
+def _stat_kind(path: str) -> Optional[bool]:
+    if os.path.isdir(path):
+        return True
+
+    if os.path.isfile(path):
+        return False
+
+    return None
+
+
+def _scan_names(path: str) -> List[str]:
+    try:
+        with os.scandir(path) as iterator:
+            return [entry.name for entry in iterator]
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
+def set_index_cache(directory: Optional[str]) -> None:
+    """
+    keep project indexes in a cache directory, None disables the cache.
+    """
+
+    global _INDEX_CACHE_DIR  # pylint: disable=global-statement
+
+    _INDEX_CACHE_DIR = directory
+
+
+def get_index(root: str) -> ProjectIndex:
+    """
+    get the index of a project, it is kept per process and root and built
+    again once a listed directory changed.
+    """
+
+    key = os.path.abspath(root)
+    index = _INDEXES.get(key)
+
+    if index is None or not index.fresh():
+        index = ProjectIndex(key, os.path.join(_INDEX_CACHE_DIR, PROJECT_INDEX) if _INDEX_CACHE_DIR is not None else None)
+
+        _INDEXES[key] = index
+
+    return index
+
+
+def invalidate(root: Optional[str] = None) -> None:
+    """
+    forget the index of a project, or of every project if root is None.
+    """
+
+    if root is None:
+        _INDEXES.clear()
+    else:
+        _INDEXES.pop(os.path.abspath(root), None)
 
 
 def check_directory(path: str) -> bool:
@@ -16,18 +289,22 @@ def check_directory(path: str) -> bool:
 
 
 def get_base_dir(root: str, cluster: Optional[str], environment: Optional[str]) -> str:
+    index = get_index(root)
     base_path = root
+    parts: Tuple[str, ...] = ()
 
     if cluster is not None:
         base_path = os.path.join(base_path, "clusters", cluster)
+        parts = ("clusters", cluster)
 
-        if not os.path.isdir(base_path):
+        if not index.isdir(*parts):
             raise RuntimeError(f"No such cluster: {cluster}")
 
     if environment is not None:
         base_path = os.path.join(base_path, "environments", environment)
+        parts = (*parts, "environments", environment)
 
-        if not os.path.isdir(base_path):
+        if not index.isdir(*parts):
             raise RuntimeError(f"No such environment: {environment}")
 
     return base_path
@@ -35,14 +312,16 @@ def get_base_dir(root: str, cluster: Optional[str], environment: Optional[str])
 
 # pylint: disable=too-many-arguments
 def find_files(root: str, cluster: Optional[str], environment: Optional[str], name: str, file_ok=True, dir_ok=True) -> List[str]:
-    def check(path):
-        return (file_ok and os.path.isfile(path)) or (dir_ok and os.path.isdir(root_path))
+    index = get_index(root)
+
+    def check(*parts):
+        return (file_ok and index.isfile(*parts)) or (dir_ok and index.isdir(name))
 
     files: List[str] = []
 
     root_path = os.path.join(root, name)
 
-    if check(root_path):
+    if check(name):
         files.append(root_path)
 
     env_found = environment is None
@@ -50,26 +329,26 @@ def find_files(root: str, cluster: Optional[str], environment: Optional[str], na
     if environment is not None:
         file_path = os.path.join(root, "environments", environment, name)
 
-        if check(file_path):
+        if check("environments", environment, name):
             files.append(file_path)
             env_found = True
 
     if cluster is not None:
         cluster_path = os.path.join(root, "clusters", cluster)
 
-        if not os.path.isdir(cluster_path):
+        if not index.isdir("clusters", cluster):
             raise RuntimeError(f"no such cluster: {cluster}")
 
         file_path = os.path.join(cluster_path, name)
 
-        if check(file_path):
+        if check("clusters", cluster, name):
             files.append(file_path)
 
         if environment is not None:
             file_path = os.path.join(
                 cluster_path, "environments", environment, name)
 
-            if check(file_path):
+            if check("clusters", cluster, "environments", environment, name):
                 files.append(file_path)
                 env_found = True
 
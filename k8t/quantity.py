@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+kubernetes resource quantities.
+
+https://kubernetes.io/docs/reference/kubernetes-api/common-definitions/quantity/
+"""
+
+import re
+from decimal import Context, Decimal, InvalidOperation
+from functools import lru_cache
+from typing import Any
+
+# <sign><number><suffix>, the suffix being a binary or decimal si suffix or a decimal exponent
+QUANTITY = re.compile(r"([+-]?(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+))(?:(Ki|Mi|Gi|Ti|Pi|Ei|n|u|m|k|M|G|T|P|E)|[eE]([+-]?[0-9]+))?")
+
+SUFFIXES = {
+    "Ki": Decimal(2 ** 10), "Mi": Decimal(2 ** 20), "Gi": Decimal(2 ** 30),
+    "Ti": Decimal(2 ** 40), "Pi": Decimal(2 ** 50), "Ei": Decimal(2 ** 60),
+    "n": Decimal("1e-9"), "u": Decimal("1e-6"), "m": Decimal("1e-3"),
+    "k": Decimal("1e3"), "M": Decimal("1e6"), "G": Decimal("1e9"),
+    "T": Decimal("1e12"), "P": Decimal("1e15"), "E": Decimal("1e18"),
+}
+
+# quantities beyond that are no resource values, and huge exponents would be expensive
+MAX_EXPONENT = 64
+
+# wide enough for every digit of any valid quantity, arithmetic stays exact
+_CONTEXT = Context(prec=MAX_EXPONENT * 3)
+
+
+@lru_cache(maxsize=4096)
+def _parse(text: str) -> Decimal:
+    match = QUANTITY.fullmatch(text)
+
+    if match is None:
+        raise ValueError(f"invalid quantity: {text}")
+
+    number, suffix, exponent = match.groups()
+
+    if len(number) > MAX_EXPONENT or (exponent is not None and abs(int(exponent)) > MAX_EXPONENT):
+        raise ValueError(f"quantity out of range: {text}")
+
+    try:
+        value = _CONTEXT.create_decimal(number)
+
+        if suffix is not None:
+            return _CONTEXT.multiply(value, SUFFIXES[suffix])
+
+        if exponent is not None:
+            return value.scaleb(int(exponent), _CONTEXT)
+    except InvalidOperation as err:
+        raise ValueError(f"invalid quantity: {text}") from err
+
+    return value
+
+
+def parse(value: Any) -> Decimal:
+    """
+    the exact value of a quantity, e.g. Decimal('1610612736') for 1.5Gi.
+    numbers are accepted as well.
+    """
+
+    if isinstance(value, bool):
+        raise ValueError(f"invalid quantity: {value}")
+
+    # floats are formatted as short as possible, e.g. 1e-05 or 129000000.0
+    return _parse(value if isinstance(value, str) else str(value))
+
+
+def to_millis(value: Any) -> int:
+    """
+    a quantity in thousandths, truncated, e.g. millicores.
+    """
+
+    return int(parse(value).scaleb(3, _CONTEXT))
+
+
+def to_megabytes(value: Any) -> int:
+    """
+    a quantity of bytes in megabytes (10^6), truncated.
+    """
+
+    return int(parse(value).scaleb(-6, _CONTEXT))
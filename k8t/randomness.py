@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import json
+import logging
+import os
+import string
+import tempfile
+import threading
+from contextlib import contextmanager
+from secrets import randbelow
+from typing import Callable, Dict, Iterator
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+LOGGER = logging.getLogger(__name__)
+STORE_VERSION = 1
+
+ALPHABETS = {
+    "lowercase": string.ascii_lowercase + string.digits,
+    "alphanumeric": string.ascii_letters + string.digits,
+    "letters": string.ascii_letters,
+    "digits": string.digits,
+    "hex": string.digits + "abcdef",
+    "printable": string.ascii_letters + string.digits + string.punctuation,
+}
+DEFAULT_ALPHABET = "lowercase"
+
+# file stores are shared by every provider call of a process
+_STORES: Dict[str, "FileStore"] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def alphabet(name: str) -> str:
+    """
+    the characters of a named alphabet, other names are taken as the characters themselves.
+    """
+
+    characters = "".join(dict.fromkeys(ALPHABETS.get(name, name)))
+
+    if not 2 <= len(characters) <= 256:
+        raise ValueError(f"invalid alphabet '{name}': needs between 2 and 256 distinct characters")
+
+    return characters
+
+
+def random_string(length: int, alphabet_name: str = DEFAULT_ALPHABET) -> str:
+    """
+    generate a random string, every character of the alphabet is equally likely.
+    """
+
+    characters = alphabet(alphabet_name)
+    size = len(characters)
+    # bytes at or above the limit would favour the first characters and are rejected
+    limit = 256 - 256 % size
+    result = []
+
+    while len(result) < length:
+        missing = length - len(result)
+
+        # enough bytes for the expected rejections, usually a single draw
+        for byte in os.urandom(missing * 256 // limit + 8):
+            if byte < limit:
+                result.append(characters[byte % size])
+
+                if len(result) == length:
+                    break
+
+    return "".join(result)
+
+
+def random_length(low: int, high: int) -> int:
+    return low + randbelow(high - low + 1)
+
+
+@contextmanager
+def _locked(path: str) -> Iterator[None]:
+    if fcntl is None:
+        yield
+        return
+
+    with open(path + ".lock", "a") as stream:
+        fcntl.flock(stream, fcntl.LOCK_EX)
+
+        try:
+            yield
+        finally:
+            fcntl.flock(stream, fcntl.LOCK_UN)
+
+
+class FileStore:
+    """
+    Generated values persisted in a JSON file.
+
+    The file is locked while a value is generated, so processes sharing the
+    store and later runs reuse the value generated first. Locking requires
+    fcntl, without it only threads of one process are synchronized.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+
+        self._values: Dict[str, str] = {}
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r") as stream:
+                data = json.load(stream)
+        except FileNotFoundError:
+            return
+        except ValueError as exc:
+            raise RuntimeError(f"invalid secret store {self.path}: {exc}") from exc
+
+        if data.get("version") == STORE_VERSION:
+            self._values = data.get("values", {})
+
+    def _save(self) -> None:
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+
+        # mkstemp creates files only readable by their owner
+        file_descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+
+        try:
+            with os.fdopen(file_descriptor, "w") as stream:
+                json.dump(dict(version=STORE_VERSION, values=self._values), stream, indent=2, sort_keys=True)
+
+            os.replace(temp_path, self.path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+            raise
+
+    def get(self, key: str, generate: Callable[[], str]) -> str:
+        """
+        get the stored value of a key, generating and storing it if there is none.
+        """
+
+        with self.lock:
+            if key in self._values:
+                return self._values[key]
+
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+            with _locked(self.path):
+                # another process may have stored it in the meantime
+                self._load()
+
+                if key not in self._values:
+                    LOGGER.debug("storing generated secret %s in %s", key, self.path)
+
+                    self._values[key] = generate()
+                    self._save()
+
+            return self._values[key]
+
+
+def get_store(path: str) -> FileStore:
+    path = os.path.abspath(path)
+
+    with _STORES_LOCK:
+        if path not in _STORES:
+            _STORES[path] = FileStore(path)
+
+        return _STORES[path]
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from k8t import config, secret_providers
+from k8t.cache import TemplateCache
+from k8t.deferred import render_deferred
+from k8t.engine import build
+from k8t.matrix import load_config, load_values
+from k8t.secret_providers import SecretStore
+from k8t.templates import CompiledTemplate, compile_template, render, render_documents, validate
+from k8t.util import use_environ
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Renderer:  # pylint: disable=too-many-instance-attributes
+    """
+    Renders the templates of a single target.
+
+    The renderer owns engine, values, config and secrets of its target, which
+    are only set for the context of a render call. Several renderers can be
+    used at the same time, each from any number of threads.
+
+    Secrets are kept in a store of their own unless one is given, e.g. to
+    share retrieved secrets between targets. Environment variables (env() and
+    K8T_VALUE_*) are read from environ if given, e.g. those of a daemon client.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, root: str, cluster_name: Optional[str] = None, environment_name: Optional[str] = None, method: str = "ltr", value_files=(),
+                 cli_values=(), suffixes=None, secret_provider: Optional[str] = None, template_overrides=None,
+                 bytecode_cache: Optional[TemplateCache] = None, secrets: Optional[SecretStore] = None, environ: Optional[Mapping[str, str]] = None):
+        self.cluster = cluster_name
+        self.environment = environment_name
+        self.suffixes = suffixes
+        self.environ = environ
+
+        with use_environ(environ):
+            self.values = load_values(root, cluster_name, environment_name, method, value_files, cli_values)
+
+        self.config = load_config(root, cluster_name, environment_name, method, secret_provider)
+        self.engine = build(root, cluster_name, environment_name, template_overrides, bytecode_cache)
+        self.secrets = secrets if secrets is not None else SecretStore()
+
+        self._templates: Dict[str, CompiledTemplate] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def scope(self) -> Iterator["Renderer"]:
+        """
+        use config, secrets and environment of this renderer in the current context.
+        """
+
+        with config.use(self.config), secret_providers.use_store(self.secrets), use_environ(self.environ):
+            yield self
+
+    def names(self) -> List[str]:
+        names = self.engine.list_templates()
+
+        if self.suffixes:
+            names = [name for name in names if os.path.splitext(name)[1] in self.suffixes]
+
+        return names
+
+    def compile(self, name: str) -> CompiledTemplate:
+        with self._lock:
+            if name not in self._templates:
+                template = compile_template(name, self.engine)
+                # runs the lazy analyses once, instead of in every thread
+                template.template  # pylint: disable=pointless-statement
+
+                self._templates[name] = template
+
+            return self._templates[name]
+
+    def validate(self, name: str) -> bool:
+        template = self.compile(name)
+
+        with self.scope():
+            return validate(template, self.values, self.engine)
+
+    def render(self, name: str) -> str:
+        template = self.compile(name)
+
+        with self.scope():
+            return render(template, self.values, self.engine)
+
+    def render_documents(self, name: str) -> Tuple[str, List[Any]]:
+        template = self.compile(name)
+
+        with self.scope():
+            return render_documents(template, self.values, self.engine)
+
+    def _render_all(self, defer_secrets: bool, documents: bool) -> Tuple[List[CompiledTemplate], List[Any]]:
+        templates = [self.compile(name) for name in self.names()]
+
+        with self.scope():
+            invalid = [template.name for template in templates if not validate(template, self.values, self.engine)]
+
+            if invalid:
+                raise RuntimeError("Failed to validate templates: {}".format(", ".join(invalid)))
+
+            secret_providers.prefetch(set().union(*(template.secret_keys for template in templates)))
+
+            if defer_secrets:
+                return templates, render_deferred(templates, self.values, self.engine, documents)
+
+            if documents:
+                return templates, [render_documents(template, self.values, self.engine) for template in templates]
+
+            return templates, [render(template, self.values, self.engine) for template in templates]
+
+    def render_all(self, defer_secrets: bool = False) -> str:
+        """
+        validate and render all templates into one multi document string.
+        """
+
+        templates, outputs = self._render_all(defer_secrets, False)
+
+        return "".join("---\n# Source: {}\n{}\n".format(template.name, output) for template, output in zip(templates, outputs))
+
+    def render_all_documents(self, defer_secrets: bool = False) -> List[Any]:
+        """
+        validate and render all templates, returns their non-empty documents.
+        """
+
+        _, outputs = self._render_all(defer_secrets, True)
+
+        return [document for _, documents in outputs for document in documents if document is not None]
@@ -9,28 +9,183 @@
 
 import logging
 import hashlib
-import string
-
-import boto3  # pylint: disable=E0401
-import botocore  # pylint: disable=E0401
-from k8t import config
-from typing import Optional
-
-try:
-    from secrets import SystemRandom
-except ImportError:
-    from random import SystemRandom
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
 
+from k8t import config, randomness
+from k8t.profiling import count, redact, span
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 LOGGER = logging.getLogger(__name__)
-RANDOM_STORE = {}
 DEFAULT_SSM_PREFIX = ""
 DEFAULT_SSM_REGION = "eu-central-1"
+# assumed role credentials are refreshed this long before they expire
+CREDENTIALS_REFRESH_MARGIN = timedelta(minutes=5)
+# length of random secrets requested without a length
+RANDOM_LENGTH = (12, 32)
+# GetParameters accepts at most 10 names per call
+SSM_BATCH_SIZE = 10
+SSM_PREFETCH_WORKERS = 8
+
+# clients and assumed role credentials are kept for the whole run
+_CLIENT_LOCK = threading.Lock()
+_CLIENTS: Dict[Tuple[str, str, str], Tuple[Any, Optional[datetime]]] = {}
+
+
+class SecretStore:
+    """
+    Secrets retrieved by one run or renderer.
+
+    Generated secrets must stay the same for every template of a target, and
+    ssm parameters are only requested once.
+    """
+
+    def __init__(self):
+        self.random: Dict[str, str] = {}
+        self.ssm: Dict[Tuple[str, str, str], str] = {}
+        self.lock = threading.Lock()
+        self.pending: Dict[Tuple[str, str, str], threading.Lock] = {}
+
+
+# used unless a store is set for the current context, see use_store
+DEFAULT_STORE = SecretStore()
+RANDOM_STORE = DEFAULT_STORE.random
+SSM_STORE = DEFAULT_STORE.ssm
+
+_CURRENT_STORE: ContextVar[Optional[SecretStore]] = ContextVar("k8t_secret_store", default=None)
+
+
+def current_store() -> SecretStore:
+    store = _CURRENT_STORE.get()
+
+    return DEFAULT_STORE if store is None else store
+
+
+@contextmanager
+def use_store(store: SecretStore) -> Iterator[SecretStore]:
+    """
+    set the secret store for the current context, e.g. a thread or task.
+    """
+
+    token = _CURRENT_STORE.set(store)
+
+    try:
+        yield store
+    finally:
+        _CURRENT_STORE.reset(token)
+
+
+def per_process(conf: Dict[str, Any]) -> bool:
+    """
+    check if secrets are generated by every process on its own, which is the
+    case for the random provider without a store.
+    """
+
+    secrets_config = conf.get("secrets", {})
+
+    return str(secrets_config.get("provider", "")).lower() == "random" and not secrets_config.get("store")
+
+
+def reset() -> None:
+    """
+    forget all pooled clients, credentials and the secrets of the current
+    store.
+    """
+
+    with _CLIENT_LOCK:
+        _CLIENTS.clear()
+
+    store = current_store()
+
+    with store.lock:
+        store.ssm.clear()
+        store.pending.clear()
+
+
+def _memoize(store: SecretStore, key: Any, fetch: Callable[[], Any]) -> Any:
+    # concurrent requests for the same key wait for the first one
+    with store.lock:
+        if key in store.ssm:
+            count("cache", cache="secrets", result="hit")
+
+            return store.ssm[key]
+
+        lock = store.pending.setdefault(key, threading.Lock())
+
+    with lock:
+        with store.lock:
+            if key in store.ssm:
+                count("cache", cache="secrets", result="hit")
+
+                return store.ssm[key]
+
+        count("cache", cache="secrets", result="miss")
+
+        try:
+            value = fetch()
+        except Exception:
+            with store.lock:
+                store.pending.pop(key, None)
+
+            raise
+
+        # stored before the pending lock goes, later requests find the value
+        with store.lock:
+            store.ssm[key] = value
+            store.pending.pop(key, None)
+
+        return value
+
+
+def _client(service: str, region: str, role_arn: str):
+    """
+    get a pooled client, clients using an assumed role are created again
+    shortly before their credentials expire.
+    """
+
+    pool_key = (service, region, role_arn)
+
+    with _CLIENT_LOCK:
+        client, expiration = _CLIENTS.get(pool_key, (None, None))
+
+        if client is not None and (expiration is None or datetime.now(timezone.utc) < expiration - CREDENTIALS_REFRESH_MARGIN):
+            return client
+
+        client_config = dict(region_name=region)
+        expiration = None
+
+        if role_arn != '':
+            role_creds = _assume_role(role_arn, region)
+            expiration = role_creds.get('Expiration')
+
+            if isinstance(expiration, datetime) and expiration.tzinfo is None:
+                expiration = expiration.replace(tzinfo=timezone.utc)
+            elif not isinstance(expiration, datetime):
+                expiration = None
+
+            client_config.update(dict(
+                aws_access_key_id=role_creds['AccessKeyId'],
+                aws_secret_access_key=role_creds['SecretAccessKey'],
+                aws_session_token=role_creds['SessionToken'],
+            ))
+
+        # only imported once a secret is requested from aws, boto3 takes
+        # longer to import than everything else k8t needs
+        import boto3  # pylint: disable=E0401,import-outside-toplevel
+
+        client = boto3.client(service, **client_config)
+
+        _CLIENTS[pool_key] = (client, expiration)
+
+        return client
 
 
 def ssm(key: str, length: Optional[int] = None, config_override: Optional[dict] = None) -> str:
     # Merge the config given as an argument with default config.
-    secrets_config = config.CONFIG.get("secrets", {}).copy()
+    secrets_config = config.current().get("secrets", {}).copy()
     if config_override is not None:
         secrets_config.update(config_override)
 
@@ -38,47 +193,117 @@ def ssm(key: str, length: Optional[int] = None, config_override: Optional[dict]
     region = str(secrets_config.get("region", DEFAULT_SSM_REGION))
     role_arn = str(secrets_config.get("role_arn", ""))
 
-    client_config = dict(region_name=region)
+    key = prefix + key
 
-    if role_arn != '':
-        role_creds = _assume_role(role_arn, region)
+    result = _memoize(current_store(), (region, role_arn, key), lambda: _get_parameter(key, region, role_arn))
 
-        client_config.update(dict(
-            aws_access_key_id=role_creds['AccessKeyId'],
-            aws_secret_access_key=role_creds['SecretAccessKey'],
-            aws_session_token=role_creds['SessionToken'],
-        ))
+    if length is not None:
+        if len(result) != length:
+            raise AssertionError(f"Secret '{key}' did not have expected length of {length}")
 
-    client = boto3.client("ssm", **client_config)
+    return result
 
-    key = prefix + key
 
-    LOGGER.debug("Requesting secret from %s", key)
+def prefetch(requests: Iterable[Tuple[str, Any]]) -> int:
+    """
+    retrieve secrets in bulk before rendering, get_secret then finds them in
+    memory. requests are (key, config_override) pairs, the override being
+    anything dict.update accepts or None. only supported by the ssm provider,
+    returns the number of retrieved secrets.
+    """
+
+    conf = config.current()
+    store = current_store()
+    provider_name = str(conf.get("secrets", {}).get("provider", "")).lower()
+
+    if provider_name != "ssm":
+        return 0
+
+    pending: Dict[Tuple[str, str], List[str]] = {}
+
+    for key, config_override in requests:
+        secrets_config = conf.get("secrets", {}).copy()
+        if config_override is not None:
+            secrets_config.update(config_override)
+
+        region = str(secrets_config.get("region", DEFAULT_SSM_REGION))
+        role_arn = str(secrets_config.get("role_arn", ""))
+        name = str(secrets_config.get("prefix", DEFAULT_SSM_PREFIX)) + key
+
+        if (region, role_arn, name) not in store.ssm:
+            pending.setdefault((region, role_arn), []).append(name)
+
+    batches = []
+
+    for (region, role_arn), names in pending.items():
+        names = sorted(set(names))
+
+        for i in range(0, len(names), SSM_BATCH_SIZE):
+            batches.append((region, role_arn, names[i:i + SSM_BATCH_SIZE]))
+
+    if not batches:
+        return 0
+
+    LOGGER.debug("prefetching secrets in %d batches", len(batches))
+
+    with span("secrets.prefetch", batches=len(batches)), ThreadPoolExecutor(max_workers=min(SSM_PREFETCH_WORKERS, len(batches))) as executor:
+        return sum(executor.map(lambda batch: _get_parameters(store, *batch), batches))
+
+
+def _get_parameters(store: SecretStore, region: str, role_arn: str, names: List[str]) -> int:
+    import botocore  # pylint: disable=E0401,import-outside-toplevel
 
     try:
-        result = client.get_parameter(Name=key, WithDecryption=True)["Parameter"][
-            "Value"
-        ]
+        # failures are recorded by the span before falling back to single requests
+        with span("secret.lookup", provider="ssm", call="GetParameters", keys=len(names)):
+            client = _client("ssm", region, role_arn)
+            parameters = client.get_parameters(Names=names, WithDecryption=True)
+    except (RuntimeError, botocore.exceptions.BotoCoreError, botocore.exceptions.ClientError) as exc:
+        # every secret is requested again on its own and reports the error
+        LOGGER.warning("Failed to prefetch secrets %s: %s", ", ".join(names), exc)
 
-        if length is not None:
-            if len(result) != length:
-                raise AssertionError(f"Secret '{key}' did not have expected length of {length}")
+        return 0
 
-        return result
-    except (
-        client.exceptions.ParameterNotFound,
-        botocore.exceptions.ClientError,
-    ) as exc:
-        raise RuntimeError(f"Failed to retrieve secret {key}: {exc}") from exc
+    # retrieved secrets missed the cache even if get_secret finds them later
+    count("cache", len(parameters.get("Parameters", [])), cache="secrets", result="miss")
+
+    with store.lock:
+        for parameter in parameters.get("Parameters", []):
+            store.ssm.setdefault((region, role_arn, parameter["Name"]), parameter["Value"])
+
+    return len(parameters.get("Parameters", []))
+
+
+def _get_parameter(key: str, region: str, role_arn: str) -> str:
+    import botocore  # pylint: disable=E0401,import-outside-toplevel
+
+    with span("secret.lookup", provider="ssm", call="GetParameter", key=redact(key)):
+        client = _client("ssm", region, role_arn)
+
+        LOGGER.debug("Requesting secret from %s", key)
+
+        try:
+            return client.get_parameter(Name=key, WithDecryption=True)["Parameter"][
+                "Value"
+            ]
+        except (
+            client.exceptions.ParameterNotFound,
+            botocore.exceptions.ClientError,
+        ) as exc:
+            raise RuntimeError(f"Failed to retrieve secret {key}: {exc}") from exc
 
 
 def _assume_role(role_arn: str, region: str) -> dict:
+    import boto3  # pylint: disable=E0401,import-outside-toplevel
+    import botocore  # pylint: disable=E0401,import-outside-toplevel
+
     sts_client = boto3.client('sts', region_name=region)
 
     LOGGER.debug("assuming role %s", role_arn)
 
     try:
-        assumed_role = sts_client.assume_role(RoleArn=role_arn, RoleSessionName='k8t')
+        with span("secret.lookup", provider="ssm", call="AssumeRole"):
+            assumed_role = sts_client.assume_role(RoleArn=role_arn, RoleSessionName='k8t')
 
         role_creds = assumed_role.get('Credentials')
 
@@ -95,25 +320,43 @@ def _assume_role(role_arn: str, region: str) -> dict:
 def random(key: str, length: Optional[int] = None, config_override: Optional[dict] = {}) -> str:
     LOGGER.debug("Requesting secret from %s", key)
 
-    if key not in RANDOM_STORE:
-        RANDOM_STORE[key] = "".join(
-            SystemRandom().choice(string.ascii_lowercase + string.digits)
+    store = current_store().random
+
+    count("cache", cache="secrets", result="hit" if key in store else "miss")
+
+    if key not in store:
+        secrets_config = config.current().get("secrets", {}).copy()
+        if config_override is not None:
+            secrets_config.update(config_override)
 
-            for _ in range(length or SystemRandom().randint(12, 32))
-        )
+        alphabet = str(secrets_config.get("alphabet", randomness.DEFAULT_ALPHABET))
+
+        def generate() -> str:
+            return randomness.random_string(length or randomness.random_length(*RANDOM_LENGTH), alphabet)
+
+        # values of a file store are shared by all processes and runs using it
+        path = secrets_config.get("store")
+        value = randomness.get_store(str(path)).get(key, generate) if path else generate()
+
+        # the first value wins if several threads ask at once
+        store.setdefault(key, value)
 
     if length is not None:
-        if len(RANDOM_STORE[key]) != length:
+        if len(store[key]) != length:
             raise AssertionError(f"Secret '{key}' did not have expected length of {length}")
 
-    return RANDOM_STORE[key]
+    return store[key]
 
 
 def hash(key: str, length: Optional[int] = None, config_override: Optional[dict] = {}) -> str:
     LOGGER.debug("Requesting secret from %s", key)
 
-    if key not in RANDOM_STORE:
+    store = current_store().random
+
+    count("cache", cache="secrets", result="hit" if key in store else "miss")
+
+    if key not in store:
         hashed_key = hashlib.sha1(key.encode()).hexdigest()
-        RANDOM_STORE[key] = hashed_key[:length] if length is not None else hashed_key
+        store[key] = hashed_key[:length] if length is not None else hashed_key
 
-    return RANDOM_STORE[key]
+    return store[key]
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+from k8t import project
+from k8t.cache import TemplateCache
+from k8t.renderer import Renderer
+from k8t.util import to_json
+from k8t.watch import create_watcher
+
+LOGGER = logging.getLogger(__name__)
+CONNECT_TIMEOUT = 1.0
+WATCH_TIMEOUT = 1.0
+# renderers are kept per target, options and client environment
+MAX_RENDERERS = 32
+DEFAULT_SECRETS_TTL = 300.0
+
+
+class RenderServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Renders a project on requests sent to a unix socket.
+
+    Every request is a single line of json answered by a single line of json.
+    Renderers are kept per target, request options and client environment, so
+    engines, values and compiled templates stay warm between requests. All of
+    them are dropped once a file of the project or a value file changes,
+    compiled code is kept by the template cache. Retrieved ssm secrets are
+    requested again once they are older than secrets_ttl seconds.
+    """
+
+    daemon_threads = True
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, path: str, root: str, polling: bool = False, bytecode_cache: Optional[TemplateCache] = None,
+                 secrets_ttl: float = DEFAULT_SECRETS_TTL):
+        self.root = os.path.abspath(root)
+        self.bytecode_cache = bytecode_cache or TemplateCache()
+        self.secrets_ttl = secrets_ttl
+        self.handled = 0
+
+        # renderer and expiry time of its secrets, least recently used first
+        self._renderers: "OrderedDict[Tuple, Tuple[Renderer, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._watcher = create_watcher([(self.root, True)], polling)
+        self._watched: Set[str] = set()
+        self._closed = threading.Event()
+
+        super().__init__(path, _Handler)
+
+    def _watch_value_files(self, value_files) -> None:
+        # value files outside of the project are watched once they are used
+        for directory in {os.path.dirname(os.path.abspath(path)) for path in value_files}:
+            if directory not in self._watched and not (directory + os.sep).startswith(self.root + os.sep):
+                LOGGER.debug("watching value file directory %s", directory)
+
+                self._watcher.add(directory, False)
+                self._watched.add(directory)
+
+    def renderer(self, request: Dict[str, Any]) -> Renderer:
+        suffixes = request.get("suffixes")
+        environ = request.get("environ")
+
+        key = (
+            request.get("cluster"),
+            request.get("environment"),
+            request.get("method", "ltr"),
+            tuple(request.get("value_files", ())),
+            tuple(tuple(value) for value in request.get("cli_values", ())),
+            tuple(suffixes) if isinstance(suffixes, list) else suffixes,
+            request.get("secret_provider"),
+            tuple(sorted(environ.items())) if isinstance(environ, dict) else None,
+        )
+
+        with self._lock:
+            now = time.monotonic()
+
+            if key not in self._renderers:
+                # the environment is left out, it may contain credentials
+                LOGGER.debug("creating renderer for %s", key[:7])
+
+                self._watch_value_files(key[3])
+                self._renderers[key] = (Renderer(self.root, *key[:7], bytecode_cache=self.bytecode_cache, environ=environ), now + self.secrets_ttl)
+
+                while len(self._renderers) > MAX_RENDERERS:
+                    self._renderers.popitem(last=False)
+
+            renderer, expires = self._renderers[key]
+
+            if now >= expires:
+                LOGGER.debug("secrets of %s expired", key[:2])
+
+                with renderer.secrets.lock:
+                    renderer.secrets.ssm.clear()
+
+                self._renderers[key] = (renderer, now + self.secrets_ttl)
+
+            self._renderers.move_to_end(key)
+
+            return renderer
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._renderers.clear()
+
+        project.invalidate(self.root)
+
+    def watch(self) -> None:
+        while not self._closed.is_set():
+            changed = self._watcher.wait(WATCH_TIMEOUT)
+
+            if changed:
+                LOGGER.info("%d files changed, reloading", len(changed))
+
+                self.invalidate()
+
+    def respond(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        command = request.get("command")
+
+        if command == "ping":
+            return dict(root=self.root)
+
+        if command == "invalidate":
+            self.invalidate()
+
+            return dict(root=self.root)
+
+        if os.path.abspath(request.get("directory", "")) != self.root:
+            # the client renders other projects on its own
+            return dict(error="not serving {}".format(request.get("directory")), fallback=True)
+
+        try:
+            renderer = self.renderer(request)
+
+            if command == "render":
+                if request.get("output_format", "yaml") == "yaml":
+                    return dict(output=renderer.render_all(request.get("defer_secrets", False)))
+
+                return dict(documents=renderer.render_all_documents(request.get("defer_secrets", False)))
+
+            if command == "validate":
+                return dict(invalid=[name for name in renderer.names() if not renderer.validate(name)])
+        except Exception as err:  # pylint: disable=broad-except
+            return dict(error=str(err))
+
+        return dict(error="unknown command {}".format(command))
+
+    def serve(self) -> None:
+        thread = threading.Thread(target=self.watch, name="k8t-watch", daemon=True)
+        thread.start()
+
+        try:
+            self.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server_close()
+            thread.join()
+            self._watcher.close()
+
+    def server_close(self) -> None:
+        self._closed.set()
+
+        super().server_close()
+
+        try:
+            os.remove(self.server_address)
+        except FileNotFoundError:
+            pass
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError as exc:
+            response = dict(error="invalid request: {}".format(exc))
+        else:
+            response = self.server.respond(request)
+
+        self.server.handled += 1
+        self.wfile.write(to_json(response).encode() + b"\n")
+
+
+def bind(path: str, root: str, polling: bool = False, bytecode_cache: Optional[TemplateCache] = None,
+         secrets_ttl: float = DEFAULT_SECRETS_TTL) -> RenderServer:
+    """
+    create a server listening on path, stale sockets of stopped servers are
+    replaced.
+    """
+
+    if os.path.exists(path):
+        try:
+            request(path, dict(command="ping"))
+        except OSError:
+            LOGGER.debug("removing stale socket %s", path)
+
+            os.remove(path)
+        else:
+            raise RuntimeError("another server is listening on {}".format(path))
+
+    return RenderServer(path, root, polling, bytecode_cache, secrets_ttl)
+
+
+def request(path: str, data: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    send a request to a running server, raises OSError if there is none.
+    """
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(CONNECT_TIMEOUT)
+        connection.connect(path)
+        connection.settimeout(timeout)
+
+        connection.sendall(to_json(data).encode() + b"\n")
+
+        with connection.makefile("rb") as stream:
+            line = stream.readline()
+
+    if not line:
+        raise ConnectionError("no response from {}".format(path))
+
+    return json.loads(line)
@@ -8,12 +8,15 @@
 # THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
 import logging
-from typing import Set, Tuple
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
 from ruamel.yaml import YAML  # pylint: disable=E0401
-from jinja2 import Environment, meta, nodes  # pylint: disable=E0401
+from ruamel.yaml.error import YAMLError  # pylint: disable=E0401
+from jinja2 import Environment, Template, meta, nodes  # pylint: disable=E0401
 
 from k8t import config
+from k8t.profiling import span
 
 LOGGER = logging.getLogger(__name__)
 PROHIBITED_VARIABLE_NAMES = {
@@ -24,6 +27,15 @@ PROHIBITED_VARIABLE_NAMES = {
     'lipsum',
     'joiner'
 }
+# stands for any key or index in value paths, e.g. loop variables
+WILDCARD = '*'
+
+ValuePath = Tuple[str, ...]
+# literal get_secret arguments, (key, config_override)
+SecretRequest = Tuple[str, Optional[Tuple[Tuple[str, Any], ...]]]
+
+# loaders are not thread safe, every thread keeps its own
+_LOADERS = threading.local()
 
 
 class YamlValidationError(Exception):
@@ -32,19 +44,110 @@ class YamlValidationError(Exception):
     """
 
 
-def analyze(template_path: str, values: dict, engine: Environment) -> Tuple[Set[str], Set[str], Set[str], bool]:
-    template_source = engine.loader.get_source(engine, template_path)[0]
-    abstract_syntax_tree = engine.parse(template_source)
+class CompiledTemplate:
+    """
+    Single compilation unit of a template.
+
+    The source is loaded and parsed once, the AST is shared by the analysis and
+    the render phase. Code generation only happens when the template is
+    rendered.
+    """
+
+    def __init__(self, name: str, engine: Environment):
+        self.name = name
+        self.engine = engine
+        with span("parse", template=name):
+            self.source, self.filename, self._uptodate = engine.loader.get_source(engine, name)
+            self.ast = engine.parse(self.source, name, self.filename)
+
+        self._required_variables = None
+        self._value_paths = None
+        self._has_secrets = None
+        self._secret_keys = None
+        self._code = None
+        self._template = None
+
+    def __repr__(self) -> str:
+        return f"<CompiledTemplate {self.name!r} ({self.filename})>"
+
+    @property
+    def required_variables(self) -> Set[str]:
+        if self._required_variables is None:
+            self._required_variables = get_variables(self.ast, self.engine)
+
+        return self._required_variables
+
+    @property
+    def value_paths(self) -> Set[ValuePath]:
+        if self._value_paths is None:
+            self._value_paths = get_value_paths(self.ast, self.engine)
+
+        return self._value_paths
+
+    @property
+    def has_secrets(self) -> bool:
+        if self._has_secrets is None:
+            self._has_secrets = any(getattr(call.node, "name", None) == "get_secret" for call in self.ast.find_all(nodes.Call))
+
+        return self._has_secrets
+
+    @property
+    def secret_keys(self) -> Set[SecretRequest]:
+        if self._secret_keys is None:
+            self._secret_keys = get_secret_keys(self.ast)
+
+        return self._secret_keys
+
+    @property
+    def code(self):
+        if self._code is None:
+            # the code generator optimizes the AST in place, analyze it first
+            _ = self.required_variables, self.value_paths, self.has_secrets, self.secret_keys
+
+            bucket = None
+
+            if self.engine.bytecode_cache is not None:
+                bucket = self.engine.bytecode_cache.get_bucket(self.engine, self.name, self.filename, self.source)
+                self._code = bucket.code
+
+            if self._code is None:
+                with span("compile", template=self.name):
+                    self._code = self.engine.compile(self.ast, self.name, self.filename)
+
+                if bucket is not None:
+                    bucket.code = self._code
+                    self.engine.bytecode_cache.set_bucket(bucket)
+
+        return self._code
+
+    @property
+    def template(self) -> Template:
+        if self._template is None:
+            self._template = self.engine.template_class.from_code(self.engine, self.code, self.engine.make_globals(None), self._uptodate)
+
+        return self._template
+
+
+def compile_template(template: Union[str, CompiledTemplate], engine: Environment) -> CompiledTemplate:
+    if isinstance(template, CompiledTemplate):
+        return template
+
+    return CompiledTemplate(template, engine)
+
 
-    has_secrets = any(getattr(call.node, "name", None) == "get_secret" for call in abstract_syntax_tree.find_all(nodes.Call))
-    required_variables = get_variables(abstract_syntax_tree, engine)
+def analyze(template: Union[str, CompiledTemplate], values: dict, engine: Environment) -> Tuple[Set[str], Set[str], Set[str], bool]:
+    template = compile_template(template, engine)
+
+    with span("analyze", template=template.name):
+        has_secrets = template.has_secrets
+        required_variables = template.required_variables
 
     defined_variables = set(values.keys())
 
     LOGGER.debug(
         "defined variables: %s", defined_variables)
     LOGGER.debug("found required variables in template %s: %s",
-                 template_path, required_variables)
+                 template.name, required_variables)
 
     undefined_variables = required_variables.difference(defined_variables)
     unused_variables = defined_variables.difference(required_variables)
@@ -55,9 +158,9 @@ def analyze(template_path: str, values: dict, engine: Environment) -> Tuple[Set[
     return (undefined_variables - invalid_variables), unused_variables, invalid_variables, has_secrets
 
 
-def validate(template_path: str, values: dict, engine: Environment) -> bool:
+def validate(template: Union[str, CompiledTemplate], values: dict, engine: Environment) -> bool:
     config_ok = True
-    undefined, _, invalid, has_secrets = analyze(template_path, values, engine)
+    undefined, _, invalid, has_secrets = analyze(template, values, engine)
 
     if undefined:
         LOGGER.error(
@@ -68,9 +171,9 @@ def validate(template_path: str, values: dict, engine: Environment) -> bool:
             "Invalid variable names found: %s", sorted(invalid))
 
     if has_secrets:
-        if "secrets" not in config.CONFIG:
+        if "secrets" not in config.current():
             LOGGER.error(
-                "No configuration for secrets found: %s", config.CONFIG)
+                "No configuration for secrets found: %s", config.current())
             config_ok = False
 
     return config_ok and not (invalid or undefined)
@@ -106,14 +209,258 @@ def get_variables(ast, engine: Environment) -> Set[str]:
     )
 
 
-def render(template_path: str, values: dict, engine: Environment) -> str:
-    output = engine.get_template(template_path).render(values)
+def get_secret_keys(ast) -> Set[SecretRequest]:
+    """
+    get the keys of all get_secret calls with literal arguments, calls with
+    computed keys or overrides are skipped.
+    """
+
+    result = set()
+
+    for call in ast.find_all(nodes.Call):
+        if getattr(call.node, "name", None) != "get_secret" or call.dyn_args is not None or call.dyn_kwargs is not None:
+            continue
+
+        arguments = dict(zip(("key", "length", "config_override"), call.args))
+        arguments.update((keyword.key, keyword.value) for keyword in call.kwargs)
+
+        try:
+            key = arguments["key"].as_const()
+            config_override = arguments["config_override"].as_const() if "config_override" in arguments else None
+        except (KeyError, nodes.Impossible):
+            continue
+
+        if not isinstance(key, str) or not isinstance(config_override, (dict, type(None))):
+            continue
+
+        result.add((key, tuple(sorted(config_override.items())) if config_override is not None else None))
+
+    return result
+
+
+class _ValuePathVisitor:
+    """
+    Collects the value paths read by a template.
+
+    Every name is resolved in a scope mapping local names to the value path
+    they alias (set statements, loop variables) or to None for anything that
+    is not a value.
+    """
+
+    def __init__(self, ignored: Set[str]):
+        self.ignored = ignored
+        self.paths: Set[ValuePath] = set()
+
+    def path(self, node: nodes.Node, scope: Dict[str, Optional[ValuePath]]) -> Optional[ValuePath]:
+        if isinstance(node, nodes.Name):
+            if node.name in scope:
+                return scope[node.name]
+
+            return None if node.name in self.ignored else (node.name,)
+
+        if isinstance(node, nodes.Getattr):
+            base = self.path(node.node, scope)
+
+            return None if base is None else base + (node.attr,)
+
+        if isinstance(node, nodes.Getitem) and isinstance(node.arg, nodes.Const) and isinstance(node.arg.value, (str, int)):
+            base = self.path(node.node, scope)
+
+            return None if base is None else base + (str(node.arg.value),)
+
+        return None
+
+    def iterable(self, node: nodes.Node, scope: Dict[str, Optional[ValuePath]]) -> Optional[ValuePath]:
+        # for key, value in mapping.items()
+        if isinstance(node, nodes.Call) and isinstance(node.node, nodes.Getattr) and node.node.attr in ('items', 'values') and not node.args:
+            return self.path(node.node.node, scope)
+
+        return self.path(node, scope)
+
+    def expression(self, node: nodes.Node, scope: Dict[str, Optional[ValuePath]]) -> None:
+        path = self.path(node, scope)
+
+        if path is not None:
+            self.paths.add(path)
 
-    yaml = YAML(typ='safe', pure=True)
+            return
+
+        if isinstance(node, nodes.Call) and isinstance(node.node, nodes.Getattr):
+            # method calls read the object, mapping.get('key') reads the key
+            base = self.path(node.node.node, scope)
+
+            if base is not None and node.node.attr == 'get' and node.args and isinstance(node.args[0], nodes.Const):
+                self.paths.add(base + (str(node.args[0].value),))
+            else:
+                self.expression(node.node.node, scope)
+
+            for child in node.iter_child_nodes(exclude=('node',)):
+                self.expression(child, scope)
+
+            return
+
+        for child in node.iter_child_nodes():
+            self.expression(child, scope)
+
+    def block(self, body, scope: Dict[str, Optional[ValuePath]]) -> None:
+        for node in body:
+            self.statement(node, scope)
+
+    def assign(self, target: nodes.Node, scope: Dict[str, Optional[ValuePath]], path: Optional[ValuePath] = None) -> None:
+        if isinstance(target, nodes.Name):
+            scope[target.name] = path
+        elif isinstance(target, nodes.Tuple):
+            for item in target.items:
+                self.assign(item, scope)
+
+    def loop(self, node: nodes.For, scope: Dict[str, Optional[ValuePath]]) -> None:
+        iterable = self.iterable(node.iter, scope)
+
+        if iterable is None:
+            self.expression(node.iter, scope)
+
+        inner = dict(scope, loop=None)
+        element = None if iterable is None else iterable + (WILDCARD,)
+
+        if isinstance(node.target, nodes.Tuple) and node.target.items:
+            self.assign(node.target, inner)
+            self.assign(node.target.items[-1], inner, element)
+        else:
+            self.assign(node.target, inner, element)
+
+        before = len(self.paths)
+
+        if node.test is not None:
+            self.expression(node.test, inner)
+
+        self.block(node.body, inner)
+
+        if iterable is not None and len(self.paths) == before:
+            # only the number of elements matters
+            self.paths.add(iterable)
+
+        self.block(node.else_, scope)
+
+    def statement(self, node: nodes.Node, scope: Dict[str, Optional[ValuePath]]) -> None:  # pylint: disable=too-many-branches
+        if isinstance(node, nodes.For):
+            self.loop(node, scope)
+        elif isinstance(node, nodes.Assign):
+            path = self.path(node.node, scope)
+
+            if path is None:
+                self.expression(node.node, scope)
+
+            # aliases are only recorded once they are read
+            self.assign(node.target, scope, path)
+        elif isinstance(node, nodes.AssignBlock):
+            if node.filter is not None:
+                self.expression(node.filter, scope)
+
+            self.block(node.body, dict(scope))
+            self.assign(node.target, scope)
+        elif isinstance(node, (nodes.Macro, nodes.CallBlock)):
+            if isinstance(node, nodes.CallBlock):
+                self.expression(node.call, scope)
+            else:
+                scope[node.name] = None
+
+            for default in node.defaults:
+                self.expression(default, scope)
+
+            inner = dict(scope, varargs=None, kwargs=None, caller=None)
+
+            for arg in node.args:
+                self.assign(arg, inner)
+
+            self.block(node.body, inner)
+        elif isinstance(node, nodes.With):
+            inner = dict(scope)
+
+            for target, value in zip(node.targets, node.values):
+                path = self.path(value, scope)
+
+                if path is None:
+                    self.expression(value, scope)
+
+                self.assign(target, inner, path)
+
+            self.block(node.body, inner)
+        elif isinstance(node, (nodes.Block, nodes.FilterBlock, nodes.Scope)):
+            if isinstance(node, nodes.FilterBlock):
+                self.expression(node.filter, scope)
+
+            self.block(node.body, dict(scope))
+        elif isinstance(node, (nodes.Import, nodes.FromImport)):
+            self.expression(node.template, scope)
+
+            if isinstance(node, nodes.Import):
+                scope[node.target] = None
+            else:
+                for name in node.names:
+                    scope[name[1] if isinstance(name, tuple) else name] = None
+        else:
+            for child in node.iter_child_nodes():
+                if isinstance(child, nodes.Expr):
+                    self.expression(child, scope)
+                else:
+                    self.statement(child, scope)
+
+
+def get_value_paths(ast, engine: Environment) -> Set[ValuePath]:
+    """
+    get the value paths read by a template, e.g. ('app', 'image', 'tag') for
+    app.image.tag or app['image'].tag. loop variables read every element of
+    their iterable, marked by a WILDCARD component.
+
+    paths are as precise as the template allows: any other use of a value, like
+    passing it to a filter, reads the whole value.
+    """
+
+    visitor = _ValuePathVisitor(set(engine.globals.keys()) - PROHIBITED_VARIABLE_NAMES)
+    visitor.block(ast.body, {})
+
+    return visitor.paths
+
+
+def render(template: Union[str, CompiledTemplate], values: dict, engine: Environment) -> str:
+    return render_documents(template, values, engine)[0]
+
+
+def render_documents(template: Union[str, CompiledTemplate], values: dict, engine: Environment) -> Tuple[str, List[Any]]:
+    """
+    render a template, returns the output together with its parsed documents.
+    """
+
+    name = template.name if isinstance(template, CompiledTemplate) else template
+
+    with span("render", template=name):
+        with span("jinja", template=name):
+            if isinstance(template, CompiledTemplate):
+                output = template.template.render(values)
+            else:
+                output = engine.get_template(template).render(values)
+
+        with span("yaml.parse", template=name):
+            return output, parse_output(output)
+
+
+def _loader() -> YAML:
+    loader = getattr(_LOADERS, "yaml", None)
+
+    if loader is None:
+        # uses the libyaml based parser if ruamel.yaml.clib is installed
+        loader = _LOADERS.yaml = YAML(typ='safe')
+
+    return loader
+
+
+def parse_output(output: str) -> List[Any]:
+    """
+    parse every document of a rendered template, raises YamlValidationError
+    if the output is not valid yaml.
+    """
 
     try:
-        yaml.load_all(output)
-    except (yaml.scanner.ScannerError, yaml.parser.ParserError) as err:
+        return list(_loader().load_all(output))
+    except YAMLError as err:
         raise YamlValidationError(err) from err
-
-    return output
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import logging
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional, Set
+
+from jinja2 import Environment
+
+from k8t.dependencies import DependencyIndex
+from k8t.templates import WILDCARD, CompiledTemplate, ValuePath, compile_template
+
+LOGGER = logging.getLogger(__name__)
+
+
+def format_path(path: ValuePath) -> str:
+    return ".".join(path)
+
+
+def parse_path(path: str) -> ValuePath:
+    return tuple(path.split(".")) if path else ()
+
+
+def overlaps(first: ValuePath, second: ValuePath) -> bool:
+    """
+    check if reading one path reads (part of) the other, i.e. one is a prefix
+    of the other.
+    """
+
+    return all(a == b or WILDCARD in (a, b) for a, b in zip(first, second))
+
+
+def changed_paths(old: Any, new: Any, prefix: ValuePath = ()) -> Set[ValuePath]:
+    """
+    get the topmost paths that differ between two value sets.
+    """
+
+    if not isinstance(old, Mapping) or not isinstance(new, Mapping):
+        return set() if old == new else {prefix}
+
+    result: Set[ValuePath] = set()
+
+    for key in set(old) | set(new):
+        path = prefix + (str(key),)
+
+        if key not in old or key not in new:
+            result.add(path)
+        elif old[key] != new[key]:
+            result |= changed_paths(old[key], new[key], path)
+
+    return result
+
+
+def template_reads(name: str, compiled: Callable[[str], Optional[CompiledTemplate]], references: Callable[[str], Optional[Set[str]]],
+                   seen: Optional[Set[str]] = None) -> Optional[Set[ValuePath]]:
+    """
+    get the value paths read by a template and everything it references, None
+    if that can not be determined.
+    """
+
+    seen = seen if seen is not None else set()
+
+    if name in seen:
+        return set()
+
+    seen.add(name)
+
+    template = compiled(name)
+    referenced = references(name)
+
+    if template is None or referenced is None:
+        return None
+
+    result = set(template.value_paths)
+
+    for reference in referenced:
+        reference_reads = template_reads(reference, compiled, references, seen)
+
+        if reference_reads is None:
+            return None
+
+        result |= reference_reads
+
+    return result
+
+
+def _unused(values: Mapping, paths: Iterable[ValuePath], prefix: ValuePath) -> Set[ValuePath]:
+    result: Set[ValuePath] = set()
+
+    for key, value in values.items():
+        path = prefix + (str(key),)
+        matching = [read for read in paths if overlaps(path, read)]
+
+        if not matching:
+            result.add(path)
+        elif isinstance(value, Mapping) and all(len(read) > len(path) for read in matching):
+            result |= _unused(value, matching, path)
+
+    return result
+
+
+class UsageIndex:
+    """
+    Maps templates to the value paths they read, including through the
+    templates they include, import or extend.
+    """
+
+    def __init__(self, engine: Environment, names: Optional[Iterable[str]] = None, dependencies: Optional[DependencyIndex] = None):
+        self.engine = engine
+        self.dependencies = dependencies or DependencyIndex(engine)
+
+        self._templates: Dict[str, Optional[CompiledTemplate]] = {}
+
+        self.reads: Dict[str, Optional[Set[ValuePath]]] = {
+            name: template_reads(name, self._compiled, self.dependencies.references)
+            for name in (names if names is not None else engine.list_templates())
+        }
+
+    def _compiled(self, name: str) -> Optional[CompiledTemplate]:
+        if name not in self._templates:
+            try:
+                self._templates[name] = compile_template(name, self.engine)
+            except Exception as exc:  # pylint: disable=broad-except
+                LOGGER.debug("failed to analyze template %s: %s", name, exc)
+
+                self._templates[name] = None
+
+        return self._templates[name]
+
+    def readers(self, path: ValuePath) -> Set[str]:
+        """
+        templates reading a value path, a parent or a child of it.
+        """
+
+        return {name for name, paths in self.reads.items() if paths is None or any(overlaps(path, read) for read in paths)}
+
+    def unused(self, values: Mapping) -> Set[ValuePath]:
+        """
+        topmost value paths not read by any template.
+        """
+
+        paths: Set[ValuePath] = set()
+
+        for reads in self.reads.values():
+            if reads is None:
+                return set()
+
+            paths |= reads
+
+        return _unused(values, paths, ())
@@ -8,22 +8,37 @@
 # THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
 import copy
+import datetime
+import hashlib
 import json
 import logging
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
 
-from functools import reduce
-from typing import Any, Dict, List, Tuple
-
-import bitmath
 
 from click import secho  # pylint: disable=E0401
-from ruamel.yaml import YAML  # pylint: disable=E0401
 from simple_tools.interaction import confirm  # pylint: disable=E0401
 
+from k8t.profiling import count, span, traced
+
+try:
+    import ujson  # pylint: disable=E0401
+except ImportError:
+    ujson = None
+
 LOGGER = logging.getLogger(__name__)
 
+_YAML_CACHE: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+# parsed files are also kept on disk if set, see set_parse_cache
+_PARSE_CACHE_DIR: Optional[str] = None
+
+# used instead of os.environ if set for the current context, see use_environ
+_ENVIRON: ContextVar[Optional[Mapping[str, str]]] = ContextVar("k8t_environ", default=None)
+
 
 def touch(fname: str, mode=0o666, dir_fd=None, **kwargs) -> None:
     if os.path.exists(fname):
@@ -66,52 +81,167 @@ MERGE_METHODS = ["ltr", "rtl", "ask", "crash"]
 
 
 def merge(d_1: dict, d_2: dict, path=None, method="ltr"):
-    d_1 = copy.deepcopy(d_1)
-
-    if path is None:
-        path = []
-
-    for key in d_2:
-        if key in d_1:
-            if isinstance(d_1[key], dict) and isinstance(d_2[key], dict):
-                d_1[key] = merge(d_1[key], d_2[key], path + [str(key)], method=method)
-            elif d_1[key] == d_2[key]:
-                pass  # same leaf value
-            else:
-                if method == "ltr":
-                    d_1[key] = d_2[key]
-                elif method == "rtl":
-                    pass
-                elif method == "ask":
-                    raise NotImplementedError('Merge method "ask"')
-                elif method == "crash":
-                    value_path = ".".join(path + [str(key)])
-
-                    raise RuntimeError(f"Conflict at {value_path}")
-                else:
-                    raise RuntimeError(f"Invalid merge method: {method}")
+    return _merge([d_1, d_2], [] if path is None else path, method)
+
+
+def select_layers(values: List[Any], path: List[str], method: str = "ltr") -> List[int]:
+    """
+    decide which of the values a key has in consecutive layers ends up in the
+    merge result, the same way merging the layers pairwise would.
+
+    returns the index of the resulting value, or the indices of all dicts
+    that have to be merged.
+    """
+
+    current = 0
+    dicts = [0] if isinstance(values[0], dict) else None
+
+    for index, value in enumerate(values[1:], 1):
+        if dicts is not None and isinstance(value, dict):
+            dicts.append(index)
+        elif dicts is None and values[current] == value:
+            pass  # same leaf value
+        elif method == "ltr":
+            current = index
+            dicts = [index] if isinstance(value, dict) else None
+        elif method == "rtl":
+            pass
+        elif method == "ask":
+            raise NotImplementedError('Merge method "ask"')
+        elif method == "crash":
+            value_path = ".".join(path)
+
+            raise RuntimeError(f"Conflict at {value_path}")
+        else:
+            raise RuntimeError(f"Invalid merge method: {method}")
+
+    return [current] if dicts is None else dicts
+
+
+def _merge(layers: List[dict], path: List[str], method: str) -> dict:
+    if len(layers) == 1:
+        return layers[0]  # nothing to merge, share the subtree
+
+    values: Dict[Any, List[Any]] = {}
+
+    for layer in layers:
+        for key, value in layer.items():
+            values.setdefault(key, []).append(value)
+
+    result = {}
+
+    for key, key_values in values.items():
+        selected = select_layers(key_values, path + [str(key)], method)
+
+        if isinstance(key_values[selected[0]], dict):
+            result[key] = _merge([key_values[index] for index in selected], path + [str(key)], method)
         else:
-            d_1[key] = d_2[key]
+            result[key] = key_values[selected[0]]
 
-    return d_1
+    return result
 
 
+@traced("deep_merge")
 def deep_merge(*dicts, method="ltr"):
+    """
+    merge any number of dicts in a single pass.
+
+    only dicts present in more than one layer are copied, everything else is
+    shared with the layers, so the result must not be modified in place.
+    """
+
     LOGGER.debug('"%s" merging %s dicts', method, len(dicts))
 
-    if not dicts:
+    layers = [d for d in dicts if d is not None]
+
+    if not layers:
         return {}
 
-    return reduce(lambda a, b: merge(a, b, method=method) if b is not None else a, dicts)
+    return _merge(layers, [], method)
 
 
-def load_yaml(path: str) -> dict:
+def set_parse_cache(directory: Optional[str]) -> None:
+    """
+    keep parsed yaml files in a cache directory, None disables the cache.
+    """
+
+    global _PARSE_CACHE_DIR  # pylint: disable=global-statement
+
+    _PARSE_CACHE_DIR = directory
+
+
+def _parse_yaml(path: str, signature: Tuple[int, int]) -> Any:
+    # pylint: disable=import-outside-toplevel
+    from ruamel.yaml import YAML  # pylint: disable=E0401
+
+    from k8t import cache
+
+    with open(path, "rb") as stream:
+        content = stream.read()
+
+    cache_signature = signature + (hashlib.sha256(content).hexdigest(),)
+
+    if _PARSE_CACHE_DIR is not None:
+        found, data = cache.load_parsed(_PARSE_CACHE_DIR, path, cache_signature)
+
+        if found:
+            LOGGER.debug("using parse cache for values file: %s", path)
+            count("cache", cache="values", result="hit")
+
+            return data
+
+    count("cache", cache="values", result="miss")
+
     LOGGER.debug("loading values file: %s", path)
 
-    with open(path, "r") as stream:
-        yaml = YAML(typ="safe", pure=True)
+    # uses the libyaml based parser if ruamel.yaml.clib is installed
+    yaml = YAML(typ="safe")
+
+    with span("yaml.load", path=path):
+        data = yaml.load(content) or {}
 
-        return yaml.load(stream) or {}
+    if _PARSE_CACHE_DIR is not None:
+        cache.store_parsed(_PARSE_CACHE_DIR, path, cache_signature, data)
+
+    return data
+
+
+def load_yaml(path: str) -> dict:
+    """
+    load a yaml file, parsed files are kept for the lifetime of the process.
+
+    the result is shared between callers and must not be modified.
+    """
+
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cache_key = os.path.abspath(path)
+
+    cached = _YAML_CACHE.get(cache_key)
+
+    if cached is not None and cached[0] == signature:
+        LOGGER.debug("using cached values file: %s", path)
+        count("cache", cache="values", result="hit")
+
+        return cached[1]
+
+    data = _parse_yaml(path, signature)
+
+    _YAML_CACHE[cache_key] = (signature, data)
+
+    return data
+
+
+def load_yaml_files(paths: List[str]) -> List[dict]:
+    """
+    load several yaml files concurrently, see load_yaml.
+    """
+
+    if len(paths) <= 1:
+        return [load_yaml(path) for path in paths]
+
+    with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+        return list(executor.map(load_yaml, paths))
 
 
 def load_cli_value(key: str, value: str) -> Tuple[str, Any]:
@@ -123,21 +253,77 @@ def load_cli_value(key: str, value: str) -> Tuple[str, Any]:
         return key, value
 
 
+def json_default(value: Any) -> Any:
+    # lazily merged values are mappings, but not dicts
+    if isinstance(value, Mapping):
+        return dict(value)
+
+    # unquoted dates and timestamps in yaml
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
 def to_json(input: dict) -> str:
-    return json.dumps(input)
+    return json.dumps(input, default=json_default)
+
+
+def to_json_documents(input: Any) -> str:
+    """
+    serialize rendered documents with ujson if it is installed, its output
+    is compact. falls back to to_json for integers ujson can not represent.
+    """
+
+    if ujson is not None:
+        try:
+            return ujson.dumps(input, default=json_default, escape_forward_slashes=False)
+        except OverflowError:
+            pass
+
+    return to_json(input)
 
 
 def to_yaml(input: dict) -> str:
+    from ruamel.yaml import YAML  # pylint: disable=E0401,import-outside-toplevel
+
     yaml = YAML()
+    # walk_tree works in place, merged values share their leaves with the cached files
+    input = copy.deepcopy(input)
     yaml.scalarstring.walk_tree(input)
     return yaml.round_trip_dump(input, default_flow_style=False, allow_unicode=True, explicit_start=True)
 
 
+def environ() -> Mapping[str, str]:
+    """
+    get the environment variables of the current context, os.environ if none are set.
+    """
+
+    env = _ENVIRON.get()
+
+    return os.environ if env is None else env
+
+
+@contextmanager
+def use_environ(env: Optional[Mapping[str, str]]) -> Iterator[Mapping[str, str]]:
+    """
+    set the environment variables for the current context, e.g. those of a
+    client of the render daemon. None keeps os.environ.
+    """
+
+    token = _ENVIRON.set(env)
+
+    try:
+        yield environ()
+    finally:
+        _ENVIRON.reset(token)
+
+
 def envvalues() -> Dict:
     prefix: str = "K8T_VALUE_"
     values: dict = dict()
 
-    for key, value in os.environ.items():
+    for key, value in environ().items():
         if key.startswith(prefix):
             values[key.replace(prefix, "", 1).lower()] = value
 
@@ -163,8 +349,3 @@ def read_file(path: str) -> str:
     with open(path, "rb") as stream:
         return stream.read().decode()
 
-
-def memory_to_mb(value: str) -> int:
-    parsed = bitmath.parse_string(value)  # all memory values are in bytes
-
-    return int(parsed.to_MB())
@@ -8,15 +8,24 @@
 # THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
 import logging
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
 
+from k8t.profiling import traced
 from k8t.project import find_files
-from k8t.util import deep_merge, load_yaml
+from k8t.util import deep_merge, load_yaml_files, select_layers
 
 LOGGER = logging.getLogger(__name__)
 
+Layer = Tuple[str, Mapping]
+
+
+@traced("values.load_layers")
+def load_layers(root: str, cluster: str, environment: str) -> List[Layer]:
+    """
+    load the value layers of a context as (source, values) pairs, lowest
+    precedence first.
+    """
 
-def load_all(root: str, cluster: str, environment: str, method: str) -> Dict[str, Any]:
     values: List[str] = find_files(
         root, cluster, environment, "values.yaml", dir_ok=False)
 
@@ -30,4 +39,105 @@ def load_all(root: str, cluster: str, environment: str, method: str) -> Dict[str
     if environment is not None:
         context['environment'] = environment
 
-    return deep_merge(*[load_yaml(f) for f in values], context, method=method)
+    return list(zip(values, load_yaml_files(values))) + [("<context>", context)]
+
+
+@traced("values.load_all")
+def load_all(root: str, cluster: str, environment: str, method: str) -> Dict[str, Any]:
+    return deep_merge(*[layer for _, layer in load_layers(root, cluster, environment)], method=method)
+
+
+class LayeredValues(Mapping):
+    """
+    Read-only view merging value layers on demand.
+
+    Keys are resolved when they are first accessed, with the same semantics as
+    deep_merge, and cached afterwards. Nested mappings present in several
+    layers are views themselves, everything else is shared with the layers.
+    Conflicts with the crash method are still reported up front.
+
+    Views print like the merged dict, templates rendering a mapping directly
+    (e.g. {{ labels }}) get the same output as with a dict.
+    """
+
+    def __init__(self, layers: Sequence[Layer], method: str = "ltr", path: Tuple[str, ...] = ()):
+        self._layers = [(source, layer) for source, layer in layers if layer is not None]
+        self._method = method
+        self._path = path
+        self._resolved: Dict[Any, Tuple[Any, Optional[str]]] = {}
+        self._keys: Optional[List[Any]] = None
+
+        if not path and method != "ltr" and method != "rtl":
+            to_dict(self)
+
+    def _resolve(self, key: Any) -> Tuple[Any, Optional[str]]:
+        """
+        get the value of a key together with the source it came from, None if
+        it is merged from several sources.
+        """
+
+        if key not in self._resolved:
+            candidates = [(source, layer[key]) for source, layer in self._layers if key in layer]
+
+            if not candidates:
+                raise KeyError(key)
+
+            path = self._path + (str(key),)
+            selected = [candidates[index] for index in select_layers([value for _, value in candidates], list(path), self._method)]
+
+            if len(selected) > 1:
+                self._resolved[key] = (LayeredValues(selected, self._method, path), None)
+            else:
+                self._resolved[key] = (selected[0][1], selected[0][0])
+
+        return self._resolved[key]
+
+    def __getitem__(self, key: Any) -> Any:
+        return self._resolve(key)[0]
+
+    def __contains__(self, key: Any) -> bool:
+        return any(key in layer for _, layer in self._layers)
+
+    def __iter__(self) -> Iterator[Any]:
+        if self._keys is None:
+            self._keys = list(dict.fromkeys(key for _, layer in self._layers for key in layer))
+
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return repr(to_dict(self))
+
+    def copy(self) -> Dict[Any, Any]:
+        return to_dict(self)
+
+
+def to_dict(values: Mapping) -> Dict[Any, Any]:
+    """
+    merge all layers of a view into a dict.
+    """
+
+    return {key: to_dict(value) if isinstance(value, LayeredValues) else value for key, value in values.items()}
+
+
+def explain(values: LayeredValues, path: Tuple[str, ...] = (), source: Optional[str] = None) -> List[Tuple[Tuple[str, ...], Any, str]]:
+    """
+    list every leaf value as (path, value, source).
+    """
+
+    result = []
+
+    for key in values:
+        if isinstance(values, LayeredValues):
+            value, value_source = values._resolve(key)  # pylint: disable=protected-access
+        else:
+            value, value_source = values[key], source
+
+        if isinstance(value, Mapping) and value:
+            result.extend(explain(value, path + (str(key),), value_source))
+        else:
+            result.append((path + (str(key),), value, value_source))
+
+    return result
@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import logging
+import os
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from k8t import config, project, secret_providers
+from k8t.cache import TemplateCache
+from k8t.dependencies import DependencyIndex
+from k8t.engine import build, find_template_paths
+from k8t.matrix import load_config, load_values
+from k8t.templates import CompiledTemplate, ValuePath, compile_template, render, validate
+from k8t.usage import changed_paths as diff
+from k8t.usage import format_path, overlaps, template_reads
+
+try:
+    from inotify_simple import INotify, flags  # pylint: disable=E0401
+except ImportError:
+    INotify = None
+
+LOGGER = logging.getLogger(__name__)
+LAYER_FILES = ("values.yaml", "config.yaml")
+POLL_INTERVAL = 1.0
+SETTLE_DELAY = 0.1
+
+Directories = List[Tuple[str, bool]]
+
+
+class PollingWatcher:
+    """
+    Detects changes by comparing modification times and sizes.
+    """
+
+    def __init__(self, directories: Directories):
+        self.directories = directories
+        self._snapshot = self._scan()
+
+    def add(self, directory: str, recursive: bool = False) -> None:
+        self.directories = self.directories + [(directory, recursive)]
+        self._snapshot.update(self._scan([(directory, recursive)]))
+
+    def _scan(self, directories: Optional[Directories] = None) -> Dict[str, Tuple[int, int]]:
+        result = {}
+        pending = list(self.directories if directories is None else directories)
+
+        while pending:
+            directory, recursive = pending.pop()
+
+            try:
+                with os.scandir(directory) as iterator:
+                    for entry in iterator:
+                        if entry.is_dir():
+                            if recursive:
+                                pending.append((entry.path, True))
+                        elif entry.is_file():
+                            stat = entry.stat()
+                            result[entry.path] = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                pass
+
+        return result
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            snapshot = self._scan()
+            changed = {path for path in snapshot.keys() | self._snapshot.keys() if snapshot.get(path) != self._snapshot.get(path)}
+
+            self._snapshot = snapshot
+
+            if changed:
+                return changed
+
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+
+            time.sleep(POLL_INTERVAL if deadline is None else max(0, min(POLL_INTERVAL, deadline - time.monotonic())))
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """
+    Detects changes through inotify, requires the inotify_simple package.
+    """
+
+    def __init__(self, directories: Directories):
+        self._mask = flags.CLOSE_WRITE | flags.CREATE | flags.DELETE | flags.MOVED_TO | flags.MOVED_FROM
+        self._inotify = INotify()
+        self._watches: Dict[int, Tuple[str, bool]] = {}
+
+        for directory, recursive in directories:
+            self._add(directory, recursive)
+
+    def add(self, directory: str, recursive: bool = False) -> None:
+        self._add(directory, recursive)
+
+    def _add(self, directory: str, recursive: bool) -> None:
+        try:
+            watch_descriptor = self._inotify.add_watch(directory, self._mask)
+        except OSError:
+            return
+
+        self._watches[watch_descriptor] = (directory, recursive)
+
+        if recursive:
+            with os.scandir(directory) as iterator:
+                for entry in iterator:
+                    if entry.is_dir():
+                        self._add(entry.path, True)
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        changed: Set[str] = set()
+
+        events = self._inotify.read(timeout=None if timeout is None else int(timeout * 1000))
+
+        while events:
+            for event in events:
+                directory, recursive = self._watches.get(event.wd, (None, False))
+
+                if directory is None or not event.name:
+                    continue
+
+                path = os.path.join(directory, event.name)
+
+                if event.mask & flags.ISDIR:
+                    if recursive and event.mask & (flags.CREATE | flags.MOVED_TO):
+                        self._add(path, True)
+                else:
+                    changed.add(path)
+
+            # editors tend to write several events per save
+            events = self._inotify.read(timeout=int(SETTLE_DELAY * 1000))
+
+        return changed
+
+    def close(self) -> None:
+        self._inotify.close()
+
+
+def create_watcher(directories: Directories, polling: bool = False):
+    if INotify is None or polling:
+        LOGGER.debug("watching %d directories by polling", len(directories))
+
+        return PollingWatcher(directories)
+
+    LOGGER.debug("watching %d directories with inotify", len(directories))
+
+    return InotifyWatcher(directories)
+
+
+class WatchSession:  # pylint: disable=too-many-instance-attributes
+    """
+    Keeps engine, values and compiled templates of a single target between
+    renders and re-renders only the templates affected by a change.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, root: str, cluster_name: Optional[str], environment_name: Optional[str], method: str = "ltr", value_files=(), cli_values=(),
+                 suffixes=None, secret_provider: Optional[str] = None, template_overrides=None, bytecode_cache: Optional[TemplateCache] = None):
+        self.root = root
+        self.cluster = cluster_name
+        self.environment = environment_name
+        self.method = method
+        self.value_files = [os.path.abspath(path) for path in value_files]
+        self.cli_values = cli_values
+        self.suffixes = suffixes
+        self.secret_provider = secret_provider
+        self.template_overrides = template_overrides or []
+        self.bytecode_cache = bytecode_cache or TemplateCache()
+
+        self.template_dirs = [] if self.template_overrides else [os.path.abspath(path) for path in find_template_paths(root, cluster_name, environment_name)]
+        self.override_paths = {os.path.abspath(path) for _, path in self.template_overrides}
+
+        self.engine = self._build()
+        self.index = DependencyIndex(self.engine)
+        self.values = load_values(root, cluster_name, environment_name, method, value_files, cli_values)
+        config.CONFIG = load_config(root, cluster_name, environment_name, method, secret_provider)
+
+        self.templates: Dict[str, CompiledTemplate] = {}
+        self.outputs: Dict[str, str] = {}
+        self.errors: Dict[str, str] = {}
+
+    def _build(self):
+        return build(self.root, self.cluster, self.environment, self.template_overrides, self.bytecode_cache)
+
+    def _layer_directories(self) -> List[str]:
+        directories = [self.root]
+
+        if self.environment is not None:
+            directories.append(os.path.join(self.root, "environments", self.environment))
+
+        if self.cluster is not None:
+            cluster_dir = os.path.join(self.root, "clusters", self.cluster)
+            directories.append(cluster_dir)
+
+            if self.environment is not None:
+                directories.append(os.path.join(cluster_dir, "environments", self.environment))
+
+        return [os.path.abspath(directory) for directory in directories]
+
+    def directories(self) -> Directories:
+        result = [(directory, True) for directory in self.template_dirs]
+        result.extend((directory, False) for directory in self._layer_directories())
+        result.extend((os.path.dirname(path), False) for path in self.value_files + sorted(self.override_paths))
+
+        return sorted(set(result))
+
+    def names(self) -> List[str]:
+        names = self.engine.list_templates()
+
+        if self.suffixes:
+            names = [name for name in names if os.path.splitext(name)[1] in self.suffixes]
+
+        return names
+
+    def output(self) -> str:
+        return "".join("---\n# Source: {}\n{}\n".format(name, self.outputs[name]) for name in self.names() if name in self.outputs)
+
+    def _compiled(self, name: str) -> Optional[CompiledTemplate]:
+        if name not in self.templates:
+            try:
+                self.templates[name] = compile_template(name, self.engine)
+            except Exception:  # pylint: disable=broad-except
+                return None
+
+        return self.templates[name]
+
+    def dependents(self, names: Set[str]) -> Set[str]:
+        return self.index.dependents(names, self.names())
+
+    def reads(self, name: str) -> Optional[Set[ValuePath]]:
+        """
+        value paths read by a template and everything it references, None if
+        that can not be determined.
+        """
+
+        return template_reads(name, self._compiled, self.index.references)
+
+    def render(self, names: Iterable[str]) -> List[str]:
+        names = list(names)
+
+        for name in names:
+            self.templates.pop(name, None)
+
+        secret_providers.prefetch(set().union(*(template.secret_keys for template in map(self._compiled, names) if template is not None)))
+
+        for name in names:
+            try:
+                template = self.templates.get(name) or compile_template(name, self.engine)
+                self.templates[name] = template
+
+                if not validate(template, self.values, self.engine):
+                    raise RuntimeError("Failed to validate template {}".format(name))
+
+                self.outputs[name] = render(template, self.values, self.engine)
+                self.errors.pop(name, None)
+            except Exception as err:  # pylint: disable=broad-except
+                self.outputs.pop(name, None)
+                self.errors[name] = str(err)
+
+        return names
+
+    def _template_name(self, path: str) -> Optional[str]:
+        for directory in self.template_dirs:
+            if path.startswith(directory + os.sep):
+                return os.path.relpath(path, directory).replace(os.sep, "/")
+
+        return None
+
+    def update(self, changed_paths: Iterable[str]) -> List[str]:  # pylint: disable=too-many-branches
+        """
+        re-render everything affected by changed files, returns the names of
+        the re-rendered templates.
+        """
+
+        changed_templates: Set[str] = set()
+        reload_values = reload_config = rebuild = False
+
+        for path in (os.path.abspath(path) for path in changed_paths):
+            name = self._template_name(path)
+
+            if name is not None:
+                changed_templates.add(name)
+            elif path in self.override_paths:
+                rebuild = True
+            elif path in self.value_files or os.path.basename(path) == "values.yaml":
+                reload_values = True
+            elif os.path.basename(path) == "config.yaml":
+                reload_config = True
+
+        previous = set(self.outputs) | set(self.errors)
+        affected: Set[str] = set()
+
+        if rebuild:
+            self.engine = self._build()
+            self.index = DependencyIndex(self.engine)
+            self.templates.clear()
+            affected.update(previous)
+
+        if changed_templates:
+            LOGGER.debug("templates changed: %s", sorted(changed_templates))
+
+            affected |= changed_templates | self.dependents(changed_templates)
+
+            for name in changed_templates:
+                self.templates.pop(name, None)
+
+        names = self.names()
+
+        if reload_values or reload_config:
+            # a layer file may have been added or removed
+            project.invalidate(self.root)
+
+        if reload_values:
+            old_values = self.values
+            self.values = load_values(self.root, self.cluster, self.environment, self.method, self.value_files, self.cli_values)
+
+            changed = diff(old_values, self.values)
+
+            LOGGER.debug("values changed: %s", sorted(format_path(path) for path in changed))
+
+            for name in names:
+                paths = self.reads(name)
+
+                if paths is None or any(overlaps(path, read) for path in changed for read in paths):
+                    affected.add(name)
+
+        if reload_config:
+            config.CONFIG = load_config(self.root, self.cluster, self.environment, self.method, self.secret_provider)
+            secret_providers.reset()
+            affected.update(names)
+
+        for name in previous - set(names):
+            self.outputs.pop(name, None)
+            self.errors.pop(name, None)
+            self.templates.pop(name, None)
+
+        affected |= set(names) - previous
+
+        return self.render(name for name in names if name in affected)
+
+
+def run(session: WatchSession, emit: Callable[[WatchSession, List[str]], None], polling: bool = False) -> None:
+    emit(session, session.render(session.names()))
+
+    watcher = create_watcher(session.directories(), polling)
+
+    try:
+        while True:
+            rendered = session.update(watcher.wait())
+
+            if rendered:
+                emit(session, rendered)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
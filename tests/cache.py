@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import datetime
+import json
+import os
+
+from click.testing import CliRunner
+from mock import patch  # pylint: disable=E0401
+
+from k8t import cache, config
+from k8t.cli import root
+from k8t.engine import build
+from k8t.templates import render
+
+VALUES = dict(env='env', cls='cls', foo=1, bar='test')
+
+
+def test_template_cache(tmp_path):
+    template_cache = cache.TemplateCache(str(tmp_path))
+
+    render('cluster-1-template.yaml.j2', VALUES, build('tests/resources/good', 'cluster-1', 'common-env', bytecode_cache=template_cache))
+    assert template_cache.misses == 1
+    assert template_cache.hits == 0
+    assert cache.stats(str(tmp_path))['templates'] == 1
+
+    render('cluster-1-template.yaml.j2', VALUES, build('tests/resources/good', 'cluster-1', 'common-env', bytecode_cache=template_cache))
+    assert template_cache.hits == 1
+
+
+def test_template_cache_owner(tmp_path):
+    render('common-template.yaml.j2', VALUES, build('tests/resources/good', None, None, bytecode_cache=cache.TemplateCache(str(tmp_path))))
+
+    # entries written by another user are compiled again
+    template_cache = cache.TemplateCache(str(tmp_path))
+
+    with patch.object(os, 'getuid', return_value=os.getuid() + 1):
+        render('common-template.yaml.j2', VALUES, build('tests/resources/good', None, None, bytecode_cache=template_cache))
+
+    assert template_cache.hits == 0
+    assert template_cache.misses == 1
+
+
+def test_template_cache_overlays(tmp_path):
+    config.CONFIG = {"secrets": {"provider": "hash"}}
+    template_cache = cache.TemplateCache(str(tmp_path))
+
+    cluster_output = render(
+        'cluster-1-template.yaml.j2', VALUES, build('tests/resources/good', 'cluster-1', None, bytecode_cache=template_cache))
+    env_output = render(
+        'cluster-1-template.yaml.j2', VALUES, build('tests/resources/good', 'cluster-1', 'common-env', bytecode_cache=template_cache))
+
+    assert 'overwritten-in-env' not in cluster_output
+    assert 'overwritten-in-env' in env_output
+    assert template_cache.misses == 2
+    assert cache.stats(str(tmp_path))['templates'] == 2
+
+    assert render(
+        'cluster-1-template.yaml.j2', VALUES, build('tests/resources/good', 'cluster-1', None, bytecode_cache=template_cache)) == cluster_output
+    assert template_cache.hits == 1
+
+
+def test_template_cache_eviction(tmp_path):
+    template_cache = cache.TemplateCache(str(tmp_path), max_size=1)
+
+    render('common-template.yaml.j2', VALUES, build('tests/resources/good', None, None, bytecode_cache=template_cache))
+    assert cache.stats(str(tmp_path)) == dict(templates=0, files=0, size=0)
+
+
+def test_cache_commands(tmp_path):
+    runner = CliRunner()
+    cache_dir = str(tmp_path)
+
+    result = runner.invoke(root, ['gen', '--cache-dir', cache_dir, 'tests/resources/good'])
+    assert result.exit_code == 0
+    assert os.listdir(os.path.join(cache_dir, cache.TEMPLATE_DIR))
+
+    result = runner.invoke(root, ['cache', 'stats', '--cache-dir', cache_dir])
+    assert result.exit_code == 0
+    assert 'templates: 1' in result.output
+
+    entries = 1 + cache.stats(cache_dir)['files']
+
+    result = runner.invoke(root, ['cache', 'clear', '--cache-dir', cache_dir])
+    assert result.exit_code == 0
+    assert 'removed {} entries'.format(entries) in result.output
+
+    result = runner.invoke(root, ['cache', 'stats', '--cache-dir', cache_dir])
+    assert 'templates: 0' in result.output
+    assert 'files: 0' in result.output
+
+
+# vim: fenc=utf-8:ts=4:sw=4:expandtab
+
+
+def test_parsed_cache(tmp_path):
+    signature = (1, 2, 'abc')
+
+    assert cache.load_parsed(str(tmp_path), 'values.yaml', signature) == (False, None)
+
+    cache.store_parsed(str(tmp_path), 'values.yaml', signature, {'a': [1, 2]})
+
+    assert cache.load_parsed(str(tmp_path), 'values.yaml', signature) == (True, {'a': [1, 2]})
+    assert cache.load_parsed(str(tmp_path), 'values.yaml', (1, 3, 'abc')) == (False, None)
+    assert cache.stats(str(tmp_path))['files'] == 1
+
+    # a changed file replaces its entry
+    cache.store_parsed(str(tmp_path), 'values.yaml', (1, 3, 'abc'), {})
+
+    assert cache.stats(str(tmp_path))['files'] == 1
+    assert cache.clear(str(tmp_path)) == 1
+
+
+def test_parsed_cache_types(tmp_path):
+    data = {
+        'a': [1, 2.5, None, True, 'text'],
+        1: {'date': datetime.date(2020, 1, 2), 'time': datetime.datetime(2020, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc)},
+        'binary': b'\x00\x01',
+        'set': {'x', 'y'},
+        'nested': {'!map': 'a mapping that looks like a tag'},
+        (1, 2): 'tuple key',
+    }
+
+    cache.store_parsed(str(tmp_path), 'values.yaml', (1, 2, 'abc'), data)
+
+    assert cache.load_parsed(str(tmp_path), 'values.yaml', (1, 2, 'abc')) == (True, data)
+
+    # entries are plain json, nothing is executed when loading them
+    with open(cache._parsed_path(str(tmp_path), 'values.yaml')) as stream:  # pylint: disable=protected-access
+        assert json.load(stream)['signature'] == [1, 2, 'abc']
+
+    cache.store_parsed(str(tmp_path), 'values.yaml', (1, 3, 'abc'), {'unsupported': object()})
+
+    assert cache.load_parsed(str(tmp_path), 'values.yaml', (1, 3, 'abc')) == (False, None)
@@ -7,17 +7,54 @@
 #
 # THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
+import json
 import os
+import shutil
+import subprocess
+import sys
 
 from click.testing import CliRunner
 
 import boto3
 from moto import mock_aws  # pylint: disable=E0401
+from ruamel.yaml import YAML  # pylint: disable=E0401
 
-from k8t import __license__, __version__
+from k8t import __license__, __version__, cache, cli
 from k8t.cli import root
 from k8t.scaffolding import list_available_templates
 
+# import time (ms) and modules which must not be imported per command
+STARTUP_BUDGETS = (
+    (['license'], 400, {'boto3', 'botocore', 'pkg_resources', 'bitmath', 'ruamel.yaml', 'jinja2', 'k8t.engine', 'k8t.secret_providers'}),
+    (['get', 'clusters', 'tests/resources/good'], 400, {'boto3', 'botocore', 'pkg_resources', 'bitmath', 'ruamel.yaml', 'jinja2', 'k8t.engine'}),
+    (['validate', 'tests/resources/good'], 600, {'boto3', 'botocore', 'pkg_resources', 'bitmath'}),
+    (['gen', 'tests/resources/good'], 600, {'boto3', 'botocore', 'pkg_resources', 'bitmath'}),
+)
+
+
+def import_times(*args):
+    """
+    cumulative import time in microseconds of every module imported by a
+    command, without the modules every interpreter imports on startup.
+    """
+
+    def parse(output):
+        result = {}
+
+        for line in output.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+
+            _, cumulative, name = line[len('import time:'):].split('|')
+            result[name.strip()] = (int(cumulative), not name.startswith('  '))
+
+        return result
+
+    startup = parse(subprocess.run([sys.executable, '-X', 'importtime', '-c', 'pass'], capture_output=True, text=True, check=True).stderr)
+    command = parse(subprocess.run([sys.executable, '-X', 'importtime', '-m', 'k8t', *args], capture_output=True, text=True, check=True).stderr)
+
+    return {name: times for name, times in command.items() if name not in startup}
+
 
 def test_print_version():
     runner = CliRunner()
@@ -27,6 +64,19 @@ def test_print_version():
     assert __version__ in result.output
 
 
+def test_startup_budget():
+    for args, budget, forbidden in STARTUP_BUDGETS:
+        imports = import_times(*args)
+
+        assert not forbidden & set(imports), args
+        assert sum(cumulative for cumulative, toplevel in imports.values() if toplevel) < budget * 1000, args
+
+
+def test_cache_defaults():
+    assert cli.CACHE_DIR == cache.DEFAULT_CACHE_DIR
+    assert cli.CACHE_SIZE == cache.DEFAULT_MAX_SIZE
+
+
 def test_print_license():
     runner = CliRunner()
 
@@ -384,4 +434,178 @@ def test_gen():
         assert result.output == file.read()
 
 
+def test_gen_parallel():
+    runner = CliRunner()
+
+    with open('tests/resources/results/default.yaml', 'r') as file:
+        result = runner.invoke(root, ['gen', '--jobs', '2', 'tests/resources/good'])
+        assert result.exit_code == 0
+        assert result.output == file.read()
+
+    with open('tests/resources/results/cluster-1-common-env.yaml', 'r') as file:
+        result = runner.invoke(root, ['gen', '-j', '3', '-c', 'cluster-1', '-e', 'common-env', 'tests/resources/good'])
+        assert result.exit_code == 0
+        assert result.output == file.read()
+
+
+def test_gen_parallel_random_secrets(tmp_path, write_project):
+    files = {'.k8t': '', 'config.yaml': 'secrets:\n  provider: random\n'}
+    files.update(('templates/secret-{}.yaml'.format(i), 'password: {{ get_secret("/shared", 24) }}\n') for i in range(8))
+    project_dir = str(write_project(tmp_path / 'project', files))
+
+    runner = CliRunner()
+
+    for args in ([], ['--defer-secrets']):
+        result = runner.invoke(root, ['gen', '-j', '4', *args, project_dir])
+        assert result.exit_code == 2
+        assert '--jobs requires a secrets store' in result.output
+
+    # workers share generated values through the store
+    write_project(tmp_path / 'project', {'config.yaml': 'secrets:\n  provider: random\n  store: {}\n'.format(tmp_path / 'secrets.json')})
+
+    for args in ([], ['--defer-secrets']):
+        result = runner.invoke(root, ['gen', '-j', '4', *args, project_dir])
+        assert result.exit_code == 0
+        assert len({line for line in result.output.splitlines() if line.startswith('password: ')}) == 1
+
+
+def test_gen_json():
+    runner = CliRunner()
+
+    with open('tests/resources/results/default.yaml', 'r') as file:
+        documents = [document for document in YAML(typ='safe').load_all(file.read()) if document is not None]
+
+    result = runner.invoke(root, ['gen', '-o', 'json', 'tests/resources/good'])
+    assert result.exit_code == 0
+    assert json.loads(result.output) == dict(apiVersion='v1', kind='List', items=documents)
+
+    result = runner.invoke(root, ['gen', '-o', 'jsonl', '-j', '2', 'tests/resources/good'])
+    assert result.exit_code == 0
+    assert [json.loads(line) for line in result.output.splitlines()] == documents
+
+    result = runner.invoke(root, ['gen', '-o', 'json', '--all', 'tests/resources/good'])
+    assert result.exit_code == 2
+
+
+@mock_aws
+def test_gen_all(tmp_path):
+    client = boto3.client('ssm', region_name='eu-central-1')
+
+    client.put_parameter(
+        Name="/cluster-1/test",
+        Description="Environment specific simple parameter",
+        Value="string_value",
+        Type="String",
+    )
+
+    runner = CliRunner()
+
+    result = runner.invoke(root, ['gen', '--all', 'tests/resources/good'])
+    assert result.exit_code == 2
+    assert '--all requires --output-dir' in result.output
+
+    result = runner.invoke(root, ['gen', '--all', '-c', 'cluster-1', '--output-dir', str(tmp_path), 'tests/resources/good'])
+    assert result.exit_code == 2
+
+    for jobs in ('1', '2'):
+        output_dir = tmp_path / jobs
+
+        result = runner.invoke(root, ['gen', '--all', '--jobs', jobs, '--output-dir', str(output_dir), 'tests/resources/good'])
+        assert result.exit_code == 0
+        assert sorted(os.listdir(output_dir)) == [
+            '.k8t-manifest.json',
+            'cluster-1-cluster-specific-env.yaml',
+            'cluster-1-common-env.yaml',
+            'cluster-1-some-env.yaml',
+            'cluster-2-common-env.yaml',
+            'cluster-2-some-env.yaml',
+        ]
+
+        for name in ('cluster-1-cluster-specific-env.yaml', 'cluster-1-common-env.yaml'):
+            with open(os.path.join('tests/resources/results', name), 'r') as expected, open(output_dir / name, 'r') as actual:
+                assert actual.read() == expected.read()
+
+
+def test_gen_output_dir(tmp_path):
+    runner = CliRunner()
+
+    result = runner.invoke(root, ['gen', '-e', 'some-env', '--output-dir', str(tmp_path), 'tests/resources/good'])
+    assert result.exit_code == 0
+    assert 'some-env.yaml: ✔' in result.output
+
+    with open('tests/resources/results/some-env.yaml', 'r') as expected, open(tmp_path / 'some-env.yaml', 'r') as actual:
+        assert actual.read() == expected.read()
+
+
+def test_gen_incremental(tmp_path):
+    runner = CliRunner()
+    project_dir = tmp_path / 'project'
+    output_dir = str(tmp_path / 'output')
+
+    shutil.copytree('tests/resources/good', project_dir)
+
+    args = ['gen', '--all', '--secret-provider', 'hash', '--output-dir', output_dir, str(project_dir)]
+
+    result = runner.invoke(root, args)
+    assert result.exit_code == 0
+    assert 'unchanged' not in result.output
+
+    result = runner.invoke(root, args)
+    assert result.exit_code == 0
+    assert result.output.count('unchanged') == 5
+
+    with open(project_dir / 'clusters' / 'cluster-2' / 'values.yaml', 'a') as stream:
+        stream.write('\nfoo: 2\n')
+
+    result = runner.invoke(root, args)
+    assert result.exit_code == 0
+    assert result.output.count('unchanged') == 3
+    assert 'cluster-2-common-env.yaml: ✔' in result.output
+    assert 'cluster-2-some-env.yaml: ✔' in result.output
+
+    os.remove(os.path.join(output_dir, 'cluster-1-some-env.yaml'))
+
+    result = runner.invoke(root, args)
+    assert result.exit_code == 0
+    assert 'cluster-1-some-env.yaml: ✔' in result.output
+
+    result = runner.invoke(root, args + ['--force'])
+    assert result.exit_code == 0
+    assert 'unchanged' not in result.output
+
+    single = ['gen', '-e', 'some-env', '--output-dir', output_dir, str(project_dir)]
+
+    result = runner.invoke(root, single)
+    assert result.exit_code == 0
+    assert 'some-env.yaml: ✔' in result.output
+
+    result = runner.invoke(root, single)
+    assert result.exit_code == 0
+    assert 'some-env.yaml: unchanged' in result.output
+
+
+def test_gen_incremental_environment(tmp_path, write, write_project):
+    runner = CliRunner()
+    project_dir = write_project(tmp_path / 'project', {'.k8t': '', 'templates/name.yaml': 'name: {{ env("K8T_TEST_NAME", "none") }}\n'})
+    output_dir = str(tmp_path / 'output')
+
+    args = ['gen', '--output-dir', output_dir, str(project_dir)]
+
+    assert 'default.yaml: ✔' in runner.invoke(root, args, env={'K8T_TEST_NAME': 'a'}).output
+    assert 'default.yaml: unchanged' in runner.invoke(root, args, env={'K8T_TEST_NAME': 'a'}).output
+    assert 'default.yaml: ✔' in runner.invoke(root, args, env={'K8T_TEST_NAME': 'b'}).output
+    assert (tmp_path / 'output' / 'default.yaml').read_text().endswith('name: b\n')
+
+    # values are only recorded as hashes
+    recorded = json.loads((tmp_path / 'output' / '.k8t-manifest.json').read_text())['outputs']['default.yaml']['inputs']
+    assert list(recorded['environment']) == ['K8T_TEST_NAME']
+    assert len(recorded['environment']['K8T_TEST_NAME']) == 64
+
+    # computed names are only known while rendering
+    write(project_dir / 'templates' / 'computed.yaml', 'value: {{ env("K8T_TEST_" ~ "NAME") }}\n')
+
+    assert 'default.yaml: ✔' in runner.invoke(root, args, env={'K8T_TEST_NAME': 'b'}).output
+    assert 'default.yaml: ✔' in runner.invoke(root, args, env={'K8T_TEST_NAME': 'b'}).output
+
+
 # vim: fenc=utf-8:ts=4:sw=4:expandtab
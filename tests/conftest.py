@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import os
+
+import pytest  # pylint: disable=E0401
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(str(path)), exist_ok=True)
+
+    with open(str(path), 'w') as stream:
+        stream.write(content)
+
+
+def _write_project(root, files):
+    for path, content in files.items():
+        _write(os.path.join(str(root), path), content)
+
+    return root
+
+
+@pytest.fixture(name='write')
+def fixture_write():
+    """
+    write(path, content) writes a file, missing directories are created.
+    """
+
+    return _write
+
+
+@pytest.fixture(name='write_project')
+def fixture_write_project():
+    """
+    write_project(root, files) writes files given by their path relative to root.
+    """
+
+    return _write_project
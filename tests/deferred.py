@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import os
+import threading
+import time
+
+from mock import patch  # pylint: disable=E0401
+
+from k8t import config, secret_providers
+from k8t.deferred import deferrable, render_deferred
+from k8t.engine import build
+from k8t.templates import compile_template, render
+
+FILES = {
+    'templates/plain.yaml': 'a: "{{ get_secret("/a") }}"\nb: "prefix-{{ get_secret("/b") ~ "-suffix" }}"\n',
+    'templates/filtered.yaml': 'c: "{{ get_secret("/c") | b64encode }}"\n',
+    'templates/condition.yaml': '{% if get_secret("/d") == "x" %}d: 1{% else %}d: 2{% endif %}\n',
+    'templates/include.yaml': '{% include "part.inc" %}\n',
+    'templates/computed.yaml': '{% for name in names %}{{ name }}: "{{ get_secret("/" ~ name) }}"\n{% endfor %}',
+    'templates/part.inc': '{% set e = get_secret("/e") %}e: "{{ e }}"',
+    'templates/indented.yaml': 'cert: |\n    {{ get_secret("/cert") | indent(4) }}\n',
+    'templates/json.yaml': 'json: {{ get_secret("/json") | tojson }}\n',
+}
+
+
+def test_deferrable(tmp_path, write_project):
+    write_project(tmp_path, FILES)
+    engine = build(str(tmp_path), None, None)
+
+    assert deferrable(compile_template('plain.yaml', engine))
+    assert not deferrable(compile_template('filtered.yaml', engine))
+    assert not deferrable(compile_template('indented.yaml', engine))
+    assert not deferrable(compile_template('json.yaml', engine))
+    assert deferrable(compile_template('computed.yaml', engine))
+    assert not deferrable(compile_template('condition.yaml', engine))
+    assert not deferrable(compile_template('part.inc', engine))
+
+
+def test_render_deferred(tmp_path, write_project):
+    write_project(tmp_path, FILES)
+    engine = build(str(tmp_path), None, None)
+    values = dict(names=['f{}'.format(i) for i in range(8)])
+    templates = [os.path.basename(path) for path in FILES if path.endswith('.yaml')]
+
+    config.CONFIG = {'secrets': {'provider': 'hash'}}
+    secret_providers.RANDOM_STORE.clear()
+
+    expected = [render(name, values, engine) for name in templates]
+
+    secret_providers.RANDOM_STORE.clear()
+
+    assert render_deferred(templates, values, engine) == expected
+
+
+def test_concurrent_resolution(tmp_path, write_project):
+    write_project(tmp_path, FILES)
+    engine = build(str(tmp_path), None, None)
+    values = dict(names=['f{}'.format(i) for i in range(8)])
+
+    lock = threading.Lock()
+    running = []
+    concurrency = []
+
+    def slow(key, length=None, config_override=None):
+        with lock:
+            running.append(key)
+            concurrency.append(len(running))
+
+        time.sleep(0.05)
+
+        with lock:
+            running.remove(key)
+
+        return key.upper()
+
+    config.CONFIG = {'secrets': {'provider': 'hash'}}
+
+    with patch.object(secret_providers, 'hash', slow):
+        assert render_deferred(['computed.yaml'], values, engine) == [''.join('f{0}: "/F{0}"\n'.format(i) for i in range(8))]
+
+    assert max(concurrency) > 1
+
+
+def test_filtered_secrets(tmp_path, write_project):
+    write_project(tmp_path, FILES)
+    engine = build(str(tmp_path), None, None)
+    secrets = {'/cert': 'line 1\nline 2', '/json': 'quoted "value"'}
+
+    config.CONFIG = {'secrets': {'provider': 'hash'}}
+
+    with patch.object(secret_providers, 'hash', lambda key, length=None, config_override=None: secrets[key]):
+        assert render_deferred(['indented.yaml', 'json.yaml'], {}, engine) == [
+            'cert: |\n    line 1\n    line 2',
+            'json: "quoted \\"value\\""',
+        ]
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import os
+
+import pytest  # pylint: disable=E0401
+from click.testing import CliRunner
+
+from k8t.cli import root
+from k8t.dependencies import DependencyIndex, build_index
+from k8t.engine import build
+
+
+FILES = {
+    '.k8t': '',
+    'templates/macros.inc': '{% macro name() %}app{% endmacro %}\n',
+    'templates/base.inc': '{% import "macros.inc" as m %}{% block body %}{% endblock %}\n',
+    'templates/a.yaml': '{% extends "base.inc" %}{% block body %}a: 1{% endblock %}\n',
+    'templates/b.yaml': '{% include "part.inc" %}\n',
+    'templates/part.inc': 'part: 1\n',
+    'templates/c.yaml': 'c: 1\n',
+    'clusters/foo/templates/part.inc': '{% from "macros.inc" import name %}part: {{ name() }}\n',
+}
+
+
+@pytest.fixture(name='project')
+def fixture_project(tmp_path, write_project):
+    return write_project(tmp_path, FILES)
+
+
+def test_dependencies(project):
+    index = DependencyIndex(build(str(project), None, None))
+
+    assert index.references('a.yaml') == {'base.inc'}
+    assert index.dependencies('a.yaml') == {'base.inc', 'macros.inc'}
+    assert index.dependents(['macros.inc']) == {'a.yaml', 'base.inc'}
+    assert index.dependents(['part.inc']) == {'b.yaml'}
+    assert index.dependents(['c.yaml']) == set()
+
+    # overlay paths resolve the same name to another file
+    index = DependencyIndex(build(str(project), 'foo', None))
+
+    assert index.dependents(['macros.inc']) == {'a.yaml', 'b.yaml', 'base.inc', 'part.inc'}
+
+
+def test_dynamic_references(project, write):
+    write(str(project / 'templates' / 'd.yaml'), '{% include name %}\n')
+
+    index = DependencyIndex(build(str(project), None, None))
+
+    assert index.references('d.yaml') is None
+    assert index.dependencies('d.yaml') is None
+    assert 'd.yaml' in index.dependents(['c.yaml'])
+
+
+def test_persistence(project, tmp_path_factory, write):
+    cache_dir = str(tmp_path_factory.mktemp('cache'))
+
+    index = build_index(build(str(project), None, None), cache_dir)
+    assert index.dependents(['part.inc']) == {'b.yaml'}
+    index.save()
+
+    assert os.path.isfile(os.path.join(cache_dir, 'dependencies.json'))
+
+    write(str(project / 'templates' / 'c.yaml'), '{% include "part.inc" %}\n# changed\n')
+
+    index = build_index(build(str(project), None, None), cache_dir)
+    assert index.dependents(['part.inc']) == {'b.yaml', 'c.yaml'}
+    assert index._modified  # pylint: disable=protected-access
+
+
+def test_cli_get_dependents(project):
+    runner = CliRunner()
+    result = runner.invoke(root, ['get', 'dependents', 'macros.inc', str(project)])
+
+    assert result.exit_code == 0
+    assert result.output == 'a.yaml\nbase.inc\n'
@@ -12,7 +12,6 @@
 # Author: Aljosha Friemann <aljosha.friemann@clark.de>
 
 import random
-import bitmath
 
 import pytest  # pylint: disable=E0401
 from mock import patch  # pylint: disable=E0401
@@ -45,6 +44,7 @@ def test_random_password():
 
     assert len(random_password(length)) == length
     assert random_password(length) != random_password(length)
+    assert set(random_password(length, "digits")) <= set("0123456789")
 
 
 def test_hashf():
@@ -134,6 +134,15 @@ def test_sanitize_cpu():
     assert sanitize_cpu("1.8") == "1800m"
     assert sanitize_cpu(1.8) == "1800m"
     assert sanitize_cpu("3000m") == "3000m"
+    assert sanitize_cpu("500e-3") == "500m"
+    assert sanitize_cpu("1500000u") == "1500m"
+    assert sanitize_cpu("+2") == "2000m"
+
+    with pytest.raises(ValueError):
+        sanitize_cpu("1 cpu")
+
+    with pytest.raises(ValueError):
+        sanitize_cpu("-1")
 
     assert sanitize_cpu("0.1") == "100m"
     assert sanitize_cpu(0.1) == "100m"
@@ -148,10 +157,6 @@ def test_sanitize_cpu():
 
 
 def test_sanitize_memory():
-    def compare(size: str, value: int, precision: float = 0.008) -> bool:
-        # precision of 0.008 results in (value +- 1.0e+00)
-        return int(bitmath.parse_string(f"{size}B")) == pytest.approx(value, precision)
-
     assert sanitize_memory("200M") == "200M"
 
     with pytest.raises(ValueError):
@@ -162,17 +167,14 @@ def test_sanitize_memory():
     with pytest.raises(ValueError):
         assert sanitize_memory("128974") == "0M"
 
-    # precision can vary between systems, values should be approximately 129MB
-    assert compare(sanitize_memory("129e6"), 129)
-    assert compare(sanitize_memory("129M"), 129)
-    assert compare(sanitize_memory("128974848"), 129)
-    assert compare(sanitize_memory(128974848), 129)
-    assert compare(sanitize_memory("128974848000m"), 129)
-    assert compare(sanitize_memory("123Mi"), 129)
-
-    with pytest.raises(ValueError):
-        # TODO: this is a known limitation
-        assert compare(sanitize_memory(129e6), 129)
+    # values are truncated to whole megabytes (10^6 bytes)
+    assert sanitize_memory("129e6") == "129M"
+    assert sanitize_memory("129M") == "129M"
+    assert sanitize_memory("128974848") == "128M"
+    assert sanitize_memory(128974848) == "128M"
+    assert sanitize_memory("128974848000m") == "128M"
+    assert sanitize_memory("123Mi") == "128M"
+    assert sanitize_memory(129e6) == "129M"
 
     assert sanitize_memory("300000000000m") == "300M"
     assert sanitize_memory("20000000000m") == "20M"
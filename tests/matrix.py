@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+from k8t.matrix import list_targets, render_matrix, target_name
+
+
+def test_list_targets():
+    assert list_targets('tests/resources/good') == [
+        ('cluster-1', 'cluster-specific-env'),
+        ('cluster-1', 'common-env'),
+        ('cluster-1', 'some-env'),
+        ('cluster-2', 'common-env'),
+        ('cluster-2', 'some-env'),
+    ]
+
+    assert list_targets('examples/single-cluster') == [(None, 'production')]
+    assert list_targets('tests/resources/missing_values') == [(None, None)]
+
+
+def test_target_name():
+    assert target_name(None, None) == 'default'
+    assert target_name('cluster-1', None) == 'cluster-1'
+    assert target_name(None, 'some-env') == 'some-env'
+    assert target_name('cluster-1', 'some-env') == 'cluster-1-some-env'
+
+
+def test_render_matrix_secrets(tmp_path, write_project):
+    write_project(tmp_path, {
+        'config.yaml': 'secrets:\n  provider: random\n',
+        'clusters/a/values.yaml': 'name: a\n',
+        'clusters/b/values.yaml': 'name: b\n',
+        'templates/secret.yaml': 'password: {{ get_secret("/password", 24) }}\n',
+    })
+
+    targets = list_targets(str(tmp_path))
+
+    for jobs in (None, 2):
+        outputs = [output for _, output, _, error in render_matrix(str(tmp_path), targets, jobs=jobs) if error is None]
+
+        assert len(outputs) == 2
+        # every cluster gets its own generated secrets, also without workers
+        assert outputs[0] != outputs[1]
+
+
+# vim: fenc=utf-8:ts=4:sw=4:expandtab
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import os
+import stat
+
+import pytest  # pylint: disable=E0401
+from click.testing import CliRunner
+
+from k8t import metrics, profiling
+from k8t.cli import root
+
+
+def test_render():
+    recorder = profiling.Recorder()
+
+    recorder.record('render', 0, 2 * 10 ** 6, dict(template='a.yaml'))
+    recorder.record('render', 0, 20 * 10 ** 6, dict(template='a.yaml'))
+    recorder.record('secret', 0, 10 ** 6, dict(provider='ssm', key='redacted:0'))
+    recorder.record('secret.lookup', 0, 10 ** 6, dict(provider='ssm', call='GetParameter', key='redacted:0'))
+    recorder.record('secret.lookup', 0, 10 ** 6, dict(provider='ssm', call='GetParameter', key='redacted:1', error=True))
+    recorder.count('cache', 3, dict(cache='values', result='hit'))
+    recorder.count('cache', 1, dict(cache='values', result='miss'))
+    recorder.count('output_bytes', 42, dict(target='foo-bar'))
+
+    lines = metrics.render(recorder, 'gen', 1.5, timestamp=1000).splitlines()
+
+    assert 'k8t_template_render_seconds_bucket{command="gen",template="a.yaml",le="0.0025"} 1' in lines
+    assert 'k8t_template_render_seconds_bucket{command="gen",template="a.yaml",le="+Inf"} 2' in lines
+    assert 'k8t_template_render_seconds_sum{command="gen",template="a.yaml"} 0.022' in lines
+    assert 'k8t_template_render_seconds_count{command="gen",template="a.yaml"} 2' in lines
+    assert 'k8t_secret_lookups_total{command="gen",provider="ssm",call="GetParameter"} 2' in lines
+    assert 'k8t_secret_lookup_errors_total{command="gen",provider="ssm",call="GetParameter"} 1' in lines
+    assert 'k8t_cache_hit_ratio{command="gen",cache="values"} 0.75' in lines
+    assert 'k8t_output_bytes{command="gen",target="foo-bar"} 42' in lines
+    assert 'k8t_run_duration_seconds{command="gen"} 1.5' in lines
+    assert 'k8t_run_timestamp_seconds{command="gen"} 1000' in lines
+    assert '# TYPE k8t_secret_lookups_total counter' in lines
+
+
+def test_failed_span():
+    recorder = profiling.Recorder()
+
+    with pytest.raises(RuntimeError):
+        with recorder.span('secret', dict(provider='ssm')):
+            raise RuntimeError('denied')
+
+    assert recorder.events[0]['args'] == dict(provider='ssm', error=True)
+
+
+def test_write(tmp_path):
+    path = str(tmp_path / 'k8t.prom')
+
+    metrics.write(path, 'k8t_run_duration_seconds 1\n')
+
+    assert os.listdir(str(tmp_path)) == ['k8t.prom']
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+
+
+def test_cli_metrics(tmp_path):
+    path = str(tmp_path / 'k8t.prom')
+
+    result = CliRunner().invoke(root, ['gen', '-c', 'cluster-1', '-e', 'common-env', '--metrics-file', path, 'tests/resources/good'])
+    assert result.exit_code == 0, result.output
+
+    with open(path) as stream:
+        text = stream.read()
+
+    assert 'k8t_template_render_seconds_count{command="gen",template="common-template.yaml.j2"} 1' in text
+    assert 'k8t_output_bytes{command="gen",target="cluster-1-common-env"} ' + str(len(result.stdout.encode())) in text
+    assert 'k8t_cache_hit_ratio{command="gen",cache="values"}' in text
+    assert profiling.current() is None
+
+    result = CliRunner().invoke(root, ['gen', '--watch', '--metrics-file', path, 'tests/resources/good'])
+    assert result.exit_code == 2
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import json
+
+from click.testing import CliRunner
+
+from k8t import profiling
+from k8t.cli import root
+
+
+def test_disabled():
+    assert profiling.stop() is None
+
+    with profiling.span('nothing', key='value'):
+        pass
+
+    assert profiling.traced('nothing')(lambda value: value + 1)(1) == 2
+
+
+def test_recorder():
+    recorder = profiling.start()
+
+    try:
+        with profiling.span('outer'):
+            with profiling.span('inner', template='a.yaml'):
+                pass
+
+            profiling.traced('inner')(lambda: None)()
+    finally:
+        assert profiling.stop() is recorder
+
+    events = recorder.trace()['traceEvents']
+    spans = [event for event in events if event['ph'] == 'X']
+
+    assert [event['name'] for event in spans] == ['outer', 'inner', 'inner']
+    assert spans[1]['args'] == {'template': 'a.yaml'}
+    assert spans[0]['ts'] <= spans[1]['ts'] and spans[1]['ts'] + spans[1]['dur'] <= spans[0]['ts'] + spans[0]['dur']
+    assert [(name, count) for name, count, _, _ in recorder.summary()] == [('outer', 1), ('inner', 2)]
+
+
+def test_cli_profile(tmp_path, write_project):
+    path = str(tmp_path / 'trace.json')
+
+    write_project(tmp_path, {
+        '.k8t': '',
+        'values.yaml': 'name: app\n',
+        'templates/secret.yaml.j2': "name: {{ name }}\npassword: {{ get_secret('/profiled', 12) }}\n",
+    })
+
+    result = CliRunner().invoke(root, ['--profile', path, 'gen', '--secret-provider', 'random', str(tmp_path)])
+    assert result.exit_code == 0, result.output
+    assert 'trace written to' in result.output
+
+    with open(path) as stream:
+        events = json.load(stream)['traceEvents']
+
+    names = {event['name'] for event in events}
+    assert {'gen', 'values.load', 'config.load_all', 'engine.build', 'analyze', 'render'} <= names
+
+    secrets = [event for event in events if event['name'] == 'secret']
+    assert len(secrets) == 1 and secrets[0]['args']['key'] == profiling.redact('/profiled')
+    assert '/profiled' not in json.dumps(events)
+    assert profiling.stop() is None
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import os
+
+import pytest  # pylint: disable=E0401
+
+from k8t import project
+from k8t.project import PROJECT_INDEX, ProjectIndex, find_files, get_base_dir
+
+GOOD = 'tests/resources/good'
+
+
+def test_find_files():
+    project.invalidate()
+
+    assert find_files(GOOD, 'cluster-1', 'common-env', 'values.yaml', dir_ok=False) == [
+        os.path.join(GOOD, 'values.yaml'),
+        os.path.join(GOOD, 'environments', 'common-env', 'values.yaml'),
+        os.path.join(GOOD, 'clusters', 'cluster-1', 'values.yaml'),
+        os.path.join(GOOD, 'clusters', 'cluster-1', 'environments', 'common-env', 'values.yaml'),
+    ]
+
+    # a directory on the top level lists every layer
+    assert find_files(GOOD, 'cluster-2', None, 'templates', file_ok=False) == [
+        os.path.join(GOOD, 'templates'),
+        os.path.join(GOOD, 'clusters', 'cluster-2', 'templates'),
+    ]
+
+    with pytest.raises(RuntimeError, match='no such cluster: missing'):
+        find_files(GOOD, 'missing', None, 'values.yaml')
+
+    with pytest.raises(RuntimeError, match='no such environment: missing'):
+        find_files(GOOD, None, 'missing', 'values.yaml')
+
+    assert get_base_dir(GOOD, 'cluster-1', 'cluster-specific-env') == os.path.join(GOOD, 'clusters', 'cluster-1', 'environments', 'cluster-specific-env')
+
+    with pytest.raises(RuntimeError, match='No such environment: some-env'):
+        get_base_dir(GOOD, 'cluster-1', 'some-env')
+
+
+def test_environments():
+    index = ProjectIndex(GOOD)
+
+    assert sorted(index.directories('clusters')) == ['cluster-1', 'cluster-2']
+    assert index.environments() == {'common-env', 'some-env', 'cluster-specific-env'}
+    assert index.environments('clusters', 'cluster-1') == {'common-env', 'cluster-specific-env'}
+    assert index.environments('clusters', 'missing') == set()
+
+
+def backdate(root, seconds):
+    for directory, _, _ in os.walk(root):
+        os.utime(directory, (os.path.getatime(directory), os.path.getmtime(directory) - seconds))
+
+
+def test_index_cache(tmp_path):
+    root = tmp_path / 'project'
+    path = str(tmp_path / 'cache' / PROJECT_INDEX)
+
+    os.makedirs(str(root / 'environments' / 'staging'))
+
+    # directories modified right before a scan are never trusted
+    assert not ProjectIndex(str(root)).fresh()
+
+    backdate(str(root), 60)
+
+    index = ProjectIndex(str(root), path)
+    assert not index.isfile('environments', 'staging', 'values.yaml')
+    assert os.path.isfile(path)
+
+    # listings are only reused while no listed directory changed
+    assert index.fresh()
+    assert ProjectIndex(str(root), path).fresh()
+
+    (root / 'environments' / 'staging' / 'values.yaml').write_text('a: 1\n')
+    backdate(str(root), 30)
+
+    assert not index.fresh()
+    assert ProjectIndex(str(root), path).isfile('environments', 'staging', 'values.yaml')
+
+
+def test_get_index(tmp_path):
+    root = tmp_path / 'project'
+
+    os.makedirs(str(root / 'environments' / 'staging'))
+    backdate(str(root), 60)
+
+    index = project.get_index(str(root))
+    assert project.get_index(str(root)) is index
+    assert not index.isfile('values.yaml')
+
+    # changes are picked up without invalidating the index
+    (root / 'values.yaml').write_text('a: 1\n')
+    backdate(str(root), 30)
+
+    assert project.get_index(str(root)) is not index
+    assert project.get_index(str(root)).isfile('values.yaml')
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+from decimal import Decimal
+
+import pytest  # pylint: disable=E0401
+
+from k8t.quantity import parse, to_megabytes, to_millis
+
+
+@pytest.mark.parametrize('value,expected', [
+    ('1', '1'),
+    ('1.', '1'),
+    ('.5', '0.5'),
+    ('-2', '-2'),
+    ('+2', '2'),
+    ('100m', '0.1'),
+    ('5n', '0.000000005'),
+    ('5u', '0.000005'),
+    ('2k', '2000'),
+    ('1.5Gi', '1610612736'),
+    ('1Ei', '1152921504606846976'),
+    ('3E', '3000000000000000000'),
+    ('3E3', '3000'),
+    ('12e-3', '0.012'),
+    ('1e+2', '100'),
+    ('123456789012345678901234567890Ki', '126419751948641975194864197519360'),
+    (2, '2'),
+    (0.25, '0.25'),
+    (129e6, '129000000'),
+    (1e-05, '0.00001'),
+    (Decimal('1.5'), '1.5'),
+])
+def test_parse(value, expected):
+    assert parse(value) == Decimal(expected)
+
+
+@pytest.mark.parametrize('value', ['', 'm', '1.2.3', '1ki', '1 Mi', '1e', '1Mi3', '0x10', 'nan', 'inf', '1e100', True, None])
+def test_parse_invalid(value):
+    with pytest.raises(ValueError):
+        parse(value)
+
+
+def test_to_millis():
+    assert to_millis('1.8') == 1800
+    assert to_millis(1.8) == 1800
+    assert to_millis('0.0001') == 0
+    assert to_millis('1500u') == 1
+
+
+def test_to_megabytes():
+    assert to_megabytes('2Gi') == 2147
+    assert to_megabytes('20005000000m') == 20
+    assert to_megabytes('999999') == 0
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import json
+import os
+import string
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest  # pylint: disable=E0401
+
+from k8t.randomness import FileStore, alphabet, random_length, random_string
+
+
+def test_random_string():
+    assert random_string(0) == ""
+    assert len(random_string(1000)) == 1000
+    assert set(random_string(1000)) <= set(string.ascii_lowercase + string.digits)
+    assert set(random_string(1000, "hex")) <= set("0123456789abcdef")
+    assert set(random_string(100, "ab")) == {"a", "b"}
+    assert random_string(32) != random_string(32)
+
+
+def test_random_string_unbiased():
+    # 36 characters do not divide 256, plain modulo would favour the first 4 by 1/7
+    counts = Counter(random_string(360000))
+
+    assert len(counts) == 36
+    assert max(counts.values()) < 10000 * 1.05
+    assert min(counts.values()) > 10000 * 0.95
+
+
+@pytest.mark.parametrize('name', ['', 'a', 'aaaa', ''.join(map(chr, range(300)))])
+def test_alphabet_invalid(name):
+    with pytest.raises(ValueError):
+        alphabet(name)
+
+
+def test_alphabet():
+    assert alphabet("digits") == string.digits
+    assert alphabet("abca") == "abc"
+
+
+def test_random_length():
+    assert {random_length(1, 3) for _ in range(200)} == {1, 2, 3}
+    assert random_length(5, 5) == 5
+
+
+def _generate(path: str) -> str:
+    return FileStore(path).get("/shared", lambda: random_string(32))
+
+
+def test_file_store(tmp_path):
+    path = str(tmp_path / "store" / "secrets.json")
+
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        values = set(executor.map(_generate, [path] * 16))
+
+    assert len(values) == 1
+    assert FileStore(path).get("/shared", lambda: "unused") in values
+    assert FileStore(path).get("/new", lambda: "generated") == "generated"
+
+    with open(path) as stream:
+        assert json.load(stream)["values"] == {"/shared": values.pop(), "/new": "generated"}
+
+    assert os.stat(path).st_mode & 0o077 == 0
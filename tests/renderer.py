@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import threading
+
+from k8t import config
+from k8t.matrix import render_target
+from k8t.renderer import Renderer
+
+FILES = {
+    '.k8t': '',
+    'values.yaml': 'name: default\n',
+    'config.yaml': 'secrets:\n  provider: random\n',
+    'templates/secret.yaml': 'name: {{ name }}\nsecret: {{ get_secret("/password", 12) }}\n',
+    'environments/hashed/values.yaml': 'name: hashed\n',
+    'environments/hashed/config.yaml': 'secrets:\n  provider: hash\n',
+}
+
+
+def test_renderer(tmp_path, write_project):
+    write_project(tmp_path, FILES)
+    config.CONFIG = {}
+
+    renderer = Renderer(str(tmp_path), None, 'hashed')
+
+    assert renderer.names() == ['secret.yaml']
+    assert renderer.validate('secret.yaml')
+    assert renderer.render('secret.yaml') == 'name: hashed\nsecret: ad7ea1b4bf5c'
+    assert renderer.render_documents('secret.yaml')[1] == [{'name': 'hashed', 'secret': 'ad7ea1b4bf5c'}]
+    assert renderer.render_all() == render_target(str(tmp_path), None, 'hashed')[0]
+    assert config.CONFIG == {}
+
+
+def test_concurrent_renderers(tmp_path, write_project):
+    write_project(tmp_path, FILES)
+
+    renderers = [Renderer(str(tmp_path)), Renderer(str(tmp_path)), Renderer(str(tmp_path), None, 'hashed')]
+    outputs = {index: set() for index in range(len(renderers))}
+    barrier = threading.Barrier(len(renderers) * 4)
+
+    def work(index):
+        barrier.wait()
+
+        for _ in range(20):
+            outputs[index].add(renderers[index].render('secret.yaml'))
+
+    threads = [threading.Thread(target=work, args=(index,)) for index in range(len(renderers)) for _ in range(4)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    # every renderer keeps its own config and secrets
+    assert all(len(output) == 1 for output in outputs.values())
+    assert outputs[0] != outputs[1]
+    assert outputs[2] == {'name: hashed\nsecret: ad7ea1b4bf5c'}
+    assert renderers[0].secrets.random['/password'] != renderers[1].secrets.random['/password']
@@ -7,13 +7,26 @@
 #
 # THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
 import boto3
 import pytest  # pylint: disable=E0401
+from mock import patch  # pylint: disable=E0401
 from moto import mock_aws  # pylint: disable=E0401
 
-from k8t import config
+from k8t import config, metrics, profiling, secret_providers
 from k8t.secret_providers import random, ssm
 
+
+@pytest.fixture(autouse=True)
+def fixture_reset():
+    secret_providers.reset()
+    yield
+    secret_providers.reset()
+
+
 def test_random():
     config.CONFIG = {"secrets": {"provider": "random"}}
     assert random("/foobar"), random("/foobar")
@@ -26,6 +39,20 @@ def test_random():
         random("/foo", 3)
 
 
+def test_random_store(tmp_path):
+    config.CONFIG = {"secrets": {"provider": "random", "store": str(tmp_path / "secrets.json"), "alphabet": "hex"}}
+
+    with secret_providers.use_store(secret_providers.SecretStore()):
+        value = random("/stored", 40)
+
+    assert set(value) <= set("0123456789abcdef")
+
+    # another run reads the stored value
+    with secret_providers.use_store(secret_providers.SecretStore()):
+        assert random("/stored") == value
+        assert random("/other") != value
+
+
 @mock_aws
 def test_ssm():
     region = "eu-west-1"
@@ -124,4 +151,124 @@ def test_ssm_default_region():
     assert ssm("foo"), "global_secret_value"
 
 
+@mock_aws
+def test_ssm_pooling():
+    region = "eu-west-1"
+    client = boto3.client("ssm", region_name=region)
+
+    for name in ("foo", "bar"):
+        client.put_parameter(Name=name, Value=name + "_value", Type="SecureString", KeyId="alias/aws/ssm")
+
+    config.CONFIG = {"secrets": {"provider": "ssm", "region": region, "role_arn": "arn:aws:iam::123456789012:role/k8t"}}
+
+    with patch.object(secret_providers, "_assume_role", wraps=secret_providers._assume_role) as assume_role, \
+            patch.object(secret_providers, "_get_parameter", wraps=secret_providers._get_parameter) as get_parameter:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            assert set(executor.map(ssm, ["foo"] * 8 + ["bar"] * 8)) == {"foo_value", "bar_value"}
+
+        assert assume_role.call_count == 1
+        assert get_parameter.call_count == 2
+
+        # credentials close to expiring are refreshed
+        key = ("ssm", region, "arn:aws:iam::123456789012:role/k8t")
+        pooled, _ = secret_providers._CLIENTS[key]
+        secret_providers._CLIENTS[key] = (pooled, datetime.now(timezone.utc) + timedelta(minutes=1))
+        secret_providers.SSM_STORE.clear()
+
+        assert ssm("foo") == "foo_value"
+        assert assume_role.call_count == 2
+        assert secret_providers._CLIENTS[key][0] is not pooled
+
+
+def test_memoize():
+    store = secret_providers.SecretStore()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.01)
+
+        return "value"
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert set(executor.map(lambda _: secret_providers._memoize(store, "key", fetch), range(32))) == {"value"}
+
+    assert len(calls) == 1
+    assert store.ssm == {"key": "value"}
+    assert not store.pending
+
+    def fail():
+        raise RuntimeError("denied")
+
+    # failed requests are tried again
+    for _ in range(2):
+        with pytest.raises(RuntimeError, match="denied"):
+            secret_providers._memoize(store, "other", fail)
+
+        assert not store.pending
+
+
+@mock_aws
+def test_ssm_prefetch():
+    region = "eu-west-1"
+    client = boto3.client("ssm", region_name=region)
+
+    for i in range(25):
+        client.put_parameter(Name="/app/key{}".format(i), Value="value{}".format(i), Type="SecureString", KeyId="alias/aws/ssm")
+
+    client.put_parameter(Name="/other/key0", Value="other", Type="String")
+
+    config.CONFIG = {"secrets": {"provider": "ssm", "region": region, "prefix": "/app"}}
+
+    requests = {("/key{}".format(i), None) for i in range(25)} | {("/key0", (("prefix", "/other"),)), ("/missing", None)}
+
+    with patch.object(secret_providers, "_get_parameters", wraps=secret_providers._get_parameters) as get_parameters:
+        assert secret_providers.prefetch(requests) == 26
+
+    assert get_parameters.call_count == 3
+
+    with patch.object(secret_providers, "_get_parameter", wraps=secret_providers._get_parameter) as get_parameter:
+        assert ssm("/key24") == "value24"
+        assert ssm("/key0", config_override={"prefix": "/other"}) == "other"
+        assert get_parameter.call_count == 0
+
+        with pytest.raises(RuntimeError, match=r"Failed to retrieve secret /app/missing: ..."):
+            ssm("/missing")
+
+    assert secret_providers.prefetch(requests) == 0
+
+
+@mock_aws
+def test_ssm_metrics():
+    region = "eu-west-1"
+    client = boto3.client("ssm", region_name=region)
+
+    for name in ("foo", "bar"):
+        client.put_parameter(Name=name, Value=name + "_value", Type="SecureString", KeyId="alias/aws/ssm")
+
+    config.CONFIG = {"secrets": {"provider": "ssm", "region": region}}
+
+    recorder = profiling.start()
+
+    try:
+        # requests to ssm are measured, prefetched secrets are misses
+        assert secret_providers.prefetch({("foo", None), ("bar", None)}) == 2
+        assert ssm("foo") == "foo_value"
+        assert ssm("bar") == "bar_value"
+
+        secret_providers.reset()
+
+        with patch.object(secret_providers, "_client", side_effect=RuntimeError("denied")):
+            assert secret_providers.prefetch({("foo", None)}) == 0
+    finally:
+        profiling.stop()
+
+    lines = metrics.render(recorder, "gen", 1).splitlines()
+
+    assert 'k8t_secret_lookups_total{command="gen",provider="ssm",call="GetParameters"} 2' in lines
+    assert 'k8t_secret_lookup_errors_total{command="gen",provider="ssm",call="GetParameters"} 1' in lines
+    assert 'k8t_cache_hits_total{command="gen",cache="secrets"} 2' in lines
+    assert 'k8t_cache_misses_total{command="gen",cache="secrets"} 2' in lines
+
+
 # vim: fenc=utf-8:ts=4:sw=4:expandtab
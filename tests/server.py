@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import os
+import threading
+import time
+
+import pytest  # pylint: disable=E0401
+from click.testing import CliRunner
+
+from k8t import server
+from k8t.cli import root
+from k8t.matrix import render_target
+
+FILES = {
+    '.k8t': '',
+    'values.yaml': 'name: first\n',
+    'config.yaml': 'secrets:\n  provider: hash\n',
+    'templates/config.yaml': 'name: {{ name }}\nsecret: {{ get_secret("/key", 8) }}\n',
+}
+
+
+@pytest.fixture
+def daemon(tmp_path, write_project):
+    project = write_project(tmp_path / 'project', FILES)
+
+    instance = server.bind(str(tmp_path / 'k8t.sock'), str(project), polling=True)
+    thread = threading.Thread(target=instance.serve, daemon=True)
+    thread.start()
+
+    yield instance
+
+    instance.shutdown()
+    thread.join()
+
+
+def test_render(daemon):
+    request = dict(command='render', directory=daemon.root)
+
+    assert server.request(daemon.server_address, request) == dict(output=render_target(daemon.root, None, None)[0])
+    assert server.request(daemon.server_address, dict(request, output_format='json')) == dict(documents=[{'name': 'first', 'secret': 'bc8f1dc1'}])
+    assert server.request(daemon.server_address, dict(command='validate', directory=daemon.root)) == dict(invalid=[])
+    assert server.request(daemon.server_address, dict(command='render', directory='/elsewhere'))['fallback']
+    assert 'error' in server.request(daemon.server_address, dict(request, cluster='missing'))
+
+    with pytest.raises(RuntimeError):
+        server.bind(daemon.server_address, daemon.root)
+
+
+def test_reload(daemon, write):
+    request = dict(command='render', directory=daemon.root, output_format='jsonl')
+
+    assert server.request(daemon.server_address, request)['documents'][0]['name'] == 'first'
+
+    write(os.path.join(daemon.root, 'values.yaml'), 'name: second\n')
+
+    deadline = time.monotonic() + 10
+
+    while server.request(daemon.server_address, request)['documents'][0]['name'] != 'second':
+        assert time.monotonic() < deadline
+
+        time.sleep(0.1)
+
+
+def test_gen_client(daemon, tmp_path):
+    runner = CliRunner()
+    expected = runner.invoke(root, ['gen', daemon.root], env={'K8T_VALUE_NAME': 'client'}).output
+    handled = daemon.handled
+
+    assert 'name: client' in expected
+
+    result = runner.invoke(root, ['gen', daemon.root], env={'K8T_SOCKET': daemon.server_address, 'K8T_VALUE_NAME': 'client'})
+
+    assert result.exit_code == 0
+    assert result.output == expected
+    assert daemon.handled == handled + 1
+
+    # without a server gen renders on its own
+    result = runner.invoke(root, ['gen', '--socket', str(tmp_path / 'missing.sock'), daemon.root], env={'K8T_VALUE_NAME': 'client'})
+
+    assert result.exit_code == 0
+    assert result.output == expected
+
+
+def test_environ(daemon):
+    request = dict(command='render', directory=daemon.root, output_format='json')
+
+    assert server.request(daemon.server_address, dict(request, environ={'K8T_VALUE_NAME': 'a'}))['documents'][0]['name'] == 'a'
+    assert server.request(daemon.server_address, dict(request, environ={'K8T_VALUE_NAME': 'b'}))['documents'][0]['name'] == 'b'
+    assert server.request(daemon.server_address, dict(request, environ={}))['documents'][0]['name'] == 'first'
+
+
+def test_reload_value_file(daemon, tmp_path, write):
+    path = str(tmp_path / 'outside' / 'values.yaml')
+    write(path, 'name: outside\n')
+
+    request = dict(command='render', directory=daemon.root, output_format='json', value_files=[path])
+
+    assert server.request(daemon.server_address, request)['documents'][0]['name'] == 'outside'
+
+    write(path, 'name: changed\n')
+
+    deadline = time.monotonic() + 10
+
+    while server.request(daemon.server_address, request)['documents'][0]['name'] != 'changed':
+        assert time.monotonic() < deadline
+
+        time.sleep(0.1)
+
+
+def test_secrets_ttl(daemon):
+    request = dict(command='render', directory=daemon.root)
+
+    renderer = daemon.renderer(request)
+    renderer.secrets.ssm['key'] = 'value'
+
+    assert daemon.renderer(request) is renderer
+    assert renderer.secrets.ssm == {'key': 'value'}
+
+    daemon.secrets_ttl = 0
+    daemon.invalidate()
+
+    renderer = daemon.renderer(request)
+    renderer.secrets.ssm['key'] = 'value'
+
+    assert daemon.renderer(request) is renderer
+    assert renderer.secrets.ssm == {}
+
+    assert server.request(daemon.server_address, dict(command='invalidate')) == dict(root=daemon.root)
+    assert daemon.renderer(request) is not renderer
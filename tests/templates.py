@@ -11,6 +11,72 @@
 # Copyright © 2020 Clark Germany GmbH
 # Author: Aljosha Friemann <aljosha.friemann@clark.de>
 
-from k8t.templates import analyze  # pylint: disable=W0611
+import pytest  # pylint: disable=E0401
+from mock import patch  # pylint: disable=E0401
+
+from k8t.engine import build
+from k8t.templates import (CompiledTemplate, YamlValidationError, analyze, compile_template, get_secret_keys, parse_output, render,
+                           render_documents)
+
+
+def test_compiled_template():
+    engine = build('tests/resources/good', 'cluster-1', 'common-env')
+    values = dict(env='common-env', cls='cluster-1', foo=1, bar='test')
+
+    with patch.object(engine, 'parse', wraps=engine.parse) as parse:
+        template = compile_template('common-template.yaml.j2', engine)
+
+        assert isinstance(template, CompiledTemplate)
+        assert compile_template(template, engine) is template
+
+        undefined, _, invalid, has_secrets = analyze(template, values, engine)
+
+        assert not undefined
+        assert not invalid
+        assert not has_secrets
+
+        assert render(template, values, engine) == render('common-template.yaml.j2', values, engine)
+
+        parse.assert_called_once()
+
+
+def test_get_secret_keys():
+    engine = build('tests/resources/good', None, None)
+    ast = engine.parse(
+        '{{ get_secret("/a") }}{{ get_secret(key="/b", length=3) }}'
+        '{{ get_secret("/c", config_override={"prefix": "/dev"}) }}'
+        '{{ get_secret(name) }}{{ get_secret("/d", config_override=override) }}'
+    )
+
+    assert get_secret_keys(ast) == {('/a', None), ('/b', None), ('/c', (('prefix', '/dev'),))}
+
+
+def test_parse_output():
+    assert parse_output('a: 1\n---\nb: [1, 2]\n') == [{'a': 1}, {'b': [1, 2]}]
+
+    # errors in later documents are found as well
+    for output in ('a: 1\n---\nb: : c\n', 'a: 1\n---\nb: [\n', 'a: 1\na: 2\n'):
+        with pytest.raises(YamlValidationError):
+            parse_output(output)
+
+    assert parse_output('c: 3\n') == [{'c': 3}]
+
+
+def test_render_documents(tmp_path, write_project):
+    write_project(tmp_path, {
+        'templates/valid.yaml': 'a: {{ a }}\n---\nb: [1, 2]\n',
+        'templates/invalid.yaml': 'a: {{ a }}\n---\nb: : c\n',
+    })
+    engine = build(str(tmp_path), None, None)
+
+    assert render_documents('valid.yaml', dict(a=1), engine) == ('a: 1\n---\nb: [1, 2]', [{'a': 1}, {'b': [1, 2]}])
+    assert render_documents(compile_template('valid.yaml', engine), dict(a=1), engine)[1] == [{'a': 1}, {'b': [1, 2]}]
+
+    with pytest.raises(YamlValidationError):
+        render_documents('invalid.yaml', dict(a=1), engine)
+
+    with pytest.raises(YamlValidationError):
+        render('invalid.yaml', dict(a=1), engine)
+
 
 # vim: fenc=utf-8:ts=4:sw=4:expandtab
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import pytest  # pylint: disable=E0401
+from click.testing import CliRunner
+
+from k8t.cli import root
+from k8t.engine import build
+from k8t.templates import get_value_paths
+from k8t.usage import UsageIndex, changed_paths, overlaps
+
+
+FILES = {
+    '.k8t': '',
+    'values.yaml': 'app:\n  image:\n    tag: v1\n    name: app\n  replicas: 2\n  labels:\n    team: a\ndebug: false\n',
+    'templates/deployment.yaml': 'image: "{{ app.image.name }}:{{ app.image.tag }}"\nreplicas: {{ app.replicas }}\n{% include "labels.inc" %}\n',
+    'templates/service.yaml': 'name: "{{ app.image.name }}"\n',
+    'templates/labels.inc': '{% for key, value in app.labels.items() %}{{ key }}: {{ value }}\n{% endfor %}',
+}
+
+
+@pytest.fixture(name='project')
+def fixture_project(tmp_path, write_project):
+    return write_project(tmp_path, FILES)
+
+
+def test_get_value_paths():
+    engine = build('tests/resources/good', None, None)
+    ast = engine.parse('\n'.join([
+        '{% set image = app.image %}{{ image.tag }}',
+        '{{ app["name"] | upper }}',
+        '{% for c in app.containers %}{{ c.name }}{{ loop.index }}{% endfor %}',
+        '{{ app.labels.get("team") }}',
+        '{% macro m(a) %}{{ a.z }}{% endmacro %}{{ m(other) }}',
+        '{{ get_secret("x") }}',
+    ]))
+
+    assert get_value_paths(ast, engine) == {
+        ('app', 'image', 'tag'),
+        ('app', 'name'),
+        ('app', 'containers', '*', 'name'),
+        ('app', 'labels', 'team'),
+        ('other',),
+    }
+
+
+def test_paths():
+    assert overlaps(('app',), ('app', 'image', 'tag'))
+    assert overlaps(('app', 'containers', 'web'), ('app', 'containers', '*', 'name'))
+    assert not overlaps(('app', 'image', 'name'), ('app', 'image', 'tag'))
+
+    assert changed_paths({'a': {'b': 1, 'c': 2}, 'd': [1]}, {'a': {'b': 1, 'c': 3}, 'd': [1, 2], 'e': 1}) == {('a', 'c'), ('d',), ('e',)}
+
+
+def test_usage_index(project):
+    index = UsageIndex(build(str(project), None, None), ['deployment.yaml', 'service.yaml'])
+
+    assert index.readers(('app', 'image', 'name')) == {'deployment.yaml', 'service.yaml'}
+    assert index.readers(('app', 'image', 'tag')) == {'deployment.yaml'}
+    assert index.readers(('app', 'labels', 'team')) == {'deployment.yaml'}
+    assert index.readers(('debug',)) == set()
+
+    assert index.unused({'app': {'image': {'tag': 'v1', 'pullPolicy': 'Always'}}, 'debug': False}) == {('app', 'image', 'pullPolicy'), ('debug',)}
+
+
+def test_cli(project):
+    runner = CliRunner()
+
+    result = runner.invoke(root, ['get', 'readers', 'app.image.tag', str(project)])
+    assert result.exit_code == 0
+    assert result.output == 'deployment.yaml\n'
+
+    result = runner.invoke(root, ['get', 'unused-values', str(project)])
+    assert result.exit_code == 0
+    assert result.output == 'debug\n'
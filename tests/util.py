@@ -7,7 +7,15 @@
 #
 # THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
-from k8t.util import deep_merge, merge
+import datetime
+import json
+import os
+
+import pytest  # pylint: disable=E0401
+from ruamel.yaml import YAML  # pylint: disable=E0401
+
+from k8t import util
+from k8t.util import deep_merge, load_yaml, load_yaml_files, merge, to_json, to_json_documents
 
 
 def test_merge_memory_safety():
@@ -45,3 +53,85 @@ def test_deep_merge():
 
     assert (
         deep_merge(dict_c, dict_b, dict_a) == dict(foo=dict(a=1, b=2), baz=4, bar=dict(a=3, c=9)))
+
+
+def test_deep_merge_methods():
+    dict_a = dict(foo=dict(a=1, b=2), bar=1)
+    dict_b = dict(foo=dict(b=3), bar=dict(a=1))
+    dict_c = dict(foo=dict(c=4), bar=2)
+
+    assert deep_merge(dict_a, dict_b, dict_c) == dict(foo=dict(a=1, b=3, c=4), bar=2)
+    assert deep_merge(dict_a, dict_b, dict_c, method="rtl") == dict(foo=dict(a=1, b=2, c=4), bar=1)
+    assert deep_merge(dict_a, None, dict(foo=dict(a=1)), method="crash") == dict(foo=dict(a=1, b=2), bar=1)
+
+    with pytest.raises(RuntimeError, match="Conflict at foo.b"):
+        deep_merge(dict_a, dict_b, method="crash")
+
+    with pytest.raises(NotImplementedError):
+        deep_merge(dict_a, dict_b, method="ask")
+
+
+def test_deep_merge_sharing():
+    dict_a = dict(foo=dict(a=1), bar=dict(a=dict(b=1)))
+    dict_b = dict(foo=dict(b=2), baz=dict(a=1))
+
+    result = deep_merge(dict_a, dict_b)
+
+    assert result == dict(foo=dict(a=1, b=2), bar=dict(a=dict(b=1)), baz=dict(a=1))
+    assert result["bar"] is dict_a["bar"]
+    assert result["baz"] is dict_b["baz"]
+    assert dict_a == dict(foo=dict(a=1), bar=dict(a=dict(b=1)))
+
+
+def test_load_yaml_parse_cache(tmp_path, monkeypatch):
+    value_file = tmp_path / 'values.yaml'
+    value_file.write_text('a: 1\nb: [x, y]\n')
+    cache_dir = str(tmp_path / 'cache')
+
+    monkeypatch.setattr(util, '_YAML_CACHE', {})
+    util.set_parse_cache(cache_dir)
+
+    try:
+        assert load_yaml(str(value_file)) == {'a': 1, 'b': ['x', 'y']}
+        assert os.listdir(os.path.join(cache_dir, 'parsed'))
+
+        # a new process only finds the entry on disk
+        monkeypatch.setattr(util, '_YAML_CACHE', {})
+        monkeypatch.setattr(YAML, 'load', None)
+
+        assert load_yaml(str(value_file)) == {'a': 1, 'b': ['x', 'y']}
+    finally:
+        util.set_parse_cache(None)
+
+
+def test_load_yaml_files(tmp_path):
+    paths = []
+
+    for i in range(4):
+        path = tmp_path / 'values{}.yaml'.format(i)
+        path.write_text('value: {}\n'.format(i))
+        paths.append(str(path))
+
+    assert load_yaml_files(paths) == [{'value': i} for i in range(4)]
+    assert load_yaml_files([]) == []
+
+
+def test_to_json():
+    data = {'date': datetime.date(2020, 1, 2), 'path': '/a/b', 'nested': [{'a': None}]}
+
+    assert json.loads(to_json(data)) == {'date': '2020-01-02', 'path': '/a/b', 'nested': [{'a': None}]}
+
+    with pytest.raises(TypeError):
+        to_json({'a': object()})
+
+    # the same output whether ujson is installed or not
+    assert to_json({'a': 1, 'b': 2 ** 70}) == '{"a": 1, "b": 1180591620717411303424}'
+
+
+def test_to_json_documents():
+    data = {'date': datetime.date(2020, 1, 2), 'path': '/a/b', 'large': 2 ** 70}
+
+    assert json.loads(to_json_documents(data)) == {'date': '2020-01-02', 'path': '/a/b', 'large': 2 ** 70}
+
+    with pytest.raises(TypeError):
+        to_json_documents({'a': object()})
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import pytest  # pylint: disable=E0401
+from click.testing import CliRunner
+
+from k8t.cli import root
+from k8t.engine import build
+from k8t.util import deep_merge
+from k8t.values import LayeredValues, explain, to_dict
+
+LAYERS = [
+    ('values.yaml', dict(app=dict(image=dict(name='app', tag='v1'), replicas=1), debug=False)),
+    ('env.yaml', dict(app=dict(image=dict(tag='v2')), debug=True)),
+    ('cluster.yaml', dict(app=dict(replicas=3), region='eu')),
+]
+
+
+def test_layered_values():
+    for method in ('ltr', 'rtl'):
+        vals = LayeredValues(LAYERS, method)
+
+        assert to_dict(vals) == deep_merge(*(layer for _, layer in LAYERS), method=method)
+        assert list(vals) == ['app', 'debug', 'region']
+
+    vals = LayeredValues(LAYERS)
+
+    assert vals['app']['image']['tag'] == 'v2'
+    assert vals['region'] == 'eu'
+    assert 'missing' not in vals
+    assert vals == deep_merge(*(layer for _, layer in LAYERS))
+
+    # untouched subtrees are shared with their layer
+    assert LayeredValues(LAYERS)['region'] is LAYERS[2][1]['region']
+
+    with pytest.raises(RuntimeError, match='Conflict at app.image.tag'):
+        LayeredValues(LAYERS, 'crash')
+
+
+def test_explain():
+    assert explain(LayeredValues(LAYERS)) == [
+        (('app', 'image', 'name'), 'app', 'values.yaml'),
+        (('app', 'image', 'tag'), 'v2', 'env.yaml'),
+        (('app', 'replicas'), 3, 'cluster.yaml'),
+        (('debug',), True, 'env.yaml'),
+        (('region',), 'eu', 'cluster.yaml'),
+    ]
+
+
+def test_render():
+    engine = build('tests/resources/good', None, None)
+    template = engine.from_string('{{ app.image.name }}:{{ app["image"].tag }} {{ app.image | tojson }}')
+
+    assert template.render(LayeredValues(LAYERS)) == 'app:v2 {"name": "app", "tag": "v2"}'
+
+
+def test_render_merged_mapping():
+    engine = build('tests/resources/good', None, None)
+    layers = [('values.yaml', dict(labels=dict(a='b'))), ('cluster.yaml', dict(labels=dict(c='d')))]
+    template = engine.from_string('labels: {{ labels }} {{ labels.copy() }} {{ "%s" % labels }}')
+
+    assert template.render(LayeredValues(layers)) == "labels: {'a': 'b', 'c': 'd'} {'a': 'b', 'c': 'd'} {'a': 'b', 'c': 'd'}"
+
+
+def test_cli_explain(tmp_path, write_project):
+    write_project(tmp_path, {'.k8t': '', 'values.yaml': 'a: 1\nb:\n  c: 2\n', 'environments/dev/values.yaml': 'b:\n  c: 3\n'})
+
+    result = CliRunner().invoke(root, ['get', 'values', '--explain', '-e', 'dev', str(tmp_path)])
+
+    assert result.exit_code == 0
+    assert result.output == 'a = 1 (values.yaml)\nb.c = 3 (environments/dev/values.yaml)\nenvironment = "dev" (<context>)\n'
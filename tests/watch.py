@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# ISC License
+#
+# Copyright 2019 FL Fintech E GmbH
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose with or without fee is hereby granted, provided that the above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import os
+
+import pytest  # pylint: disable=E0401
+
+from k8t import watch
+from k8t.watch import PollingWatcher, WatchSession
+
+
+FILES = {
+    '.k8t': '',
+    'config.yaml': '',
+    'values.yaml': 'a: 1\nb: 2\nc: 3\n',
+    'templates/a.yaml': 'a: "{{ a }}"\n',
+    'templates/b.yaml': 'b: "{{ b }}"\n{% include "part.inc" %}\n',
+    'templates/part.inc': 'part: "{{ c }}"\n',
+}
+
+
+@pytest.fixture(name='project')
+def fixture_project(tmp_path, write_project):
+    return write_project(tmp_path, FILES)
+
+
+def test_polling_watcher(tmp_path, write):
+    write(str(tmp_path / 'values.yaml'), 'a: 1\n')
+    write(str(tmp_path / 'templates' / 'a.yaml'), '')
+
+    watcher = PollingWatcher([(str(tmp_path), False), (str(tmp_path / 'templates'), True)])
+
+    assert watcher.wait(timeout=0) == set()
+
+    write(str(tmp_path / 'templates' / 'nested' / 'b.yaml'), 'b: 2\n')
+    write(str(tmp_path / 'values.yaml'), 'a: 12\n')
+
+    assert watcher.wait(timeout=0) == {str(tmp_path / 'templates' / 'nested' / 'b.yaml'), str(tmp_path / 'values.yaml')}
+
+
+def test_inotify_watcher(tmp_path, write):
+    if watch.INotify is None:
+        pytest.skip('inotify_simple is not installed')
+
+    write(str(tmp_path / 'templates' / 'a.yaml'), '')
+
+    watcher = watch.create_watcher([(str(tmp_path / 'templates'), True)])
+
+    try:
+        assert isinstance(watcher, watch.InotifyWatcher)
+
+        write(str(tmp_path / 'templates' / 'a.yaml'), 'a: 1\n')
+
+        assert watcher.wait(timeout=1) == {str(tmp_path / 'templates' / 'a.yaml')}
+    finally:
+        watcher.close()
+
+
+def test_watch_session(project, write):
+    session = WatchSession(str(project), None, None, suffixes=['.yaml'])
+
+    assert session.render(session.names()) == ['a.yaml', 'b.yaml']
+    assert session.output() == '---\n# Source: a.yaml\na: "1"\n---\n# Source: b.yaml\nb: "2"\npart: "3"\n'
+
+    write(str(project / 'values.yaml'), 'a: 10\nb: 2\nc: 3\n')
+    assert session.update([str(project / 'values.yaml')]) == ['a.yaml']
+
+    write(str(project / 'values.yaml'), 'a: 10\nb: 2\nc: 30\n')
+    assert session.update([str(project / 'values.yaml')]) == ['b.yaml']
+    assert 'part: "30"' in session.output()
+
+    write(str(project / 'templates' / 'part.inc'), 'part: "{{ c }}-changed"\n')
+    assert session.update([str(project / 'templates' / 'part.inc')]) == ['b.yaml']
+    assert 'part: "30-changed"' in session.output()
+
+    write(str(project / 'templates' / 'c.yaml'), 'c: "{{ c }}"\n')
+    assert session.update([str(project / 'templates' / 'c.yaml')]) == ['c.yaml']
+
+    write(str(project / 'templates' / 'a.yaml'), 'a: "{{ a }"\n')
+    assert session.update([str(project / 'templates' / 'a.yaml')]) == ['a.yaml']
+    assert 'a.yaml' in session.errors
+    assert '# Source: a.yaml' not in session.output()
+
+    os.remove(str(project / 'templates' / 'a.yaml'))
+    assert session.update([str(project / 'templates' / 'a.yaml')]) == []
+    assert not session.errors
+
+
+# vim: fenc=utf-8:ts=4:sw=4:expandtab